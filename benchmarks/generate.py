@@ -0,0 +1,136 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import os
+
+from xml.sax.saxutils import quoteattr
+
+#XHTTP data types used for generated action arguments
+ARGUMENT_TYPES = (1, 2, 3, 4)
+
+SCHEMA_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<xhttp xmlns:xhttp="http://www.xhttp.org/schema" version="1.0">
+"""
+
+ACTION_TEMPLATE = """\t\t<xhttp:action name=%(name)s function=%(name)s>
+\t\t\t<xhttp:exception code="1" message="Invalid value"/>
+%(arguments)s\t\t\t<xhttp:return type="4"/>
+\t\t</xhttp:action>
+"""
+
+#controllers module for generated services, where every action
+#returns the text argument value
+CONTROLLERS_SOURCE = """# -*- coding: utf8 -*-
+\"\"\"Controllers for a generated benchmark service\"\"\"
+
+
+def perform(request, node):
+    return request.x_arguments_values.get('text')
+
+"""
+
+
+def get_service_name(index):
+    return "service%04d" % index
+
+
+def get_action_name(index):
+    return "action%04d" % index
+
+
+def build_schema_document(service_name, actions=10, versions=1,
+                          arguments=3):
+    """Build the XML of a synthetic XHTTP schema document
+
+    Every action has a text string argument, plus arguments of the
+    other XHTTP data types up to the given number of arguments.
+
+    Return: A string.
+
+    """
+    lines = [SCHEMA_HEADER]
+    for version_index in range(versions):
+        version = "%s.0" % (version_index + 1)
+        lines.append('\t<xhttp:schema version="%s">\n' % version)
+        lines.append('\t\t<xhttp:info name="service" value=%s/>\n'
+                     % quoteattr(service_name))
+        lines.append('\t\t<xhttp:info name="version" value="%s"/>\n'
+                     % version)
+        for action_index in range(actions):
+            argument_lines = ['\t\t\t<xhttp:argument name="text" type="4"/>\n']
+            for arg_index in range(arguments - 1):
+                arg_type = ARGUMENT_TYPES[arg_index % len(ARGUMENT_TYPES)]
+                argument_lines.append(
+                    '\t\t\t<xhttp:argument name="arg%s" type="%s" '
+                    'default="1"/>\n' % (arg_index, arg_type))
+
+            lines.append(ACTION_TEMPLATE % {
+                'name': quoteattr(get_action_name(action_index)),
+                'arguments': "".join(argument_lines),
+            })
+
+        lines.append('\t</xhttp:schema>\n')
+
+    lines.append('</xhttp>\n')
+
+    return "".join(lines)
+
+
+def generate_service_dir(path, services=10, actions=10, versions=1,
+                         arguments=3):
+    """Write a directory with synthetic services
+
+    Each service has a schema document and a controllers module where
+    every action returns its text argument value.
+
+    Return: A list with the generated service names.
+
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    service_names = []
+    for index in range(services):
+        service_name = get_service_name(index)
+        document = build_schema_document(service_name, actions, versions,
+                                         arguments)
+        with open(os.path.join(path, "%s.xml" % service_name), "w") as file:
+            file.write(document)
+
+        module_source = CONTROLLERS_SOURCE
+        for action_index in range(actions):
+            action_name = get_action_name(action_index)
+            module_source += "%s = perform\n" % action_name
+
+        with open(os.path.join(path, "%s.py" % service_name), "w") as file:
+            file.write(module_source)
+
+        service_names.append(service_name)
+
+    return service_names
@@ -0,0 +1,390 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import multiprocessing
+import optparse
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from StringIO import StringIO
+from timeit import default_timer
+
+import simplejson
+from webob.request import environ_from_url
+
+from xhttpnode.middleware import XHTTPNodeMiddleware
+from xhttpnode.node import Node
+from xhttpnode.schema import parse_schema_document
+
+from benchmarks.generate import generate_service_dir
+from benchmarks.generate import get_action_name
+from benchmarks.generate import get_service_name
+
+#Node options for each load benchmark
+LOAD_CASES = (
+    ('default', {}),
+    ('processes', {'processes': 4}),
+    ('cache', {'cache': True}),
+    ('lazy', {'lazy': True}),
+)
+
+
+def get_percentile(sorted_values, percent):
+    index = int(len(sorted_values) * percent / 100.0)
+
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def summarize_latencies(latencies, elapsed):
+    """Summarize request latencies in seconds
+
+    Return: A dictionary.
+
+    """
+    latencies = sorted(latencies)
+
+    return {
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed,
+        'p50': get_percentile(latencies, 50),
+        'p90': get_percentile(latencies, 90),
+        'p99': get_percentile(latencies, 99),
+        'max': latencies[-1],
+    }
+
+
+def get_max_rss():
+    #maximum resident memory in bytes, Linux reports it in kilobytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _load_node(service_dir, node_options, results):
+    rss = get_max_rss()
+    start_time = default_timer()
+    node = Node(service_dir, **node_options)
+    elapsed = default_timer() - start_time
+    results.put((elapsed, get_max_rss() - rss, len(node.registry)))
+
+
+def measure_load(service_dir, repeat=3):
+    """Measure the time and memory used to create a Node
+
+    Each node is created in a new process, so memory used by previous
+    nodes and imported modules does not change the results.
+
+    Return: A dictionary.
+
+    """
+    cache_dir = tempfile.mkdtemp()
+    result = {}
+    try:
+        for (name, node_options) in LOAD_CASES:
+            node_options = dict(node_options)
+            if node_options.get('cache'):
+                node_options['cache_dir'] = cache_dir
+
+            times = []
+            memory = []
+            for index in range(repeat + 1):
+                results = multiprocessing.Queue()
+                process = multiprocessing.Process(
+                    target=_load_node,
+                    args=(service_dir, node_options, results))
+                process.start()
+                (elapsed, rss, services) = results.get()
+                process.join()
+                #first run only writes schema cache file
+                if node_options.get('cache') and not index:
+                    continue
+
+                times.append(elapsed)
+                memory.append(rss)
+
+            result[name] = {
+                'seconds_min': min(times),
+                'seconds_mean': sum(times) / len(times),
+                'memory_bytes': sorted(memory)[len(memory) // 2],
+                'loaded_services': services,
+            }
+    finally:
+        shutil.rmtree(cache_dir)
+
+    return result
+
+
+def measure_parse(service_dir, repeat=3):
+    """Measure parse_schema_document throughput
+
+    Return: A dictionary.
+
+    """
+    file_names = sorted(
+        os.path.join(service_dir, name) for name in os.listdir(service_dir)
+        if name.endswith(".xml"))
+    total_bytes = sum(os.path.getsize(name) for name in file_names)
+
+    actions = 0
+    for schema in parse_schema_document(file_names[0]).values():
+        actions += len(schema.get('actions', ()))
+
+    times = []
+    for index in range(repeat):
+        start_time = default_timer()
+        for file_name in file_names:
+            parse_schema_document(file_name)
+
+        times.append(default_timer() - start_time)
+
+    elapsed = min(times)
+
+    return {
+        'documents': len(file_names),
+        'bytes': total_bytes,
+        'seconds': elapsed,
+        'documents_per_second': len(file_names) / elapsed,
+        'bytes_per_second': total_bytes / elapsed,
+        'actions_per_second': actions * len(file_names) / elapsed,
+    }
+
+
+def get_request_cases(service_name, action_name, batch_size=10):
+    """Get the request headers and body for each benchmark case
+
+    Return: A list of tuples with case name, headers and body.
+
+    """
+    service = {'X-Version': "1.0", 'X-Service': service_name}
+    perform = dict(service, **{
+        'X-Action': action_name,
+        'X-Encoding': "utf-8",
+    })
+    calls = [{'action': action_name, 'arguments': {'text': "text"}}]
+    batch_body = simplejson.dumps(calls * batch_size)
+
+    return [
+        ('version', dict(service, **{'X-Mode': "version"}), ""),
+        ('info', dict(service, **{'X-Mode': "info"}), ""),
+        ('schema', dict(service, **{'X-Mode': "schema"}), ""),
+        ('schema_action', dict(service, **{
+            'X-Mode': "schema",
+            'X-Action': action_name,
+        }), ""),
+        ('schema_gzip', dict(service, **{
+            'X-Mode': "schema",
+            'Accept-Encoding': "gzip",
+        }), ""),
+        ('perform', perform, "text=hello"),
+        ('batch', dict(service, **{'X-Mode': "batch"}), batch_body),
+        ('error_service_not_found', dict(service, **{
+            'X-Mode': "info",
+            'X-Service': "missing",
+        }), ""),
+        ('error_version_not_supported', dict(service, **{
+            'X-Mode': "info",
+            'X-Version': "",
+        }), ""),
+        ('error_action_not_found', dict(perform, **{
+            'X-Action': "missing",
+        }), ""),
+        ('error_missing_arguments', perform, ""),
+        ('error_mode_not_supported', dict(service, **{
+            'X-Mode': "missing",
+        }), ""),
+    ]
+
+
+def create_environ(headers, body):
+    environ = environ_from_url("/")
+    for (name, value) in headers.items():
+        environ["HTTP_%s" % name.upper().replace("-", "_")] = value
+
+    if body:
+        environ['REQUEST_METHOD'] = "POST"
+        environ['CONTENT_TYPE'] = "application/x-www-form-urlencoded"
+        environ['CONTENT_LENGTH'] = str(len(body))
+
+    environ['wsgi.input'] = StringIO(body)
+
+    return environ
+
+
+def measure_requests(service_dir, service_name, action_name, requests=2000):
+    """Measure XHTTPNodeMiddleware requests for each request case
+
+    Return: A dictionary.
+
+    """
+    middleware = XHTTPNodeMiddleware(service_dir)
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(status)
+
+    result = {}
+    for (name, headers, body) in get_request_cases(service_name,
+                                                   action_name):
+        environ_list = [create_environ(headers, body)
+                        for index in range(requests)]
+        latencies = []
+        start_time = default_timer()
+        for environ in environ_list:
+            request_start_time = default_timer()
+            "".join(middleware(environ, start_response))
+            latencies.append(default_timer() - request_start_time)
+
+        elapsed = default_timer() - start_time
+        result[name] = summarize_latencies(latencies, elapsed)
+        result[name]['status'] = statuses[-1]
+
+    middleware.batch.close()
+
+    return result
+
+
+def get_git_commit():
+    try:
+        output = subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                         stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return
+
+    return output.strip()
+
+
+def run(service_dir, requests=2000, repeat=3, parameters=None):
+    """Run all the benchmarks for a service directory
+
+    Return: A dictionary.
+
+    """
+    service_name = get_service_name(0)
+    action_name = get_action_name(0)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'commit': get_git_commit(),
+            'time': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        'parameters': parameters or {},
+        'load': measure_load(service_dir, repeat),
+        'parse': measure_parse(service_dir, repeat),
+        'requests': measure_requests(service_dir, service_name,
+                                     action_name, requests),
+    }
+
+
+def print_summary(results, stream):
+    for (name, load) in sorted(results['load'].items()):
+        stream.write("load %-10s %8.3fs %8.1f MB\n"
+                     % (name, load['seconds_min'],
+                        load['memory_bytes'] / 1048576.0))
+
+    parse = results['parse']
+    stream.write("parse %.1f documents/s, %.1f MB/s\n"
+                 % (parse['documents_per_second'],
+                    parse['bytes_per_second'] / 1048576.0))
+
+    for (name, case) in sorted(results['requests'].items()):
+        stream.write("%-30s %9.0f req/s  p50 %7.1fus  p99 %7.1fus  %s\n"
+                     % (name, case['requests_per_second'],
+                        case['p50'] * 1e6, case['p99'] * 1e6,
+                        case['status']))
+
+
+def parse_args(args):
+    usage = "Usage: python -m benchmarks.run [options]"
+    parser = optparse.OptionParser(usage=usage)
+    parser.add_option("--services", type="int", default=20,
+                      help="number of generated services [default: %default]")
+    parser.add_option("--actions", type="int", default=50,
+                      help="number of actions for each service "
+                           "[default: %default]")
+    parser.add_option("--versions", type="int", default=2,
+                      help="number of schema versions for each service "
+                           "[default: %default]")
+    parser.add_option("--requests", type="int", default=2000,
+                      help="number of requests for each request case "
+                           "[default: %default]")
+    parser.add_option("--repeat", type="int", default=3,
+                      help="number of runs for load and parse benchmarks "
+                           "[default: %default]")
+    parser.add_option("--service-dir",
+                      help="use an existing service directory instead of "
+                           "generating one")
+    parser.add_option("--output", metavar="FILE",
+                      help="write JSON results to FILE instead of stdout")
+
+    (options, args) = parser.parse_args(args)
+    if args:
+        parser.error("no arguments are allowed")
+
+    return options
+
+
+def main(args):
+    options = parse_args(args)
+    parameters = {
+        'services': options.services,
+        'actions': options.actions,
+        'versions': options.versions,
+        'requests': options.requests,
+        'repeat': options.repeat,
+    }
+    service_dir = options.service_dir
+    if not service_dir:
+        service_dir = tempfile.mkdtemp(prefix="xhttp-benchmark-")
+        generate_service_dir(service_dir, options.services, options.actions,
+                             options.versions)
+
+    try:
+        results = run(service_dir, options.requests, options.repeat,
+                      parameters)
+    finally:
+        if not options.service_dir:
+            shutil.rmtree(service_dir)
+
+    print_summary(results, sys.stderr)
+    output = simplejson.dumps(results, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print output
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
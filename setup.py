@@ -10,6 +10,9 @@ setup(
         "simplejson",
         "WebOb",
     ],
+    extras_require={
+        "asyncio": ["trollius"],
+    },
     url="https://github.com/jeronimoalbi/xhttp-node",
     keywords="xhttp web wsgi protocol",
     zip_safe=True,
@@ -0,0 +1,131 @@
+# -*- coding: utf8 -*-
+import os
+import socket
+import threading
+import types
+import unittest
+
+from StringIO import StringIO
+
+from webob.request import environ_from_url
+
+from xhttpnode import aio
+from xhttpnode.dispatch import Dispatcher
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+def create_controllers_module():
+    """Create a test service module where hello is a coroutine"""
+    test_module = Dispatcher(SERVICE_DIR).get_service_module("test")
+    module = types.ModuleType("test")
+    module.__dict__.update(vars(test_module))
+
+    @aio.asyncio.coroutine
+    def hello(request, node):
+        yield aio.From(aio.asyncio.sleep(0.01))
+        raise aio.Return(u"Hello Async World")
+
+    module.hello = hello
+
+    return module
+
+
+def create_environ(body="", **headers):
+    environ = environ_from_url("/")
+    for (name, value) in headers.items():
+        environ["HTTP_%s" % name.upper()] = value
+
+    environ['CONTENT_TYPE'] = "application/x-www-form-urlencoded"
+    environ['CONTENT_LENGTH'] = str(len(body))
+    environ['wsgi.input'] = StringIO(body)
+
+    return environ
+
+
+@unittest.skipIf(aio.asyncio is None, "trollius is not installed")
+class AsyncMiddlewareTestCase(unittest.TestCase):
+    """Test case for the aio module"""
+
+    def setUp(self):
+        self.loop = aio.asyncio.new_event_loop()
+        aio.asyncio.set_event_loop(self.loop)
+        controllers = {'test': create_controllers_module()}
+        self.middleware = aio.AsyncXHTTPNodeMiddleware(SERVICE_DIR,
+                                                       loop=self.loop,
+                                                       controllers=controllers)
+
+    def tearDown(self):
+        self.loop.close()
+        aio.asyncio.set_event_loop(None)
+
+    def handle(self, body="", **headers):
+        environ = create_environ(body, **headers)
+
+        return self.loop.run_until_complete(self.middleware.handle(environ))
+
+    def test_metadata(self):
+        (status, headers, body) = self.handle(x_version="1.0", x_mode="info",
+                                              x_service="test")
+        self.assertEqual(status, "200 OK")
+        node_parts = self.middleware.node.responses['test']
+        self.assertEqual(body, node_parts[('info', '1.0', None)][2])
+
+    def test_perform(self):
+        #coroutine controller is run in event loop
+        (status, headers, body) = self.handle(x_version="1.0",
+                                              x_service="test",
+                                              x_action="hello")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body, '"Hello Async World"')
+
+        #other controllers are run in executor
+        (status, headers, body) = self.handle("text=hello", x_version="1.0",
+                                              x_service="test",
+                                              x_action="test",
+                                              x_encoding="utf-8")
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(body, '"hello"')
+
+        (status, headers, body) = self.handle(x_version="1.0",
+                                              x_service="test",
+                                              x_action="error")
+        self.assertEqual(status, "550 Exception")
+        self.assertIn("ValueError", dict(headers)['X-Exception'])
+
+    def test_http_server(self):
+        server = aio.AsyncHTTPServer(self.middleware, "127.0.0.1", 0)
+        self.loop.run_until_complete(server.start())
+
+        def run_loop():
+            aio.asyncio.set_event_loop(self.loop)
+            self.loop.run_forever()
+
+        thread = threading.Thread(target=run_loop)
+        thread.start()
+        try:
+            connection = socket.create_connection(("127.0.0.1", server.port))
+            #send both requests without waiting for responses
+            request = ("GET / HTTP/1.1\r\nX-Version: 1.0\r\n"
+                       "X-Service: test\r\nX-Action: hello\r\n")
+            connection.sendall(request + "\r\n")
+            connection.sendall(request + "Connection: close\r\n\r\n")
+            rfile = connection.makefile("rb")
+            for connection_header in ("keep-alive", "close"):
+                self.assertEqual(rfile.readline(), "HTTP/1.1 200 OK\r\n")
+                headers = {}
+                for line in iter(rfile.readline, "\r\n"):
+                    (name, value) = line.split(":", 1)
+                    headers[name] = value.strip()
+
+                self.assertEqual(headers['Connection'], connection_header)
+                body = rfile.read(int(headers['Content-Length']))
+                self.assertEqual(body, '"Hello Async World"')
+
+            #server must close the connection after last response
+            self.assertEqual(rfile.read(), "")
+            connection.close()
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            thread.join()
+            server.close()
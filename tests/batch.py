@@ -0,0 +1,160 @@
+# -*- coding: utf8 -*-
+import os
+import threading
+import time
+import unittest
+
+import simplejson
+from webob import Request as WebObRequest
+
+from xhttpnode.middleware import XHTTPNodeMiddleware
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+class BatchTestCase(unittest.TestCase):
+    """Test case for the batch module"""
+
+    def setUp(self):
+        self.middleware = XHTTPNodeMiddleware(SERVICE_DIR, batch_threads=2)
+
+    def tearDown(self):
+        self.middleware.batch.close()
+
+    def get_response(self, calls, **headers):
+        headers = dict((name.replace("_", "-"), value)
+                       for (name, value) in headers.items())
+        headers.setdefault('X-Version', "1.0")
+        headers.setdefault('X-Service', "test")
+        headers['X-Mode'] = "batch"
+        request = WebObRequest.blank("/", headers=headers, method="POST")
+        if isinstance(calls, basestring):
+            request.body = calls
+        else:
+            request.body = simplejson.dumps(calls)
+
+        return request.get_response(self.middleware)
+
+    def test_batch(self):
+        calls = [
+            {'action': "hello"},
+            {'action': "test", 'arguments': {'text': u"ñandú"}},
+            {'action': "test"},
+            {'action': "test", 'arguments': {'text': 1}},
+            {'action': "error"},
+            {'action': "missing"},
+            {'mode': "schema", 'action': "test"},
+        ]
+        response = self.get_response(calls)
+        self.assertEqual(response.status, "200 OK")
+        results = simplejson.loads(response.body)
+        #results are returned in the same order as calls
+        self.assertEqual(results[0], {'status': "200 OK",
+                                      'result': "Hello World"})
+        self.assertEqual(results[1], {'status': "200 OK",
+                                      'result': u"ñandú"})
+        self.assertEqual(results[2]['status'], "550 Exception")
+        self.assertTrue(results[2]['exception'].startswith("106"))
+        self.assertTrue(results[3]['exception'].startswith("107"))
+        self.assertIn("ValueError", results[4]['exception'])
+        self.assertEqual(results[5], {'status': "454 Action Not Found"})
+        self.assertEqual(results[6]['result'][0][0], "test")
+
+    def test_batch_errors(self):
+        response = self.get_response("[")
+        self.assertEqual(response.status, "550 Exception")
+        self.assertIn("104", response.headers['X-Exception'])
+
+        response = self.get_response([{'action': "hello"}],
+                                     X_Service="missing")
+        self.assertEqual(simplejson.loads(response.body),
+                         [{'status': "453 Service Not Found"}])
+
+        response = self.get_response([{'action': "hello"}], X_Version="")
+        self.assertEqual(response.status, "551 XHTTP Version Not Supported")
+
+    def test_malformed_calls(self):
+        calls = [{'action': 5}, {'action': "hello", 'service': ["test"]},
+                 {'action': "hello", 'mode': {}}, {'action': "hello"}]
+        response = self.get_response(calls, X_Service="test")
+        #only the malformed calls fail
+        self.assertEqual(response.status, "200 OK")
+        results = simplejson.loads(response.body)
+        for result in results[:3]:
+            self.assertEqual(result['status'], "550 Exception")
+            self.assertTrue(result['exception'].startswith("104"))
+
+        self.assertEqual(results[3]['result'], "Hello World")
+
+    def test_concurrent_calls(self):
+        node = self.middleware.node
+        for action in node.services['test']['1.0'].actions.values():
+            action.concurrent = action.name != "test"
+
+        thread_names = {}
+
+        def controller(request, node):
+            thread_names[request.x_action] = threading.current_thread().name
+            return request.x_action
+
+        controllers = node.registry.controllers['test']
+        for name in ("hello", "test", "error"):
+            controllers[("1.0", name)] = controller
+
+        calls = [{'action': "hello"}, {'action': "test"}, {'action': "error"}]
+        calls[1]['arguments'] = {'text': "text"}
+        results = simplejson.loads(self.get_response(calls).body)
+        self.assertEqual([result['result'] for result in results],
+                         ["hello", "test", "error"])
+        #actions that are not concurrent run in request thread
+        current_name = threading.current_thread().name
+        self.assertEqual(thread_names['test'], current_name)
+        self.assertNotEqual(thread_names['hello'], current_name)
+        self.assertNotEqual(thread_names['error'], current_name)
+
+    def test_non_concurrent_calls_do_not_overlap(self):
+        node = self.middleware.node
+        for action in node.services['test']['1.0'].actions.values():
+            action.concurrent = action.name != "test"
+
+        running = set()
+        overlaps = []
+        lock = threading.Lock()
+
+        def controller(request, node):
+            with lock:
+                running.add(request.x_action)
+                overlaps.append(len(running) > 1 and "test" in running)
+
+            time.sleep(0.05)
+            with lock:
+                running.discard(request.x_action)
+
+            return request.x_action
+
+        controllers = node.registry.controllers['test']
+        for name in ("hello", "test", "error"):
+            controllers[("1.0", name)] = controller
+
+        calls = [{'action': "hello"}, {'action': "error"},
+                 {'action': "test", 'arguments': {'text': "text"}},
+                 {'action': "hello"}]
+        results = simplejson.loads(self.get_response(calls).body)
+        self.assertEqual(results[2]['result'], "test")
+        #no pool call runs while the non concurrent action runs
+        self.assertFalse(any(overlaps))
+
+    def test_unexpected_item_errors(self):
+        node = self.middleware.node
+
+        def get_action(request):
+            raise RuntimeError("Service import failed")
+
+        node.get_action = get_action
+        response = self.get_response([{'action': "hello"}])
+        #unexpected errors fail only their call
+        self.assertEqual(response.status, "200 OK")
+        results = simplejson.loads(response.body)
+        self.assertEqual(results[0]['status'], "550 Exception")
+        self.assertIn("RuntimeError", results[0]['exception'])
+
@@ -0,0 +1,87 @@
+# -*- coding: utf8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from xhttpnode import cache
+from xhttpnode import schema
+from xhttpnode.node import Node
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+class SchemaCacheTestCase(unittest.TestCase):
+    """Test case for the cache module"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.service_dir = os.path.join(self.temp_dir, "services")
+        os.mkdir(self.service_dir)
+        self.schema_file = os.path.join(self.service_dir, "test.xml")
+        shutil.copy(os.path.join(SERVICE_DIR, "test.xml"), self.schema_file)
+        self.cache_file_name = cache.get_cache_file_name(self.service_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_get_cache_file_name(self):
+        #by default cache file is saved next to service directory
+        self.assertEqual(os.path.dirname(self.cache_file_name), self.temp_dir)
+
+        cache_dir = os.path.join(self.temp_dir, "cache")
+        file_name = cache.get_cache_file_name(self.service_dir, cache_dir)
+        self.assertEqual(os.path.dirname(file_name), cache_dir)
+        #different service directories must not share cache file
+        other_file_name = cache.get_cache_file_name(SERVICE_DIR, cache_dir)
+        self.assertNotEqual(file_name, other_file_name)
+
+    def test_save_and_load(self):
+        schemas = schema.parse_schema_document(self.schema_file)
+        schema_cache = cache.SchemaCache(self.cache_file_name)
+        schema_cache.set(self.schema_file, schemas)
+        schema_cache.save()
+
+        schema_cache = cache.SchemaCache(self.cache_file_name)
+        self.assertTrue(schema_cache.load())
+        self.assertEqual(schema_cache.get(self.schema_file), schemas)
+
+    def test_stale_entry(self):
+        schemas = schema.parse_schema_document(self.schema_file)
+        schema_cache = cache.SchemaCache(self.cache_file_name)
+        schema_cache.set(self.schema_file, schemas)
+
+        #changing the file must invalidate the cache entry
+        with open(self.schema_file, "a") as schema_file:
+            schema_file.write("\n")
+
+        self.assertEqual(schema_cache.get(self.schema_file), None)
+
+    def test_load_invalid_cache(self):
+        with open(self.cache_file_name, "wb") as cache_file:
+            cache_file.write("XHTTPNODE-SCHEMA-CACHE 0\n")
+
+        schema_cache = cache.SchemaCache(self.cache_file_name)
+        self.assertFalse(schema_cache.load())
+        self.assertEqual(schema_cache.entries, {})
+
+        with open(self.cache_file_name, "wb") as cache_file:
+            cache_file.write(cache.CACHE_HEADER)
+            cache_file.write("invalid")
+
+        self.assertFalse(schema_cache.load())
+
+    def test_node_cache(self):
+        node = Node(self.service_dir, cache=True)
+        self.assertTrue(os.path.isfile(self.cache_file_name))
+
+        node = Node(self.service_dir, cache=True)
+        self.assertIn(self.schema_file, node.schema_cache.entries)
+        #services loaded from cache must be the same as parsed ones
+        self.assertEqual(sorted(node.services['test'].versions),
+                         ["1.0", "1.1", "1.2", "2.0"])
+
+        #entries for deleted files are removed when schemas are reloaded
+        os.remove(self.schema_file)
+        node.reload()
+        self.assertEqual(node.schema_cache.entries, {})
@@ -0,0 +1,139 @@
+# -*- coding: utf8 -*-
+import gzip
+import os
+import unittest
+import zlib
+
+from StringIO import StringIO
+
+from webob import Request as WebObRequest
+
+from xhttpnode import compress
+from xhttpnode.middleware import XHTTPNodeMiddleware
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+class CompressTestCase(unittest.TestCase):
+    """Test case for the compress module"""
+
+    def test_parse_accept_encoding(self):
+        parse = compress.parse_accept_encoding
+        self.assertEqual(parse("gzip, deflate"), "gzip")
+        self.assertEqual(parse("deflate"), "deflate")
+        self.assertEqual(parse("gzip;q=0.5, deflate"), "deflate")
+        self.assertEqual(parse("gzip;q=0, *"), "deflate")
+        self.assertEqual(parse("br, identity"), None)
+        self.assertEqual(parse("*;q=0"), None)
+
+    def test_compress(self):
+        body = "x" * 1000
+        gzip_body = compress.compress(body, "gzip")
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO(gzip_body)).read(),
+                         body)
+        self.assertEqual(zlib.decompress(compress.compress(body, "deflate")),
+                         body)
+
+    def test_compress_parts(self):
+        compressor = compress.Compressor(min_size=100)
+        parts = ("200 OK", (('Content-Length', "10"),), "x" * 10)
+        #small bodies are not compressed
+        self.assertIs(compressor.compress_parts(parts, "gzip"), parts)
+
+        parts = ("200 OK", (('Content-Length', "1000"),), "x" * 1000)
+        (status, headers, body) = compressor.compress_parts(parts, "deflate")
+        headers = dict(headers)
+        self.assertEqual(headers['Content-Encoding'], "deflate")
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertEqual(zlib.decompress(body), parts[2])
+
+    def test_compress_responses(self):
+        compressor = compress.Compressor(min_size=100)
+        shared_parts = ("200 OK", (), "x" * 1000)
+        responses = {
+            ('version', '1.0', None): shared_parts,
+            ('version', '2.0', None): shared_parts,
+            ('info', '1.0', None): ("200 OK", (), "x" * 10),
+        }
+        variants = compressor.compress_responses(responses)
+        #only compressed responses are returned
+        self.assertEqual(sorted(variants), [
+            ('version', '1.0', None, "deflate"),
+            ('version', '1.0', None, "gzip"),
+            ('version', '2.0', None, "deflate"),
+            ('version', '2.0', None, "gzip"),
+        ])
+        #shared parts are compressed once
+        self.assertIs(variants[('version', '1.0', None, "gzip")],
+                      variants[('version', '2.0', None, "gzip")])
+
+
+class CompressedResponsesTestCase(unittest.TestCase):
+    """Test case for compressed node responses"""
+
+    def setUp(self):
+        self.middleware = XHTTPNodeMiddleware(SERVICE_DIR,
+                                              compress_min_size=10)
+        self.node = self.middleware.node
+
+    def get_response(self, body=None, **headers):
+        headers = dict((name.replace("_", "-"), value)
+                       for (name, value) in headers.items())
+        headers['X-Version'] = "1.0"
+        headers['X-Service'] = "test"
+        request = WebObRequest.blank("/", headers=headers, POST=body)
+
+        return request.get_response(self.middleware)
+
+    def test_metadata(self):
+        response = self.get_response(X_Mode="schema",
+                                     Accept_Encoding="gzip")
+        self.assertEqual(response.headers['Content-Encoding'], "gzip")
+        self.assertEqual(response.headers['Vary'], "Accept-Encoding")
+        response.decode_content()
+        self.assertEqual(response.body,
+                         self.node.responses['test'][('schema', '1.0', None)][2])
+
+        #compressed responses are built once and then reused
+        (responses, variants) = self.node.variants['test']
+        self.assertIs(responses, self.node.responses['test'])
+        parts = variants[('schema', '1.0', None, "gzip")]
+        response = self.get_response(X_Mode="schema",
+                                     Accept_Encoding="gzip")
+        self.assertIs(variants[('schema', '1.0', None, "gzip")], parts)
+
+        response = self.get_response(X_Mode="schema")
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.headers['Vary'], "Accept-Encoding")
+
+    def test_variants_are_dropped_when_service_changes(self):
+        self.get_response(X_Mode="schema", Accept_Encoding="deflate")
+        registry = self.node.registry
+        services = {'test': self.node.services['test']}
+        self.node._update_registry(services)
+        self.assertNotIn('test', self.node.variants)
+        #registry is not modified by compressed responses
+        self.assertFalse(hasattr(registry, 'variants'))
+
+        #variants built from a replaced responses table are not used
+        old_responses = registry.responses['test']
+        self.node.variants['test'] = (old_responses, {})
+        self.get_response(X_Mode="schema", Accept_Encoding="deflate")
+        (responses, variants) = self.node.variants['test']
+        self.assertIs(responses, self.node.responses['test'])
+        self.assertIn(('schema', '1.0', None, "deflate"), variants)
+
+    def test_perform(self):
+        response = self.get_response("text=%s" % ("a" * 100),
+                                     X_Action="test", X_Encoding="utf-8",
+                                     Accept_Encoding="deflate")
+        self.assertEqual(response.headers['Content-Encoding'], "deflate")
+        self.assertEqual(response.headers['Vary'], "Accept-Encoding")
+        response.decode_content()
+        self.assertEqual(response.body, '"%s"' % ("a" * 100))
+
+        #bodies below size threshold are not compressed
+        response = self.get_response("text=a", X_Action="test",
+                                     X_Encoding="utf-8",
+                                     Accept_Encoding="deflate")
+        self.assertNotIn('Content-Encoding', response.headers)
@@ -0,0 +1,49 @@
+# -*- coding: utf8 -*-
+import unittest
+
+from xhttpnode import datatype
+from xhttpnode.model import Argument
+
+
+class ArgumentDecoderTestCase(unittest.TestCase):
+    """Test case for the datatype module"""
+
+    def setUp(self):
+        arguments = [
+            Argument("text", datatype.TYPE_STRING),
+            Argument("count", datatype.TYPE_INTEGER),
+            Argument("ratio", datatype.TYPE_FLOAT),
+            Argument("enabled", datatype.TYPE_BOOLEAN),
+            Argument("items", datatype.TYPE_ARRAY),
+            Argument("options", datatype.TYPE_OBJECT),
+        ]
+        self.decoder = datatype.ArgumentDecoder(arguments)
+
+    def test_decode(self):
+        body = ("text=hello+world&count=3&ratio=0.5&enabled=true"
+                "&items=%5B1%2C2%5D&options=%7B%22a%22%3A1%7D&unknown=1")
+        values = self.decoder.decode(body, "utf-8")
+
+        self.assertEqual(values, {
+            'text': u"hello world",
+            'count': 3,
+            'ratio': 0.5,
+            'enabled': True,
+            'items': [1, 2],
+            'options': {'a': 1},
+        })
+
+    def test_decode_encoding(self):
+        body = "text=%C3%B1"
+        self.assertEqual(self.decoder.decode(body, "utf-8"), {'text': u"ñ"})
+        #raw encoding keeps values as bytes
+        values = self.decoder.decode(body, datatype.RAW_ENCODING)
+        self.assertEqual(values, {'text': "\xc3\xb1"})
+
+    def test_decode_invalid_value(self):
+        self.assertRaises(datatype.ArgumentDecodeError,
+                          self.decoder.decode, "count=three")
+        self.assertRaises(datatype.ArgumentDecodeError,
+                          self.decoder.decode, "items=%7B%7D")
+        self.assertRaises(datatype.ArgumentDecodeError,
+                          self.decoder.decode, "enabled=maybe")
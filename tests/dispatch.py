@@ -0,0 +1,73 @@
+# -*- coding: utf8 -*-
+import os
+import unittest
+
+from xhttpnode import dispatch
+from xhttpnode import error
+from xhttpnode.node import Node
+
+from tests.node import create_request
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+class DispatchTestCase(unittest.TestCase):
+    """Test case for the dispatch module"""
+
+    def test_import_object(self):
+        self.assertIs(dispatch.import_object("os.path:join"), os.path.join)
+        self.assertIs(dispatch.import_object("os.path.join"), os.path.join)
+        self.assertRaises(dispatch.DispatchError,
+                          dispatch.import_object, "os.path:missing")
+        self.assertRaises(dispatch.DispatchError,
+                          dispatch.import_object, "missing_module:join")
+
+    def test_build_service_controllers(self):
+        node = Node(SERVICE_DIR)
+        dispatcher = dispatch.Dispatcher(SERVICE_DIR)
+        service = node.services['test']
+        controllers = dispatcher.build_service_controllers(service)
+
+        #there must be a controller for each action of each version
+        self.assertEqual(len(controllers), 12)
+        module = dispatcher.get_service_module("test")
+        self.assertIs(controllers[("1.0", "hello")], module.hello)
+
+    def test_build_service_controllers_with_modules(self):
+        node = Node(SERVICE_DIR)
+        modules = {'test': "os.path"}
+        dispatcher = dispatch.Dispatcher(SERVICE_DIR, modules)
+        controllers = dispatcher.build_service_controllers(node.services['test'])
+        #os.path has no functions for test actions
+        self.assertEqual(controllers, {})
+
+
+class NodeControllerTestCase(unittest.TestCase):
+    """Test case for getting request controllers from nodes"""
+
+    def setUp(self):
+        self.node = Node(SERVICE_DIR)
+
+    def test_get_request_controller(self):
+        request = create_request(self.node, x_version="1.0",
+                                 x_service="test", x_action="hello")
+        controller = self.node.get_request_controller(request)
+        self.assertEqual(controller(request, self.node), u"Hello World")
+
+    def test_get_request_controller_errors(self):
+        request = create_request(self.node, x_version="1.0",
+                                 x_service="test")
+        self.assertRaises(error.ActionNotSpecifiedError,
+                          self.node.get_request_controller, request)
+
+        request = create_request(self.node, x_version="1.0",
+                                 x_service="test", x_action="missing")
+        self.assertRaises(error.ActionNotFoundError,
+                          self.node.get_request_controller, request)
+
+    def test_create_response(self):
+        response = self.node.create_response([u"Hello", 1])
+        self.assertEqual(response.body, '["Hello",1]')
+        self.assertEqual(response.content_type, "application/json")
+        #responses returned by controllers are not changed
+        self.assertIs(self.node.create_response(response), response)
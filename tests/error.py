@@ -0,0 +1,43 @@
+# -*- coding: utf8 -*-
+import unittest
+
+from simplejson import loads
+
+from xhttpnode import error
+from xhttpnode.response import ERROR_RESPONSE_PARTS
+from xhttpnode.response import get_error_response_parts
+
+
+class ErrorTestCase(unittest.TestCase):
+    """Test case for the error module"""
+
+    def test_protocol_error(self):
+        err = error.Error106(detail=u"text")
+        #protocol errors are returned as Exception responses
+        self.assertEqual(str(err), "550 Exception")
+        headers = dict(err.headers)
+        self.assertEqual(loads(headers['X-Exception']),
+                         u"106 Missing required arguments: text")
+
+    def test_error_response_parts(self):
+        parts = get_error_response_parts(error.ServiceNotFoundError())
+        #errors without headers use the prebuilt parts of their class
+        self.assertIs(parts, ERROR_RESPONSE_PARTS[error.ServiceNotFoundError])
+        self.assertEqual(parts[0], "453 Service Not Found")
+        self.assertEqual(parts[2], "453 Service Not Found")
+
+        err = error.Error106(detail=u"text", headers={'X-Version': "1.0"})
+        (status, headers, body) = get_error_response_parts(err)
+        self.assertEqual(status, "550 Exception")
+        headers = dict(headers)
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertEqual(headers['X-Version'], "1.0")
+        self.assertIn('X-Exception', headers)
+
+    def test_protocol_error_headers_argument(self):
+        #headers are the first argument, like in other XHTTP errors
+        err = error.Error107({'X-Version': "1.0"})
+        headers = dict(err.headers)
+        self.assertEqual(headers['X-Version'], "1.0")
+        self.assertEqual(loads(headers['X-Exception']),
+                         u"107 Invalid argument passed")
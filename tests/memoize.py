@@ -0,0 +1,100 @@
+# -*- coding: utf8 -*-
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from xhttpnode import memoize
+from xhttpnode.node import Node
+
+from tests.node import create_request
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+class ResultCacheTestCase(unittest.TestCase):
+    """Test case for the memoize module"""
+
+    def test_make_key(self):
+        key = memoize.make_key({'b': 2, 'a': 1})
+        self.assertEqual(key, (('a', 1), ('b', 2)))
+        #values that can't be hashed are keyed by their JSON
+        key = memoize.make_key({'a': [1, 2]})
+        self.assertEqual(key, '{"a":[1,2]}')
+
+    def test_least_recently_used(self):
+        cache = memoize.ResultCache(60, max_size=2)
+        cache.set("first", 1)
+        cache.set("second", 2)
+        self.assertEqual(cache.get("first"), 1)
+        cache.set("third", 3)
+        #second entry is the least recently used one
+        self.assertIs(cache.get("second"), memoize.MISSING)
+        self.assertEqual(cache.get("third"), 3)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_expiry_and_invalidate(self):
+        cache = memoize.ResultCache(0.01)
+        cache.set("first", 1)
+        time.sleep(0.02)
+        self.assertIs(cache.get("first"), memoize.MISSING)
+        self.assertEqual(len(cache), 0)
+
+        cache.ttl = 60
+        cache.set("first", 1)
+        cache.set("second", 2)
+        self.assertEqual(cache.invalidate("first"), 1)
+        self.assertEqual(cache.invalidate("first"), 0)
+        self.assertEqual(cache.invalidate(), 1)
+
+
+class NodeResultCacheTestCase(unittest.TestCase):
+    """Test case for cached action results in nodes"""
+
+    def setUp(self):
+        self.service_dir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(SERVICE_DIR, "test.py"), self.service_dir)
+        with open(os.path.join(SERVICE_DIR, "test.xml")) as schema_file:
+            document = schema_file.read()
+
+        #cache results of test action in version 1.0
+        document = document.replace('<xhttp:action name="test" ',
+                                    '<xhttp:action name="test" '
+                                    'cache-ttl="60" cache-size="10" ')
+        file_name = os.path.join(self.service_dir, "test.xml")
+        with open(file_name, "w") as schema_file:
+            schema_file.write(document)
+
+        self.node = Node(self.service_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.service_dir)
+
+    def perform(self, text):
+        request = create_request(self.node, x_version="1.0",
+                                 x_service="test", x_action="test",
+                                 x_encoding="utf-8")
+        request.environ['xhttp.arguments_values'] = {'text': text}
+        controller = self.node.get_request_controller(request)
+
+        return controller(request, self.node)
+
+    def test_cached_results(self):
+        controllers = self.node.registry.controllers['test']
+        self.assertIsInstance(controllers[('1.0', "test")],
+                              memoize.MemoizedController)
+        #actions without cache options are not wrapped
+        self.assertNotIsInstance(controllers[('1.1', "test1")],
+                                 memoize.MemoizedController)
+
+        self.assertEqual(self.perform(u"first"), u"first")
+        self.assertEqual(self.perform(u"first"), u"first")
+        self.assertEqual(self.perform(u"second"), u"second")
+        self.assertEqual(self.node.get_result_cache_stats(), (1, 2, 2))
+
+        count = self.node.invalidate_results("test", "test",
+                                             {'text': u"first"})
+        self.assertEqual(count, 1)
+        self.assertEqual(self.node.invalidate_results("test"), 1)
+        self.assertEqual(self.node.get_result_cache_stats(), (1, 2, 0))
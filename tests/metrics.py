@@ -0,0 +1,166 @@
+# -*- coding: utf8 -*-
+import os
+import threading
+import unittest
+
+from webob import Request as WebObRequest
+
+from xhttpnode import metrics
+from xhttpnode.middleware import XHTTPNodeMiddleware
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+class MetricsTestCase(unittest.TestCase):
+    """Test case for the metrics module"""
+
+    def test_get_status_code(self):
+        self.assertEqual(metrics.get_status_code("200 OK", ()), "200")
+        headers = [('X-Exception', '"107 Invalid argument passed"')]
+        self.assertEqual(metrics.get_status_code("550 Exception", headers),
+                         "107")
+        headers = [('X-Exception', '"ValueError: Action failed"')]
+        self.assertEqual(metrics.get_status_code("550 Exception", headers),
+                         "550")
+
+    def test_get_request_labels(self):
+        environ = {
+            'HTTP_X_VERSION': "1.0",
+            'HTTP_X_SERVICE': "test",
+            'HTTP_X_ACTION': "hello",
+        }
+        self.assertEqual(metrics.get_request_labels(environ, "200"),
+                         ("perform", "test", "1.0", "hello"))
+        #values of requests for missing services are not used
+        self.assertEqual(metrics.get_request_labels(environ, "453"),
+                         ("perform", "", "", ""))
+        environ['HTTP_X_MODE'] = "random"
+        self.assertEqual(metrics.get_request_labels(environ, "450"),
+                         ("unknown", "", "", ""))
+
+    def test_version_labels(self):
+        environ = {'HTTP_X_VERSION': "01.0", 'HTTP_X_SERVICE': "test"}
+        #requested versions are normalized
+        self.assertEqual(metrics.get_request_labels(environ, "200")[2],
+                         "1.0")
+        environ['HTTP_X_SERVICE'] = "test;1.x"
+        self.assertEqual(metrics.get_request_labels(environ, "200")[2], "")
+
+        #when versions can be resolved the schema version is used
+        resolved = []
+
+        def resolve_version(service, version, x_version):
+            resolved.append((service, version, x_version))
+            return "1.2"
+
+        labels = metrics.get_request_labels(environ, "200", resolve_version)
+        self.assertEqual(labels[2], "1.2")
+        self.assertEqual(resolved, [("test", "1.x", "01.0")])
+
+    def test_threads_are_added_together(self):
+        node_metrics = metrics.Metrics()
+        environ = {'HTTP_X_MODE': "version", 'HTTP_X_SERVICE': "test",
+                   'HTTP_X_VERSION': "1.0"}
+
+        def record_requests():
+            for index in range(10):
+                start_time = node_metrics.request_started()
+                node_metrics.request_finished(start_time, environ, "200 OK")
+
+        threads = [threading.Thread(target=record_requests)
+                   for index in range(4)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        node_metrics.request_started()
+        collected = node_metrics.collect()
+        key = ("version", "test", "1.0", "", "200")
+        self.assertEqual(collected.requests, {key: 40})
+        self.assertEqual(collected.started - collected.finished, 1)
+        histogram = collected.latencies[key[:-1]]
+        self.assertEqual(sum(histogram[:-1]), 40)
+
+
+class MiddlewareMetricsTestCase(unittest.TestCase):
+    """Test case for metrics recorded by the middleware"""
+
+    def setUp(self):
+        self.middleware = XHTTPNodeMiddleware(SERVICE_DIR)
+        #series have the process ID of the worker as label
+        self.worker = 'worker="%s"' % os.getpid()
+        self.requests_total = 'xhttp_requests_total{%s,' % self.worker
+
+    def get_response(self, path="/", **headers):
+        headers = dict((name.replace("_", "-"), value)
+                       for (name, value) in headers.items())
+        request = WebObRequest.blank(path, headers=headers)
+
+        return request.get_response(self.middleware)
+
+    def test_metrics(self):
+        self.get_response(X_Version="1.0", X_Mode="info", X_Service="test")
+        self.get_response(X_Version="1.0", X_Service="test",
+                          X_Action="hello")
+        self.get_response(X_Version="1.0", X_Service="test",
+                          X_Action="test")
+        self.get_response(X_Version="1.0", X_Mode="info", X_Service="other")
+
+        response = self.get_response("/metrics")
+        self.assertEqual(response.status, "200 OK")
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        body = response.body
+        self.assertIn(self.requests_total + 'mode="info",service="test",'
+                      'version="1.0",action="",code="200"} 1', body)
+        self.assertIn(self.requests_total + 'mode="perform",service="test",'
+                      'version="1.0",action="hello",code="200"} 1', body)
+        #protocol errors are counted by their XHTTP code
+        self.assertIn(self.requests_total + 'mode="perform",service="test",'
+                      'version="1.0",action="test",code="106"} 1', body)
+        self.assertIn(self.requests_total + 'mode="info",service="",'
+                      'version="",action="",code="453"} 1', body)
+        self.assertIn('xhttp_request_duration_seconds_count{%s,mode="perform",'
+                      'service="test",version="1.0",action="hello"} 1'
+                      % self.worker, body)
+        #metrics requests are not recorded
+        self.assertIn("xhttp_requests_in_flight{%s} 0" % self.worker, body)
+        self.assertIn("xhttp_services_loaded{%s} 1" % self.worker, body)
+
+        #metrics are also available using an X-Mode
+        response = self.get_response(X_Mode="metrics")
+        self.assertEqual(response.body.split("\n")[0],
+                         body.split("\n")[0])
+
+    def test_malformed_x_service(self):
+        response = self.get_response(X_Version="1.0", X_Mode="info",
+                                     X_Service="test;1.0;x")
+        #everything after the first ';' is the requested version
+        self.assertEqual(response.status, "551 XHTTP Version Not Supported")
+        body = self.get_response("/metrics").body
+        self.assertIn(self.requests_total + 'mode="info",service="test",'
+                      'version="",action="",code="551"} 1', body)
+
+    def test_schema_version_labels(self):
+        self.get_response(X_Version="01.0", X_Mode="info", X_Service="test")
+        self.get_response(X_Version="1.0", X_Mode="info",
+                          X_Service="test;1")
+        body = self.get_response("/metrics").body
+        #labels have the schema version used, not the requested one
+        self.assertNotIn('version="01.0"', body)
+        self.assertIn(self.requests_total + 'mode="info",service="test",'
+                      'version="2.0",action="",code="200"} 1', body)
+        self.assertIn(self.requests_total + 'mode="info",service="test",'
+                      'version="1.2",action="",code="200"} 1', body)
+
+    def test_recording_errors_are_not_raised(self):
+        recorder = self.middleware.metrics
+        start_time = recorder.request_started()
+        #invalid headers must only be logged
+        recorder.request_finished(start_time, {}, "550 Exception", None)
+
+    def test_metrics_disabled(self):
+        self.middleware = XHTTPNodeMiddleware(SERVICE_DIR, metrics=False)
+        response = self.get_response(X_Mode="metrics")
+        self.assertEqual(response.status, "450 Mode Not Supported")
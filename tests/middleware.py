@@ -0,0 +1,101 @@
+# -*- coding: utf8 -*-
+import os
+import unittest
+
+from webob import Request as WebObRequest
+
+from xhttpnode.middleware import XHTTPNodeMiddleware
+
+from tests.node import create_request
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+class MiddlewareTestCase(unittest.TestCase):
+    """Test case for the middleware module"""
+
+    def setUp(self):
+        self.middleware = XHTTPNodeMiddleware(SERVICE_DIR)
+
+    def get_response(self, body=None, **headers):
+        headers = dict((name.replace("_", "-"), value)
+                       for (name, value) in headers.items())
+        request = WebObRequest.blank("/", headers=headers, POST=body)
+
+        return request.get_response(self.middleware)
+
+    def test_metadata_modes(self):
+        for mode in ("version", "info", "schema"):
+            response = self.get_response(X_Version="1.0", X_Mode=mode,
+                                         X_Service="test")
+            self.assertEqual(response.status, "200 OK")
+            self.assertEqual(response.headers['Server'], "XHTTP Python node")
+            #metadata responses must be the same as node responses
+            node = self.middleware.node
+            request = create_request(node, x_version="1.0", x_mode=mode,
+                                     x_service="test")
+            node_response = node.process_request(request)
+            self.assertEqual(response.body, node_response.body)
+
+    def test_metadata_errors(self):
+        response = self.get_response(X_Version="1.0", X_Mode="info",
+                                     X_Service="missing")
+        self.assertEqual(response.status, "453 Service Not Found")
+        self.assertEqual(response.body, "453 Service Not Found")
+
+        response = self.get_response(X_Mode="info", X_Service="test")
+        self.assertEqual(response.status, "551 XHTTP Version Not Supported")
+
+    def test_perform(self):
+        response = self.get_response("text=hello", X_Version="1.0",
+                                     X_Service="test", X_Action="test",
+                                     X_Encoding="utf-8")
+        self.assertEqual(response.status, "200 OK")
+        self.assertEqual(response.body, '"hello"')
+
+        response = self.get_response(X_Version="1.0", X_Service="test",
+                                     X_Action="error")
+        self.assertEqual(response.status, "550 Exception")
+        self.assertIn("ValueError", response.headers['X-Exception'])
+
+    def test_conditional_metadata_requests(self):
+        response = self.get_response(X_Version="1.0", X_Mode="schema",
+                                     X_Service="test")
+        etag = response.headers['ETag']
+        self.assertNotIn('Cache-Control', response.headers)
+
+        response = self.get_response(X_Version="1.0", X_Mode="schema",
+                                     X_Service="test", If_None_Match=etag)
+        self.assertEqual(response.status, "304 Not Modified")
+        self.assertEqual(response.body, "")
+        self.assertEqual(response.headers['ETag'], etag)
+
+        response = self.get_response(X_Version="1.0", X_Mode="schema",
+                                     X_Service="test",
+                                     If_None_Match='"other", W/%s' % etag)
+        self.assertEqual(response.status, "304 Not Modified")
+
+        #each response has its own entity tag
+        response = self.get_response(X_Version="1.0", X_Mode="info",
+                                     X_Service="test", If_None_Match=etag)
+        self.assertEqual(response.status, "200 OK")
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+        #compressed responses have a different entity tag
+        self.middleware.node.compressor.min_size = 10
+        response = self.get_response(X_Version="1.0", X_Mode="schema",
+                                     X_Service="test", If_None_Match=etag,
+                                     Accept_Encoding="gzip")
+        self.assertEqual(response.status, "200 OK")
+        self.assertEqual(response.headers['ETag'], etag[:-1] + '-gzip"')
+
+    def test_cache_control(self):
+        middleware = XHTTPNodeMiddleware(SERVICE_DIR,
+                                         cache_control="max-age=60")
+        request = WebObRequest.blank("/", headers={
+            'X-Version': "1.0",
+            'X-Mode': "version",
+            'X-Service': "test",
+        })
+        response = request.get_response(middleware)
+        self.assertEqual(response.headers['Cache-Control'], "max-age=60")
@@ -0,0 +1,147 @@
+# -*- coding: utf8 -*-
+import os
+import unittest
+
+from xhttpnode import error
+from xhttpnode import model
+from xhttpnode import schema
+from xhttpnode.schema import ET
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+class ModelTestCase(unittest.TestCase):
+    """Test case for the model module"""
+
+    def setUp(self):
+        file_name = os.path.join(SERVICE_DIR, "test.xml")
+        self.schemas = schema.parse_schema_document(file_name)
+
+    def test_compile_action(self):
+        action_dict = self.schemas['1.0']['actions']['test']
+        action = model.compile_action(action_dict)
+
+        self.assertEqual(action.name, "test")
+        self.assertEqual(action.function, "test")
+        #types must be converted to integers
+        self.assertEqual(action.return_type, 4)
+        self.assertEqual(action.exception_codes, frozenset([99]))
+        self.assertEqual(action.argument_names, frozenset(["text"]))
+        self.assertEqual(action.arguments[0].type, 4)
+        self.assertEqual(action.to_list(), [
+            "test",
+            [[u"You must pass a string of textñññ", 99]],
+            [["text", 4]],
+            4,
+        ])
+        #actions are concurrent unless schema disables it
+        self.assertTrue(action.concurrent)
+        action_dict = dict(action_dict, concurrent="false")
+        self.assertFalse(model.compile_action(action_dict).concurrent)
+
+    def test_compile_cache_options(self):
+        action_dict = self.schemas['1.0']['actions']['test']
+        action = model.compile_action(action_dict)
+        #results are not cached unless schema gives a TTL
+        self.assertIsNone(action.cache_ttl)
+        self.assertIsNone(action.cache_size)
+
+        action_dict = dict(action_dict, **{'cache-ttl': "30",
+                                           'cache-size': "10"})
+        action = model.compile_action(action_dict)
+        self.assertEqual(action.cache_ttl, 30.0)
+        self.assertEqual(action.cache_size, 10)
+
+        action_dict['cache-size'] = "none"
+        self.assertRaises(schema.SchemaParseError, model.compile_action,
+                          action_dict)
+
+    def test_compile_schema(self):
+        schema_version = model.compile_schema(self.schemas['1.0'])
+
+        self.assertEqual(schema_version.version, "1.0")
+        self.assertEqual(len(schema_version.actions), 3)
+        self.assertIn("hello", schema_version.actions)
+        #info must be sorted by field name
+        info_names = [name for (name, value) in schema_version.info]
+        self.assertEqual(info_names, sorted(info_names))
+        self.assertEqual(schema_version.get_info("service"), "example")
+        self.assertEqual(schema_version.get_info("missing"), None)
+
+    def test_compile_service(self):
+        service = model.compile_service("test", self.schemas)
+
+        self.assertEqual(service.name, "test")
+        #meta information must not be used as a version
+        self.assertEqual(sorted(service.versions),
+                         ["1.0", "1.1", "1.2", "2.0"])
+        self.assertEqual(service.file, self.schemas['__meta__']['file'])
+        self.assertEqual(service.mtime, self.schemas['__meta__']['mtime'])
+        self.assertIn("2.0", service)
+        self.assertEqual(service["2.0"].version, "2.0")
+
+    def compile_action_xml(self, xml):
+        element = ET.XML("""
+            <xhttp xmlns:xhttp="http://www.xhttp.org/schema" version="1.0">
+                %s
+            </xhttp>
+        """ % xml)
+        action_element = list(element.iter(schema.ns('action')))[0]
+
+        return model.compile_action(schema.parse_action_element(action_element))
+
+    def test_compile_argument_properties(self):
+        action = self.compile_action_xml("""
+            <xhttp:action name="find" function="find">
+                <xhttp:argument name="text" type="4" validate="[a-z]+"/>
+                <xhttp:argument name="limit" type="2" default="10"/>
+                <xhttp:return type="5"/>
+            </xhttp:action>
+        """)
+
+        self.assertEqual(action.required_names, frozenset(["text"]))
+        self.assertEqual(action.argument_types, {'text': 4, 'limit': 2})
+        #default values must be converted to argument type
+        self.assertEqual(action.defaults, {'limit': 10})
+        self.assertEqual(len(action.validators), 1)
+
+        self.assertRaises(schema.SchemaParseError, self.compile_action_xml, """
+            <xhttp:action name="find" function="find">
+                <xhttp:argument name="limit" type="2" default="ten"/>
+                <xhttp:return type="5"/>
+            </xhttp:action>
+        """)
+
+    def test_validate(self):
+        action = self.compile_action_xml("""
+            <xhttp:action name="find" function="find">
+                <xhttp:argument name="text" type="4" validate="[a-z]+"/>
+                <xhttp:argument name="limit" type="2" default="10"/>
+                <xhttp:return type="5"/>
+            </xhttp:action>
+        """)
+
+        values = action.validate({'text': u"abc"})
+        #default values are added for missing optional arguments
+        self.assertEqual(values, {'text': u"abc", 'limit': 10})
+
+        self.assertRaises(error.Error106, action.validate, {'limit': 1})
+        #values must match the whole validate expression
+        self.assertRaises(error.Error107, action.validate, {'text': u"abc1"})
+        #X-Arguments must match schema names and types
+        self.assertRaises(error.Error107, action.validate, {'text': u"abc"},
+                          {'text': 4, 'other': 4})
+        self.assertRaises(error.Error107, action.validate, {'text': u"abc"},
+                          {'text': 2})
+
+    def test_validate_raw_bytes(self):
+        action = self.compile_action_xml("""
+            <xhttp:action name="find" function="find">
+                <xhttp:argument name="text" type="4" validate="[a-z]+"/>
+                <xhttp:return type="5"/>
+            </xhttp:action>
+        """)
+        #values of x-user-defined encoding are not decoded
+        self.assertEqual(action.validate({'text': "abc"}), {'text': "abc"})
+        self.assertRaises(error.Error107, action.validate,
+                          {'text': "\xc3\xa9"})
@@ -0,0 +1,232 @@
+# -*- coding: utf8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+import simplejson
+from webob.request import environ_from_url
+
+from xhttpnode import error
+from xhttpnode.node import Node
+from xhttpnode.request import Request
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+def create_request(node, **headers):
+    """Create an XHTTP request for a node with the given headers"""
+    environ = environ_from_url("/")
+    for (name, value) in headers.items():
+        name = "HTTP_%s" % name.upper().replace("-", "_")
+        environ[name] = value
+
+    return Request(node, environ)
+
+
+class NodeTestCase(unittest.TestCase):
+    """Test case for the node module"""
+
+    def setUp(self):
+        self.node = Node(SERVICE_DIR)
+
+    def test_load_services_in_processes(self):
+        schema_files = self.node._find_schema_files()
+        schema_files['other'] = schema_files['test']
+        services = self.node._load_services(schema_files, processes=2)
+
+        self.assertEqual(sorted(services), ["other", "test"])
+        self.assertEqual(services['other'].name, "other")
+        self.assertEqual(sorted(services['test'].versions),
+                         sorted(self.node.services['test'].versions))
+
+    def test_build_service_responses(self):
+        responses = self.node.responses['test']
+        #version responses are the same for every version
+        version_parts = responses[('version', '1.0', None)]
+        self.assertIs(version_parts, responses[('version', '2.0', None)])
+        (status, headers, body) = version_parts
+        self.assertEqual(status, "200 OK")
+        self.assertIn(('Content-Length', str(len(body))), headers)
+        self.assertEqual(simplejson.loads(body), ["1.0", "1.1", "1.2", "2.0"])
+
+        #there must be a schema response for each action
+        self.assertIn(('schema', '1.0', 'test'), responses)
+        self.assertIn(('schema', '1.0', None), responses)
+        (status, headers, body) = responses[('schema', '1.0', 'test')]
+        action_list = simplejson.loads(body)
+        self.assertEqual(action_list[0][0], "test")
+        self.assertEqual(action_list[0][2], [["text", 4]])
+
+    def test_get_response_parts(self):
+        request = create_request(self.node, x_version="1.0", x_mode="info",
+                                 x_service="test")
+        parts = self.node.get_response_parts(request)
+        #response must be served from responses table
+        self.assertIs(parts, self.node.responses['test'][('info', '1.0', None)])
+        self.assertIs(self.node.get_response_body(request), parts[2])
+
+    def test_get_response_body_errors(self):
+        request = create_request(self.node, x_version="1.0", x_mode="info",
+                                 x_service="missing")
+        self.assertRaises(error.ServiceNotFoundError,
+                          self.node.get_response_body, request)
+
+        request = create_request(self.node, x_version="1.0", x_mode="schema",
+                                 x_service="test", x_action="missing")
+        self.assertRaises(error.ActionNotFoundError,
+                          self.node.get_response_body, request)
+
+        request = create_request(self.node, x_version="1.0", x_mode="bad",
+                                 x_service="test")
+        self.assertRaises(error.ModeNotSupportedError,
+                          self.node.get_response_body, request)
+
+    def test_x_service_version(self):
+        def get_info_version(**headers):
+            request = create_request(self.node, x_version="1.0",
+                                     x_mode="info", **headers)
+            info = dict(simplejson.loads(self.node.get_response_body(request)))
+
+            return info['version']
+
+        self.assertEqual(get_info_version(x_service="test"), "1.0")
+        self.assertEqual(get_info_version(x_service="test;1.1"), "1.1")
+        #major version selects the latest compatible version
+        self.assertEqual(get_info_version(x_service="test;1"), "1.2")
+        self.assertRaises(error.VersionNotSupportedError, get_info_version,
+                          x_service="test;3.0")
+
+        request = create_request(self.node, x_version="1.0",
+                                 x_service="test;2.0", x_action="hello22")
+        self.assertEqual(self.node.get_action(request).name, "hello22")
+
+    def test_resolve_version(self):
+        self.assertEqual(self.node.resolve_version("test"), "2.0")
+        self.assertEqual(self.node.resolve_version("test", "1"), "1.2")
+        self.assertEqual(self.node.resolve_version("test", None, "1.1"),
+                         "1.1")
+        self.assertIsNone(self.node.resolve_version("test", "01.0"))
+        self.assertIsNone(self.node.resolve_version("missing"))
+
+    def test_is_supported_version(self):
+        self.assertTrue(self.node.is_supported_version("1.0"))
+        self.assertFalse(self.node.is_supported_version("1.1"))
+        #versions are compared as numbers and not as strings
+        self.assertFalse(self.node.is_supported_version("10.0"))
+        self.assertFalse(self.node.is_supported_version(""))
+
+
+class NodeReloadTestCase(unittest.TestCase):
+    """Test case for schema reloading in nodes"""
+
+    def setUp(self):
+        self.service_dir = tempfile.mkdtemp()
+        self.copy_schema("test")
+        self.node = Node(self.service_dir)
+
+    def tearDown(self):
+        self.node.stop_watcher()
+        shutil.rmtree(self.service_dir)
+
+    def copy_schema(self, name, mtime=None):
+        file_name = os.path.join(self.service_dir, "%s.xml" % name)
+        shutil.copy(os.path.join(SERVICE_DIR, "test.xml"), file_name)
+        if mtime:
+            os.utime(file_name, (mtime, mtime))
+
+        return file_name
+
+    def test_reload_unchanged(self):
+        registry = self.node.registry
+        self.assertFalse(self.node.reload())
+        #registry must not be replaced when nothing changed
+        self.assertIs(registry, self.node.registry)
+
+    def test_reload_added_and_changed(self):
+        test_service = self.node.services['test']
+        self.copy_schema("other")
+        self.assertTrue(self.node.reload())
+        self.assertIn("other", self.node.services)
+        self.assertIn("other", self.node.responses)
+        #unchanged services must not be parsed again
+        self.assertIs(test_service, self.node.services['test'])
+
+        self.copy_schema("test", mtime=1)
+        self.assertTrue(self.node.reload())
+        self.assertIsNot(test_service, self.node.services['test'])
+
+    def test_reload_deleted(self):
+        registry = self.node.registry
+        os.remove(os.path.join(self.service_dir, "test.xml"))
+        self.assertTrue(self.node.reload())
+        self.assertNotIn("test", self.node.services)
+        self.assertNotIn("test", self.node.responses)
+        #previous registry must remain untouched
+        self.assertIn("test", registry.services)
+
+    def test_reload_invalid_file(self):
+        test_service = self.node.services['test']
+        file_name = os.path.join(self.service_dir, "test.xml")
+        with open(file_name, "w") as schema_file:
+            schema_file.write("<xhttp")
+
+        self.node.reload()
+        #previous schema is kept when file can't be parsed
+        self.assertIs(test_service, self.node.services['test'])
+
+
+class NodeLazyTestCase(unittest.TestCase):
+    """Test case for nodes that load services on demand"""
+
+    def setUp(self):
+        self.service_dir = tempfile.mkdtemp()
+        for name in ("first", "second", "third"):
+            file_name = os.path.join(self.service_dir, "%s.xml" % name)
+            shutil.copy(os.path.join(SERVICE_DIR, "test.xml"), file_name)
+
+        self.node = Node(self.service_dir, lazy=True, max_services=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.service_dir)
+
+    def get_info(self, service_name):
+        request = create_request(self.node, x_version="1.0", x_mode="info",
+                                 x_service=service_name)
+
+        return self.node.get_response_body(request)
+
+    def test_services_loaded_on_demand(self):
+        #services must not be loaded until they are used
+        self.assertEqual(self.node.services, {})
+        self.assertEqual(sorted(self.node.registry.schema_files),
+                         ["first", "second", "third"])
+
+        self.get_info("first")
+        self.assertEqual(self.node.services.keys(), ["first"])
+        self.assertIn("first", self.node.responses)
+
+        request = create_request(self.node, x_version="1.0", x_mode="info",
+                                 x_service="missing")
+        self.assertRaises(error.ServiceNotFoundError,
+                          self.node.get_response_body, request)
+
+    def test_least_recently_used_service_is_unloaded(self):
+        self.get_info("first")
+        self.get_info("second")
+        self.get_info("first")
+        self.get_info("third")
+        #second service is the least recently used one
+        self.assertEqual(sorted(self.node.services), ["first", "third"])
+        self.assertEqual(sorted(self.node.responses), ["first", "third"])
+
+    def test_reload_unloads_changed_services(self):
+        self.get_info("first")
+        file_name = os.path.join(self.service_dir, "first.xml")
+        os.utime(file_name, (1, 1))
+        os.remove(os.path.join(self.service_dir, "second.xml"))
+
+        self.assertTrue(self.node.reload())
+        self.assertEqual(self.node.services, {})
+        self.assertEqual(sorted(self.node.registry.schema_files),
+                         ["first", "third"])
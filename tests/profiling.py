@@ -0,0 +1,114 @@
+# -*- coding: utf8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from webob import Request as WebObRequest
+
+from xhttpnode import profiling
+from xhttpnode.middleware import XHTTPNodeMiddleware
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+class ProfilingTestCase(unittest.TestCase):
+    """Test case for the profiling module"""
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def get_response(self, profiler, **headers):
+        middleware = XHTTPNodeMiddleware(SERVICE_DIR, profiler=profiler)
+        headers = dict((name.replace("_", "-"), value)
+                       for (name, value) in headers.items())
+        request = WebObRequest.blank("/", headers=headers)
+        response = request.get_response(middleware)
+
+        return (request, response)
+
+    def test_is_selected(self):
+        profiler = profiling.Profiler(targets=["test:hello", "other"])
+        environ = {'HTTP_X_SERVICE': "test", 'HTTP_X_ACTION': "hello"}
+        self.assertTrue(profiler.is_selected(environ))
+        environ['HTTP_X_ACTION'] = "error"
+        self.assertFalse(profiler.is_selected(environ))
+        environ['HTTP_X_SERVICE'] = "other;1.0"
+        self.assertTrue(profiler.is_selected(environ))
+
+        profiler = profiling.Profiler(sample_rate=1.0)
+        self.assertTrue(profiler.is_selected({}))
+
+        #a threshold alone only records stage times
+        profiler = profiling.Profiler(slow_threshold=1.0)
+        self.assertFalse(profiler.is_selected({}))
+
+    def test_dump_slow_requests(self):
+        profiler = profiling.Profiler(slow_threshold=0,
+                                      output_dir=self.output_dir)
+        self.get_response(profiler, X_Version="1.0", X_Service="test",
+                          X_Action="hello")
+        #slow requests are only logged when they are not selected
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+        profiler = profiling.Profiler(sample_rate=1.0, slow_threshold=0,
+                                      output_dir=self.output_dir)
+        self.get_response(profiler, X_Version="1.0", X_Service="test",
+                          X_Action="hello")
+        self.assertEqual(len(os.listdir(self.output_dir)), 1)
+
+    def test_perform_stages(self):
+        profiler = profiling.Profiler(slow_threshold=60)
+        (request, response) = self.get_response(profiler, X_Version="1.0",
+                                                X_Service="test",
+                                                X_Action="hello")
+        self.assertEqual(response.body, '"Hello World"')
+        stages = request.environ['xhttp.stages']
+        self.assertEqual([name for (name, seconds) in stages.stages], [
+            profiling.STAGE_HEADER_PARSE,
+            profiling.STAGE_VERSION_CHECK,
+            profiling.STAGE_SCHEMA_LOOKUP,
+            profiling.STAGE_DISPATCH,
+            profiling.STAGE_SERIALIZATION,
+            profiling.STAGE_RESPONSE,
+        ])
+        #fast requests are not saved
+        self.assertEqual(profiler.dumps, 0)
+
+    def test_dump_profiles(self):
+        profiler = profiling.Profiler(targets=["test"], slow_threshold=0,
+                                      output_dir=self.output_dir,
+                                      max_dumps=1)
+        for index in range(2):
+            self.get_response(profiler, X_Version="1.0", X_Mode="info",
+                              X_Service="test")
+
+        #only the first profile is saved
+        file_names = os.listdir(self.output_dir)
+        self.assertEqual(len(file_names), 1)
+        self.assertTrue(file_names[0].startswith("xhttp-test-None-"))
+
+    def test_dump_file_names(self):
+        profiler = profiling.Profiler(targets=["test"],
+                                      output_dir=self.output_dir)
+        (request, response) = self.get_response(
+            profiler, X_Version="1.0", X_Service="test",
+            X_Action="../" + "a" * 300)
+        self.assertEqual(response.status, "454 Action Not Found")
+        #client values are shortened and can't be used as paths
+        file_names = os.listdir(self.output_dir)
+        self.assertEqual(len(file_names), 1)
+        self.assertTrue(file_names[0].startswith(
+            "xhttp-test-.._" + "a" * 29 + "-"))
+
+    def test_dump_errors_are_not_raised(self):
+        output_dir = os.path.join(self.output_dir, "missing")
+        profiler = profiling.Profiler(sample_rate=1.0, output_dir=output_dir)
+        (request, response) = self.get_response(profiler, X_Version="1.0",
+                                                X_Service="test",
+                                                X_Action="hello")
+        self.assertEqual(response.body, '"Hello World"')
+        self.assertEqual(profiler.dumps, 1)
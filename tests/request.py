@@ -0,0 +1,63 @@
+# -*- coding: utf8 -*-
+import os
+import unittest
+
+from webob.request import environ_from_url
+
+from xhttpnode import error
+from xhttpnode.node import Node
+from xhttpnode.request import Request
+from xhttpnode.request import RequestException
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+class RequestTestCase(unittest.TestCase):
+    """Test case for the request module"""
+
+    def setUp(self):
+        self.node = Node(SERVICE_DIR)
+
+    def create_request(self, body="", **headers):
+        environ = environ_from_url("/")
+        for (name, value) in headers.items():
+            name = "HTTP_%s" % name.upper()
+            environ[name] = value
+
+        request = Request(self.node, environ)
+        request.method = "POST"
+        request.body = body
+
+        return request
+
+    def test_x_arguments(self):
+        request = self.create_request(x_arguments="text;4,count;2")
+        self.assertEqual(request.x_arguments, {'text': 4, 'count': 2})
+
+        request = self.create_request(x_arguments="text;string")
+        self.assertRaises(RequestException, getattr, request, "x_arguments")
+
+        request = self.create_request()
+        self.assertEqual(request.x_arguments, None)
+
+    def test_x_arguments_values(self):
+        request = self.create_request("text=hello", x_version="1.0",
+                                      x_service="test", x_action="test",
+                                      x_encoding="utf-8")
+        values = request.x_arguments_values
+        self.assertEqual(values, {'text': u"hello"})
+        #values are decoded only once
+        self.assertIs(values, request.x_arguments_values)
+
+    def test_x_arguments_values_invalid_encoding(self):
+        request = self.create_request("text=hello", x_version="1.0",
+                                      x_service="test", x_action="test",
+                                      x_encoding="invalid")
+        self.assertRaises(error.Error107,
+                          getattr, request, "x_arguments_values")
+
+    def test_x_arguments_values_missing(self):
+        request = self.create_request("", x_version="1.0", x_service="test",
+                                      x_action="test")
+        self.assertRaises(error.Error106,
+                          getattr, request, "x_arguments_values")
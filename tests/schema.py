@@ -1,9 +1,16 @@
 # -*- coding: utf8 -*-
+import os
+import shutil
+import tempfile
 import unittest
 
+from StringIO import StringIO
+
 from xhttpnode import schema
 from xhttpnode.schema import ET
 
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
 
 class SchemaTestCase(unittest.TestCase):
     """Test case for the schema module"""
@@ -98,3 +105,53 @@ class SchemaTestCase(unittest.TestCase):
         self.assertIn('name', first_argument)
         self.assertIn('type', first_argument)
 
+    def test_iterparse_schemas(self):
+        #streaming parser must return the same result as tree parser
+        file_name = os.path.join(SERVICE_DIR, "test.xml")
+        tree = ET.parse(file_name)
+        self.assertEqual(schema.iterparse_schemas(file_name),
+                         schema.parse_schema_tree(tree))
+
+    def test_iterparse_schemas_ignores_actions_outside_schema(self):
+        source = StringIO("""
+            <xhttp xmlns:xhttp="http://www.xhttp.org/schema" version="1.0">
+                <xhttp:action name="orphan" function="orphan">
+                    <xhttp:return type="0"/>
+                </xhttp:action>
+                <xhttp:schema version="1.0">
+                    <xhttp:info name="service" value="example"/>
+                </xhttp:schema>
+            </xhttp>
+        """)
+        schemas = schema.iterparse_schemas(source)
+
+        self.assertEqual(schemas.keys(), ["1.0"])
+        self.assertEqual(schemas["1.0"]['info'], {'service': "example"})
+        self.assertEqual(schemas["1.0"]['actions'], {})
+
+    def test_parse_schema_documents(self):
+        file_name = os.path.join(SERVICE_DIR, "test.xml")
+        schemas_list = schema.parse_schema_documents([file_name] * 3,
+                                                     processes=2)
+
+        self.assertEqual(len(schemas_list), 3)
+        self.assertEqual(schemas_list[0], schema.parse_schema_document(file_name))
+
+    def test_parse_schema_documents_error(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            invalid_file_name = os.path.join(temp_dir, "invalid.xml")
+            with open(invalid_file_name, "w") as invalid_file:
+                invalid_file.write("<xhttp")
+
+            file_name = os.path.join(SERVICE_DIR, "test.xml")
+            file_names = [file_name, invalid_file_name]
+            try:
+                schema.parse_schema_documents(file_names, processes=2)
+            except schema.SchemaParseError, exc:
+                #error must report the file that can't be parsed
+                self.assertIn(invalid_file_name, str(exc))
+            else:
+                self.fail("SchemaParseError not raised")
+        finally:
+            shutil.rmtree(temp_dir)
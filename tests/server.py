@@ -0,0 +1,248 @@
+# -*- coding: utf8 -*-
+import functools
+import os
+import signal
+import socket
+import threading
+import time
+import unittest
+import urllib2
+
+from wsgiref.simple_server import make_server
+
+from webob import Request as WebObRequest
+
+from xhttpnode.__main__ import create_server
+from xhttpnode.__main__ import parse_args
+from xhttpnode.app import Application
+from xhttpnode.middleware import XHTTPNodeMiddleware
+from xhttpnode.server import KeepAliveWSGIRequestHandler
+from xhttpnode.server import PreforkServer
+from xhttpnode.server import ThreadPoolWSGIServer
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+def get_version_list(port):
+    request = urllib2.Request("http://127.0.0.1:%s/" % port, headers={
+        'X-Version': "1.0",
+        'X-Mode': "version",
+        'X-Service': "test",
+    })
+
+    return urllib2.urlopen(request, timeout=5).read()
+
+
+class ServerTestCase(unittest.TestCase):
+    """Test case for the server module"""
+
+    def test_parse_args(self):
+        (options, service_dir) = parse_args(["--port", "9000", "--workers",
+                                             "4", "--lazy", SERVICE_DIR])
+        self.assertEqual(service_dir, SERVICE_DIR)
+        self.assertEqual(options.port, 9000)
+        self.assertEqual(options.workers, 4)
+        self.assertTrue(options.lazy)
+        self.assertEqual(options.host, "localhost")
+
+    def test_create_server_perform(self):
+        server = create_server(SERVICE_DIR, "127.0.0.1", 0, threads=2)
+        port = server.socket.getsockname()[1]
+        thread = threading.Thread(target=server.serve_forever,
+                                  kwargs={'poll_interval': 0.05})
+        thread.start()
+        try:
+            request = urllib2.Request("http://127.0.0.1:%s/" % port, headers={
+                'X-Version': "1.0",
+                'X-Service': "test",
+                'X-Action': "hello",
+            })
+            body = urllib2.urlopen(request, timeout=5).read()
+            #controller of the action must handle the request
+            self.assertEqual(body, '"Hello World"')
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def test_default_server_concurrent_clients(self):
+        server = create_server(SERVICE_DIR, "127.0.0.1", 0)
+        port = server.socket.getsockname()[1]
+        thread = threading.Thread(target=server.serve_forever,
+                                  kwargs={'poll_interval': 0.05})
+        thread.start()
+        first = socket.create_connection(("127.0.0.1", port))
+        try:
+            first.sendall("GET / HTTP/1.1\r\nX-Version: 1.0\r\n"
+                          "X-Mode: version\r\nX-Service: test\r\n\r\n")
+            first.settimeout(5)
+            #server without threads must not wait for more requests of
+            #an idle connection before handling other clients
+            self.assertIn("Connection: close", first.recv(4096))
+            self.assertEqual(get_version_list(port),
+                             '["1.0","1.1","1.2","2.0"]')
+        finally:
+            first.close()
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def test_application_calls_controller(self):
+        application = XHTTPNodeMiddleware(SERVICE_DIR, app=Application())
+        request = WebObRequest.blank("/", headers={
+            'X-Version': "1.0",
+            'X-Service': "test",
+            'X-Action': "hello",
+        })
+        response = request.get_response(application)
+        self.assertEqual(response.body, '"Hello World"')
+
+    def test_prefork_server(self):
+        application = XHTTPNodeMiddleware(SERVICE_DIR)
+        server = PreforkServer("127.0.0.1", 0, application, workers=2)
+        port = server.socket.getsockname()[1]
+        pid = os.fork()
+        if not pid:
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+
+        try:
+            server.socket.close()
+            body = None
+            #wait until workers are ready
+            for retry in range(50):
+                try:
+                    body = get_version_list(port)
+                    break
+                except urllib2.URLError:
+                    time.sleep(0.1)
+
+            self.assertEqual(body, '["1.0","1.1","1.2","2.0"]')
+        finally:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+
+
+class ThreadPoolWSGIServerTestCase(unittest.TestCase):
+    """Test case for the thread pool WSGI server"""
+
+    def setUp(self):
+        self.release = threading.Event()
+
+        def application(environ, start_response):
+            #block until test releases the request
+            self.release.wait(5)
+            start_response("200 OK", [('Content-Type', "text/plain")])
+            return ["OK"]
+
+        self.server = make_server("127.0.0.1", 0, application,
+                                  server_class=ThreadPoolWSGIServer)
+        self.server.threads = 1
+        self.server.requests.maxsize = 1
+        self.port = self.server.socket.getsockname()[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.start()
+
+    def tearDown(self):
+        self.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def send_request(self):
+        connection = socket.create_connection(("127.0.0.1", self.port))
+        connection.sendall("GET / HTTP/1.0\r\n\r\n")
+
+        return connection
+
+    def test_reject_when_queue_is_full(self):
+        #first request is handled and second one waits in queue
+        connections = []
+        for index in range(2):
+            connections.append(self.send_request())
+            time.sleep(0.2)
+
+        rejected = self.send_request()
+        connections.append(rejected)
+        try:
+            self.assertTrue(rejected.recv(1024).startswith(
+                "HTTP/1.0 503 Service Unavailable"))
+
+            self.release.set()
+            for connection in connections[:2]:
+                response = connection.recv(1024)
+                self.assertIn(" 200 OK", response)
+        finally:
+            for connection in connections:
+                connection.close()
+
+
+class KeepAliveWSGIRequestHandlerTestCase(unittest.TestCase):
+    """Test case for persistent connections in WSGI servers"""
+
+    def setUp(self):
+        application = XHTTPNodeMiddleware(SERVICE_DIR)
+        handler_class = functools.partial(KeepAliveWSGIRequestHandler,
+                                          idle_timeout=0.5)
+        self.server = make_server("127.0.0.1", 0, application,
+                                  handler_class=handler_class)
+        self.port = self.server.socket.getsockname()[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.start()
+        self.connection = socket.create_connection(("127.0.0.1", self.port))
+        self.rfile = self.connection.makefile("rb")
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def read_response(self):
+        status = self.rfile.readline()
+        headers = {}
+        for line in iter(self.rfile.readline, "\r\n"):
+            (name, value) = line.split(":", 1)
+            headers[name] = value.strip()
+
+        body = self.rfile.read(int(headers['Content-Length']))
+
+        return (status, headers, body)
+
+    def test_pipelined_requests(self):
+        request = ("POST / HTTP/1.1\r\nX-Version: 1.0\r\nX-Service: test\r\n"
+                   "X-Action: test\r\nX-Encoding: utf-8\r\n"
+                   "Content-Type: application/x-www-form-urlencoded\r\n"
+                   "Content-Length: %s\r\n\r\n%s")
+        #send all requests before reading any response
+        texts = ["text=first", "text=second", "text=third"]
+        self.connection.sendall("".join(request % (len(text), text)
+                                        for text in texts))
+        for text in texts:
+            (status, headers, body) = self.read_response()
+            self.assertEqual(status, "HTTP/1.1 200 OK\r\n")
+            self.assertNotIn('Connection', headers)
+            self.assertEqual(body, '"%s"' % text.split("=")[1])
+
+    def test_connection_close(self):
+        self.connection.sendall("GET / HTTP/1.1\r\nX-Version: 1.0\r\n"
+                                "X-Mode: version\r\nX-Service: test\r\n"
+                                "Connection: close\r\n\r\n")
+        (status, headers, body) = self.read_response()
+        self.assertEqual(body, '["1.0","1.1","1.2","2.0"]')
+        self.assertEqual(headers['Connection'], "close")
+        self.assertEqual(self.rfile.read(), "")
+
+    def test_idle_timeout(self):
+        self.connection.sendall("GET / HTTP/1.0\r\nX-Version: 1.0\r\n"
+                                "X-Mode: version\r\nX-Service: test\r\n"
+                                "Connection: keep-alive\r\n\r\n")
+        (status, headers, body) = self.read_response()
+        self.assertEqual(headers['Connection'], "keep-alive")
+        #server closes connection when no request arrives
+        self.connection.settimeout(5)
+        self.assertEqual(self.rfile.read(), "")
@@ -0,0 +1,19 @@
+# -*- coding: utf8 -*-
+"""Controllers for the test service used in unit tests"""
+
+
+def hello(request, node):
+    return u"Hello World"
+
+
+def test(request, node):
+    return request.x_arguments_values.get('text')
+
+
+def error(request, node):
+    raise ValueError("Action failed")
+
+
+hello1 = hello2 = hello22 = hello
+test1 = test2 = test22 = test
+error1 = error2 = error22 = error
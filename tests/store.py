@@ -0,0 +1,113 @@
+# -*- coding: utf8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from xhttpnode import store
+from xhttpnode.node import Node
+from xhttpnode.request import MODE_VERSION
+
+from tests.node import create_request
+
+SERVICE_DIR = os.path.join(os.path.dirname(__file__), "services")
+
+
+class SchemaStoreTestCase(unittest.TestCase):
+    """Test case for the store module"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.service_dir = os.path.join(self.temp_dir, "services")
+        os.mkdir(self.service_dir)
+        self.schema_file = os.path.join(self.service_dir, "test.xml")
+        shutil.copy(os.path.join(SERVICE_DIR, "test.xml"), self.schema_file)
+        self.store_file = os.path.join(self.temp_dir, "store")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_write_and_refresh(self):
+        node = Node(SERVICE_DIR)
+        service = node.services['test']
+        responses = node.responses['test']
+        writer = store.StoreWriter(self.store_file)
+        writer.add("test", service.file, service.mtime, service.versions,
+                   responses)
+        writer.commit()
+
+        schema_store = store.SchemaStore(self.store_file)
+        self.assertEqual(schema_store.refresh(), set(["test"]))
+        #store is only mapped again when a new generation is published
+        self.assertEqual(schema_store.refresh(), set())
+
+        stored_service = schema_store.get("test")
+        self.assertEqual(stored_service.versions.latest, "2.0")
+        for (key, parts) in responses.items():
+            self.assertEqual(stored_service.get(key), parts)
+
+        #version response body is shared by all versions
+        offsets = set(entry[2] for (key, entry)
+                      in stored_service.entries.items()
+                      if key[0] == MODE_VERSION)
+        self.assertEqual(len(offsets), 1)
+
+    def test_node_store(self):
+        node = Node(self.service_dir, store_file=self.store_file)
+        #responses are served from store without parsing services
+        request = create_request(node, x_version="1.0", x_mode="version",
+                                 x_service="test")
+        self.assertEqual(node.get_response_body(request),
+                         '["1.0","1.1","1.2","2.0"]')
+        self.assertEqual(node.services, {})
+
+        #other processes use the published store
+        store_inode = os.stat(self.store_file).st_ino
+        other_node = Node(self.service_dir, store_file=self.store_file)
+        self.assertEqual(os.stat(self.store_file).st_ino, store_inode)
+        self.assertIn("test", other_node.store)
+
+        os.utime(self.schema_file, (1, 1))
+        self.assertTrue(node.reload())
+        self.assertNotEqual(os.stat(self.store_file).st_ino, store_inode)
+        self.assertEqual(node.store.get("test").mtime, 1)
+        #new generation is seen by other processes when they reload
+        self.assertTrue(other_node.reload())
+        self.assertEqual(other_node.store.get("test").mtime, 1)
+
+        os.remove(self.schema_file)
+        self.assertTrue(node.reload())
+        self.assertNotIn("test", node.store)
+
+    def test_node_store_compressed_responses(self):
+        node = Node(self.service_dir, store_file=self.store_file,
+                    compress_min_size=100)
+        request = create_request(node, x_version="1.0", x_mode="info",
+                                 x_service="test")
+        (status, headers, body) = node.get_response_parts(request, "gzip")
+        self.assertIn(('Content-Encoding', "gzip"), headers)
+        #compressed responses are read from store
+        stored_service = node.store.get("test")
+        self.assertEqual(stored_service.get(('info', '1.0', None, "gzip")),
+                         (status, headers, body))
+        self.assertEqual(node.variants, {})
+
+        #small responses are not compressed
+        request = create_request(node, x_version="1.0", x_mode="version",
+                                 x_service="test")
+        self.assertEqual(node.get_response_parts(request, "gzip"),
+                         stored_service.get(('version', '1.0', None)))
+
+    def test_store_generations_are_checked(self):
+        node = Node(self.service_dir, store_file=self.store_file)
+        other_node = Node(self.service_dir, store_file=self.store_file)
+        other_node.store_check_interval = 0
+        os.utime(self.schema_file, (1, 1))
+        self.assertTrue(node.reload())
+
+        #other processes use a new generation without reloading
+        request = create_request(other_node, x_version="1.0",
+                                 x_mode="version", x_service="test")
+        other_node.get_response_parts(request)
+        self.assertEqual(other_node.store.get("test").mtime, 1)
+
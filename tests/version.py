@@ -0,0 +1,35 @@
+# -*- coding: utf8 -*-
+import unittest
+
+from xhttpnode.version import VersionIndex
+from xhttpnode.version import parse_version
+from xhttpnode.version import sort_versions
+
+
+class VersionTestCase(unittest.TestCase):
+    """Test case for the version module"""
+
+    def test_parse_version(self):
+        self.assertEqual(parse_version("1.10"), (1, 10))
+        self.assertEqual(parse_version("2"), (2,))
+        self.assertIsNone(parse_version("1.x"))
+        self.assertIsNone(parse_version(None))
+
+    def test_sort_versions(self):
+        self.assertEqual(sort_versions(["1.10", "2.0", "1.9", "1.2"]),
+                         ["1.2", "1.9", "1.10", "2.0"])
+
+    def test_version_index(self):
+        index = VersionIndex(["1.0", "2.0", "1.10", "1.2"])
+        self.assertEqual(index.versions, ("1.0", "1.2", "1.10", "2.0"))
+        self.assertEqual(index.latest, "2.0")
+        self.assertEqual(index.ranges['1'], ("1.0", "1.2", "1.10"))
+
+        self.assertEqual(index.resolve("1.2"), "1.2")
+        #major versions resolve to the latest compatible version
+        self.assertEqual(index.resolve("1"), "1.10")
+        self.assertIsNone(index.resolve("3"))
+        self.assertIsNone(index.resolve("1.3", "1.0"))
+        #default version is used only when no version is requested
+        self.assertEqual(index.resolve(None, "1.0"), "1.0")
+        self.assertEqual(index.resolve(None, "0.9"), "2.0")
@@ -27,28 +27,98 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
+import functools
 import logging
+import optparse
 import sys
 
+from wsgiref.simple_server import WSGIServer
 from wsgiref.simple_server import make_server
 
-from xhttpnode import app
+from xhttpnode import aio
+from xhttpnode.compress import MIN_SIZE
+from xhttpnode.profiling import Profiler
 from xhttpnode.middleware import XHTTPNodeMiddleware
+from xhttpnode.server import IDLE_TIMEOUT
+from xhttpnode.server import PreforkServer
+from xhttpnode.server import ThreadPoolWSGIServer
+from xhttpnode.server import get_handler_class
 
 
-def start_node(service_dir, host='localhost', port=8888):
+def create_server(service_dir, host='localhost', port=8888, workers=1,
+                  threads=0, queue_size=64, idle_timeout=IDLE_TIMEOUT,
+                  watch_interval=None, **node_options):
+    """Create the WSGI server used by start_node
+
+    Return: A WSGI server, or a PreforkServer when more than one worker
+    is given.
+
+    """
+    #middleware calls the controllers of perform requests
+    application = XHTTPNodeMiddleware(service_dir, **node_options)
+    node = application.node
+
+    def post_fork():
+        #schemas are watched inside each worker process
+        if watch_interval:
+            node.start_watcher(watch_interval)
+
+    server_class = WSGIServer
+    if threads:
+        server_class = functools.partial(ThreadPoolWSGIServer,
+                                         threads=threads,
+                                         queue_size=queue_size)
+
+    handler_class = get_handler_class(threads, idle_timeout)
+
+    if workers > 1:
+        return PreforkServer(host, port, application, workers=workers,
+                             post_fork=post_fork,
+                             server_class=server_class,
+                             handler_class=handler_class)
+
+    post_fork()
+
+    return make_server(host, port, application, server_class=server_class,
+                       handler_class=handler_class)
+
+
+def start_node(service_dir, host='localhost', port=8888, workers=1,
+               threads=0, queue_size=64, use_asyncio=False,
+               idle_timeout=IDLE_TIMEOUT, **node_options):
     """Start serving XHTTP requests
     
     By default server listens on localhost:8888.
+    When more than one worker is given requests are handled by a pool
+    of worker processes. When threads are given each process handles
+    requests in a pool of threads, with at most queue_size requests
+    waiting for a free thread.
+    When requests are handled in threads, or in an asyncio event loop,
+    client connections are kept open between requests until they are
+    idle for idle_timeout seconds. A zero idle timeout, or a server
+    without threads, closes connections after each response.
+    When use_asyncio is given requests are handled in an asyncio event
+    loop, where perform controllers can be coroutines and other
+    controllers are run in a pool of threads.
+    Extra keyword arguments are used as Node options.
 
     """
-    #create the WSGI application that will handle requests
-    application = app.Application()
-    application = XHTTPNodeMiddleware(service_dir, app=application)
+    if use_asyncio:
+        watch_interval = node_options.pop('watch_interval', None)
+        return start_async_node(service_dir, host, port, threads,
+                                watch_interval, idle_timeout, **node_options)
+
     #create and start a WSGI server
-    server = make_server(host, port, application)
+    server = create_server(service_dir, host, port, workers, threads,
+                           queue_size, idle_timeout, **node_options)
     try:
         print "Listening for XHTTP request on %s:%s" % (host, port)
+        if workers > 1:
+            print "Using %s worker processes" % workers
+
+        if threads:
+            print "Using %s threads for each process" % threads
+
         print "Use Control-C to exit."
         server.serve_forever()
     except KeyboardInterrupt:
@@ -57,15 +127,157 @@ def start_node(service_dir, host='localhost', port=8888):
         print
 
 
+def start_async_node(service_dir, host, port, threads, watch_interval,
+                     idle_timeout, **node_options):
+    """Start serving XHTTP requests in an asyncio event loop"""
+    executor = None
+    if threads:
+        executor = aio.ThreadPoolExecutor(threads)
+
+    middleware = aio.AsyncXHTTPNodeMiddleware(service_dir, executor=executor,
+                                              **node_options)
+    if watch_interval:
+        middleware.node.start_watcher(watch_interval)
+
+    server = aio.AsyncHTTPServer(middleware, host, port,
+                                 idle_timeout=idle_timeout)
+    try:
+        print "Listening for XHTTP request on %s:%s" % (host, port)
+        print "Using asyncio event loop"
+        print "Use Control-C to exit."
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+        #start a new line
+        print
+
+
+def is_profiling_enabled(options):
+    return bool(options.profile_sample or options.profile_target
+                or options.slow_threshold is not None)
+
+
+def parse_args(args):
+    usage = "Usage: python -m xhttpnode [options] SERVICE_DIR"
+    parser = optparse.OptionParser(usage=usage)
+    parser.add_option("--host", default="localhost",
+                      help="host to listen on [default: %default]")
+    parser.add_option("--port", type="int", default=8888,
+                      help="port to listen on [default: %default]")
+    parser.add_option("--workers", type="int", default=1,
+                      help="number of worker processes [default: %default]")
+    parser.add_option("--threads", type="int", default=0,
+                      help="number of threads for each worker process")
+    parser.add_option("--queue-size", type="int", default=64,
+                      help="maximum number of requests waiting for a "
+                           "thread [default: %default]")
+    parser.add_option("--idle-timeout", type="float", default=IDLE_TIMEOUT,
+                      metavar="SECONDS",
+                      help="close client connections idle for SECONDS, "
+                           "0 closes them after each response, only used "
+                           "with --threads or --asyncio "
+                           "[default: %default]")
+    parser.add_option("--asyncio", action="store_true", default=False,
+                      help="handle requests in an asyncio event loop "
+                           "(requires trollius)")
+    parser.add_option("--batch-threads", type="int", default=4,
+                      help="number of threads used to perform the actions "
+                           "of batch requests [default: %default]")
+    parser.add_option("--no-compression", action="store_false",
+                      dest="compression", default=True,
+                      help="don't compress responses")
+    parser.add_option("--compress-min-size", type="int", default=MIN_SIZE,
+                      metavar="BYTES",
+                      help="don't compress responses smaller than BYTES "
+                           "[default: %default]")
+    parser.add_option("--cache-control", metavar="VALUE",
+                      help="Cache-Control header for metadata responses, "
+                           "for example: public, max-age=300")
+    parser.add_option("--shared-store", dest="store_file", metavar="FILE",
+                      help="keep metadata responses in FILE, a memory "
+                           "mapped file shared by all worker processes")
+    parser.add_option("--no-metrics", action="store_false", dest="metrics",
+                      default=True, help="don't record request metrics")
+    parser.add_option("--metrics-path", default="/metrics",
+                      help="URL path of metrics in Prometheus text format "
+                           "[default: %default]")
+    parser.add_option("--profile-sample", type="float", default=0.0,
+                      metavar="RATE",
+                      help="profile a fraction RATE of requests")
+    parser.add_option("--profile-target", action="append", default=[],
+                      metavar="SERVICE[:ACTION]",
+                      help="profile all requests for a service or action, "
+                           "can be given more than once")
+    parser.add_option("--slow-threshold", type="float", metavar="SECONDS",
+                      help="log stage times of requests slower than "
+                           "SECONDS and save their profiles, only sampled "
+                           "or targeted requests are profiled, since "
+                           "cProfile makes them several times slower")
+    parser.add_option("--profile-dir",
+                      help="directory where profiles are saved, by default "
+                           "they are logged")
+    parser.add_option("--processes", type="int",
+                      help="number of processes used to parse schemas")
+    parser.add_option("--watch", type="float", metavar="SECONDS",
+                      help="reload changed schemas every SECONDS")
+    parser.add_option("--cache", action="store_true", default=False,
+                      help="use a cache file for parsed schemas")
+    parser.add_option("--cache-dir",
+                      help="directory for schema cache file")
+    parser.add_option("--lazy", action="store_true", default=False,
+                      help="parse service schemas when they are first used")
+    parser.add_option("--max-services", type="int",
+                      help="maximum number of services loaded in lazy mode")
+    parser.add_option("--debug", action="store_true", default=False,
+                      help="log debug messages")
+
+    (options, args) = parser.parse_args(args)
+    if len(args) != 1:
+        parser.error("a single SERVICE_DIR is required")
+
+    if options.workers < 1:
+        parser.error("number of workers must be greater than zero")
+
+    if options.asyncio:
+        if aio.asyncio is None:
+            parser.error("--asyncio requires trollius package")
+
+        if options.workers > 1:
+            parser.error("--asyncio can't be used with more than one worker")
+
+        if is_profiling_enabled(options):
+            parser.error("--asyncio can't be used with profiling options")
+
+    return (options, args[0])
+
+
 if __name__ == "__main__":
-    #TODO: Parse arguments to support other params like port or host
-    if len(sys.argv) != 2:
-        print "Usage: python -m xhttpnode SERVICE_DIR"
-        sys.exit(1)
+    (options, service_dir) = parse_args(sys.argv[1:])
 
-    #TODO: use debugging when debug argument is available
-    logging.basicConfig(level=logging.DEBUG)
+    if options.debug:
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig(level=logging.INFO)
 
-    service_dir = sys.argv[1]
-    start_node(service_dir)
+    profiler = None
+    if is_profiling_enabled(options):
+        profiler = Profiler(sample_rate=options.profile_sample,
+                            targets=options.profile_target,
+                            slow_threshold=options.slow_threshold,
+                            output_dir=options.profile_dir)
 
+    start_node(service_dir, host=options.host, port=options.port,
+               workers=options.workers, threads=options.threads,
+               queue_size=options.queue_size, use_asyncio=options.asyncio,
+               idle_timeout=options.idle_timeout,
+               batch_threads=options.batch_threads,
+               compression=options.compression,
+               compress_min_size=options.compress_min_size,
+               cache_control=options.cache_control,
+               store_file=options.store_file,
+               metrics=options.metrics, metrics_path=options.metrics_path,
+               profiler=profiler,
+               processes=options.processes,
+               watch_interval=options.watch, cache=options.cache,
+               cache_dir=options.cache_dir, lazy=options.lazy,
+               max_services=options.max_services)
@@ -0,0 +1,368 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import logging
+import socket
+import sys
+
+from StringIO import StringIO
+from urllib import unquote
+
+try:
+    import trollius as asyncio
+    from trollius import From
+    from trollius import Return
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    asyncio = None
+
+    def coroutine(function):
+        return function
+else:
+    coroutine = asyncio.coroutine
+
+from xhttpnode import error
+from xhttpnode.middleware import XHTTPNodeMiddleware
+from xhttpnode.request import MODE_BATCH
+from xhttpnode.request import MODE_PERFORM
+from xhttpnode.request import Request
+from xhttpnode.response import Response
+from xhttpnode.response import SERVER_NAME
+from xhttpnode.response import get_error_response_parts
+from xhttpnode.server import IDLE_TIMEOUT
+
+LOG = logging.getLogger(__name__)
+
+#maximum size allowed for request line and each request header
+MAX_LINE_SIZE = 65536
+
+#status text for HTTP errors returned by the server
+BAD_REQUEST = "400 Bad Request"
+
+
+class HTTPRequestError(Exception):
+    """Exception raised when an HTTP request can't be parsed"""
+
+
+def run_wsgi(application, environ):
+    """Call a WSGI application and collect its response
+
+    Return: A tuple with status, headers and body.
+
+    Applications can also return a Response instance, like the
+    applications called by XHTTPNodeMiddleware.
+
+    """
+    response = []
+
+    def start_response(status, headers, exc_info=None):
+        response[:] = [status, headers]
+
+    result = application(environ, start_response)
+    if isinstance(result, Response):
+        return (result.status, result.headerlist, result.body)
+
+    try:
+        body = "".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+
+    (status, headers) = response
+
+    return (status, headers, body)
+
+
+class AsyncXHTTPNodeMiddleware(XHTTPNodeMiddleware):
+    """Middleware that processes XHTTP requests inside an asyncio loop
+
+    Perform controllers can be coroutine functions, which are run in the
+    event loop, so many slow requests can wait at the same time without
+    using a thread for each one. Other controllers, and the application
+    when one is assigned, are run in an executor.
+    Metadata requests are answered directly inside the loop, and batch
+    requests are processed in the executor.
+    Asyncio support requires the trollius package.
+
+    """
+
+    def __init__(self, service_dir, app=None, executor=None, loop=None,
+                 **node_options):
+        if asyncio is None:
+            raise ImportError("Asyncio mode requires trollius package")
+
+        super(AsyncXHTTPNodeMiddleware, self).__init__(service_dir, app=app,
+                                                       **node_options)
+        self.executor = executor
+        self.loop = loop or asyncio.get_event_loop()
+
+    @coroutine
+    def process_perform(self, environ):
+        """Process a perform XHTTP request
+
+        Return: A Future with a tuple with status, headers and body.
+
+        """
+        request = Request(self.node, environ)
+        try:
+            self._check_x_version(request.x_version)
+            controller = self.node.get_request_controller(request)
+            #validate arguments before calling the controller
+            request.x_arguments_values
+            if self.application:
+                environ['xhttp.controller'] = controller
+                environ['xhttp.request'] = request
+                environ['xhttp.node'] = self.node
+                #application is called in a thread like any WSGI call
+                parts = yield From(self.loop.run_in_executor(
+                    self.executor, run_wsgi, self.application, environ))
+            else:
+                if asyncio.iscoroutinefunction(controller):
+                    result = yield From(controller(request, self.node))
+                else:
+                    result = yield From(self.loop.run_in_executor(
+                        self.executor, controller, request, self.node))
+
+                response = self.node.create_response(result)
+                self.compress_response(environ, response)
+                parts = (response.status, response.headerlist, response.body)
+        except error.XHTTPError, err:
+            parts = get_error_response_parts(err)
+        except Exception, exc:
+            err = self._create_internal_error(exc)
+            parts = get_error_response_parts(err)
+
+        raise Return(parts)
+
+    @coroutine
+    def handle(self, environ):
+        """Process an XHTTP request given its WSGI environ
+
+        Return: A Future with a tuple with status, headers and body.
+
+        """
+        if self.is_metrics_request(environ):
+            raise Return(self.process_metrics())
+
+        metrics = self.metrics
+        if metrics is None:
+            parts = yield From(self._handle(environ))
+            raise Return(parts)
+
+        start_time = metrics.request_started()
+        parts = None
+        try:
+            parts = yield From(self._handle(environ))
+        finally:
+            (status, headers) = (parts or (None, ()))[:2]
+            metrics.request_finished(start_time, environ, status, headers)
+
+        raise Return(parts)
+
+    @coroutine
+    def _handle(self, environ):
+        x_mode = environ.get('HTTP_X_MODE', MODE_PERFORM)
+        if x_mode == MODE_BATCH:
+            parts = yield From(self.loop.run_in_executor(
+                self.executor, self.process_batch, environ))
+            raise Return(parts)
+
+        if x_mode != MODE_PERFORM:
+            raise Return(self.process_metadata(environ))
+
+        parts = yield From(self.process_perform(environ))
+        raise Return(parts)
+
+
+class AsyncHTTPServer(object):
+    """HTTP server for an AsyncXHTTPNodeMiddleware
+
+    Connections are kept open between requests for HTTP/1.1 clients,
+    and requests sent without waiting for responses are answered in
+    the same order they were received. An idle timeout of zero closes
+    connections after each response.
+
+    """
+
+    def __init__(self, middleware, host, port, idle_timeout=IDLE_TIMEOUT):
+        self.middleware = middleware
+        self.loop = middleware.loop
+        self.host = host
+        self.port = port
+        #seconds to wait for the next request of a connection
+        self.idle_timeout = idle_timeout
+        self.server = None
+        self.base_environ = {
+            'SERVER_NAME': socket.getfqdn(host),
+            'SERVER_PORT': str(port),
+            'SCRIPT_NAME': "",
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': "http",
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+    @coroutine
+    def _read_request(self, reader):
+        request_line = yield From(asyncio.wait_for(reader.readline(),
+                                                   self.idle_timeout or None,
+                                                   loop=self.loop))
+        if not request_line:
+            raise Return(None)
+
+        try:
+            (method, path, protocol) = request_line.split()
+        except ValueError:
+            raise HTTPRequestError("Invalid request line")
+
+        environ = dict(self.base_environ)
+        environ['REQUEST_METHOD'] = method
+        environ['SERVER_PROTOCOL'] = protocol
+        (path, separator, query) = path.partition("?")
+        environ['PATH_INFO'] = unquote(path)
+        environ['QUERY_STRING'] = query
+
+        while True:
+            line = yield From(reader.readline())
+            if len(line) > MAX_LINE_SIZE:
+                raise HTTPRequestError("Request header too long")
+
+            line = line.strip()
+            if not line:
+                break
+
+            (name, separator, value) = line.partition(":")
+            name = name.strip().upper().replace("-", "_")
+            value = value.strip()
+            if name == "CONTENT_TYPE" or name == "CONTENT_LENGTH":
+                environ[name] = value
+            else:
+                environ["HTTP_%s" % name] = value
+
+        try:
+            content_length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            raise HTTPRequestError("Invalid Content-Length")
+
+        body = ""
+        if content_length:
+            body = yield From(reader.readexactly(content_length))
+
+        environ['wsgi.input'] = StringIO(body)
+
+        raise Return(environ)
+
+    @classmethod
+    def _keep_alive(cls, environ):
+        connection = environ.get('HTTP_CONNECTION', "").lower()
+        if environ['SERVER_PROTOCOL'] == "HTTP/1.1":
+            return connection != "close"
+
+        return connection == "keep-alive"
+
+    @classmethod
+    def _write_response(cls, writer, parts, keep_alive):
+        (status, headers, body) = parts
+        lines = ["HTTP/1.1 %s" % status]
+        has_server = False
+        for (name, value) in headers:
+            lower_name = name.lower()
+            if lower_name in ("content-length", "connection"):
+                continue
+
+            has_server = has_server or lower_name == "server"
+            lines.append("%s: %s" % (name, value))
+
+        if not has_server:
+            lines.append("Server: %s" % SERVER_NAME)
+
+        lines.append("Content-Length: %s" % len(body))
+        if keep_alive:
+            lines.append("Connection: keep-alive")
+        else:
+            lines.append("Connection: close")
+
+        lines.append("")
+        lines.append(body)
+        writer.write("\r\n".join(lines))
+
+    @coroutine
+    def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    environ = yield From(self._read_request(reader))
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    break
+                except HTTPRequestError, exc:
+                    parts = (BAD_REQUEST, [], str(exc))
+                    self._write_response(writer, parts, False)
+                    break
+
+                if environ is None:
+                    break
+
+                keep_alive = (bool(self.idle_timeout)
+                              and self._keep_alive(environ))
+                parts = yield From(self.middleware.handle(environ))
+                self._write_response(writer, parts, keep_alive)
+                yield From(writer.drain())
+                if not keep_alive:
+                    break
+        except (IOError, socket.error):
+            pass
+        except Exception:
+            LOG.exception("Error handling HTTP connection")
+        finally:
+            writer.close()
+
+    @coroutine
+    def start(self):
+        """Start listening for connections"""
+        self.server = yield From(asyncio.start_server(
+            self.handle_connection, self.host, self.port, loop=self.loop))
+        #use the port that was bound when port 0 is given
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.base_environ['SERVER_PORT'] = str(self.port)
+
+    def close(self):
+        """Stop listening for connections"""
+        if self.server:
+            self.server.close()
+            self.server = None
+
+    def serve_forever(self):
+        """Start listening and run the event loop until it is stopped"""
+        self.loop.run_until_complete(self.start())
+        try:
+            self.loop.run_forever()
+        finally:
+            self.close()
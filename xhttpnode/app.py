@@ -28,20 +28,19 @@
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 
-from xhttpnode.response import Response
-
 
 class Application(object):
-    """WSGI application for XHTTP node"""
+    """WSGI application for XHTTP node
 
-    def __call__(self, environ, start_response):
-        response = Response()
-        response.content_type  = "text/html"
-        response.encoding = 'utf-8'
-        response.body = "<h1>OK</h1>"
+    Application calls the controller that the middleware found for the
+    request, and returns its result as a Response.
+
+    """
 
+    def __call__(self, environ, start_response):
         #get the controller that handle current XHTTP request
         controller = environ['xhttp.controller']
+        request = environ['xhttp.request']
+        node = environ['xhttp.node']
 
-        return response
-
+        return node.create_response(controller(request, node))
@@ -0,0 +1,310 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import logging
+import threading
+
+from multiprocessing.pool import ThreadPool
+from StringIO import StringIO
+
+import simplejson
+
+from xhttpnode import error
+from xhttpnode.datatype import ArgumentDecodeError
+from xhttpnode.datatype import check_json_value
+from xhttpnode.request import MODE_PERFORM
+from xhttpnode.request import Request
+from xhttpnode.response import JSON_CONTENT_TYPE
+from xhttpnode.response import VARY_HEADER
+from xhttpnode.response import Response
+from xhttpnode.response import build_response_parts
+
+LOG = logging.getLogger(__name__)
+
+#JSON for the result of a batch call
+ITEM_RESULT = '{"status":%s,"result":%s}'
+
+#JSON status for successful batch calls
+OK_STATUS = simplejson.dumps("200 OK")
+
+#environ keys that are not copied to batch call requests
+ITEM_IGNORED_KEYS = (
+    'HTTP_X_ARGUMENTS',
+    'xhttp.arguments',
+    'xhttp.arguments_values',
+)
+
+
+class BatchProcessor(object):
+    """Process XHTTP batch requests
+
+    Batch requests have a JSON list of calls as body, where each call
+    is an object with an "action" name and optionally the "arguments"
+    values, the XHTTP "mode" and the "service" name. Mode is perform by
+    default, and X-Service and X-Version headers of the batch request
+    are used for all calls.
+    Actions are performed at the same time in a pool of threads, except
+    the ones that are not concurrent in the schema, which are performed
+    one after the other in the request thread before any other action
+    is started, so they never run at the same time as other actions of
+    the batch. Result is a JSON list with a status and a result, or an
+    exception message, for each call in the same order as calls.
+
+    """
+
+    #maximum number of calls in a batch request
+    max_items = 100
+
+    def __init__(self, node, threads=4):
+        self.node = node
+        self.threads = threads
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        #pool is created when first used, so it is never shared by
+        #forked worker processes
+        if self._pool is None and self.threads:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPool(self.threads)
+
+        return self._pool
+
+    def close(self):
+        """Stop the threads used to perform actions"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def parse_items(self, request):
+        """Get the list of calls of a batch request
+
+        Raise error.Error104 when request body is not valid.
+
+        Return: A list of dictionaries.
+
+        """
+        try:
+            items = simplejson.loads(request.body)
+        except ValueError, exc:
+            raise error.Error104(detail=u"Invalid batch body: %s" % exc)
+
+        if not isinstance(items, list):
+            raise error.Error104(detail=u"Batch body must be a list")
+
+        if len(items) > self.max_items:
+            msg = u"Batch can't have more than %s calls" % self.max_items
+            raise error.Error104(detail=msg)
+
+        return items
+
+    def create_item_request(self, request, item):
+        """Create the XHTTP request for a call of a batch request
+
+        Return: A Request.
+
+        """
+        if not isinstance(item, dict):
+            raise error.Error104(detail=u"Batch calls must be objects")
+
+        for name in ('mode', 'action', 'service'):
+            value = item.get(name)
+            if value is not None and not isinstance(value, basestring):
+                msg = u"Batch call %s must be a string" % name
+                raise error.Error104(detail=msg)
+
+        environ = dict(request.environ)
+        for key in ITEM_IGNORED_KEYS:
+            environ.pop(key, None)
+
+        environ['HTTP_X_MODE'] = item.get('mode') or MODE_PERFORM
+        environ['HTTP_X_ACTION'] = item.get('action')
+        if item.get('service') is not None:
+            environ['HTTP_X_SERVICE'] = item['service']
+
+        environ['wsgi.input'] = StringIO("")
+        environ['CONTENT_LENGTH'] = "0"
+        for name in ('HTTP_X_MODE', 'HTTP_X_ACTION', 'HTTP_X_SERVICE'):
+            if environ.get(name) is None:
+                environ.pop(name, None)
+            else:
+                environ[name] = environ[name].encode("utf8")
+
+        return Request(self.node, environ)
+
+    @classmethod
+    def set_arguments(cls, item_request, action, arguments):
+        """Validate the argument values of a batch call
+
+        Values are assigned to the call request, so controllers get them
+        from request.x_arguments_values.
+        Raise error.Error106 or error.Error107 when values are not valid.
+
+        """
+        if arguments is None:
+            arguments = {}
+        elif not isinstance(arguments, dict):
+            msg = u"Batch call arguments must be an object"
+            raise error.Error107(detail=msg)
+
+        values = {}
+        for (name, value) in arguments.iteritems():
+            value_type = action.argument_types.get(name)
+            if value_type is None:
+                raise error.Error107(detail=name)
+
+            try:
+                check_json_value(name, value_type, value)
+            except ArgumentDecodeError, exc:
+                raise error.Error107(detail=unicode(exc))
+
+            values[name] = value
+
+        values = action.validate(values)
+        item_request.environ['xhttp.arguments_values'] = values
+
+    @classmethod
+    def get_error_result(cls, err):
+        """Get the JSON result of a batch call that raised an XHTTP error
+
+        Return: A string.
+
+        """
+        result = '{"status":%s' % simplejson.dumps(str(err))
+        for (name, value) in err.headers:
+            #exception header value is already JSON
+            if name == "X-Exception":
+                result += ',"exception":%s' % value
+
+        return result + "}"
+
+    @classmethod
+    def get_result(cls, content):
+        """Get the JSON result for the value returned by a controller
+
+        Return: A string.
+
+        """
+        if not isinstance(content, Response):
+            content = simplejson.dumps(content, separators=(",", ":"))
+
+            return ITEM_RESULT % (OK_STATUS, content)
+
+        status = simplejson.dumps(content.status)
+        if content.content_type == "application/json":
+            return ITEM_RESULT % (status, content.body)
+
+        return ITEM_RESULT % (status, simplejson.dumps(content.body))
+
+    def perform(self, controller, item_request):
+        """Perform the action of a batch call
+
+        Return: A JSON string.
+
+        """
+        try:
+            return self.get_result(controller(item_request, self.node))
+        except error.XHTTPError, err:
+            return self.get_error_result(err)
+        except Exception, exc:
+            LOG.exception("Error performing XHTTP batch call")
+
+            return self.get_error_result(self._create_internal_error(exc))
+
+    @classmethod
+    def _create_internal_error(cls, exc):
+        message = u"%s: %s" % (exc.__class__.__name__, unicode(exc))
+
+        return error.InternalExceptionError(message)
+
+    def process(self, request):
+        """Process a batch request
+
+        Raise error.XHTTPError type exceptions when batch request is not
+        valid. Errors of each call are returned inside the result list.
+
+        Return: A tuple with status, headers and body.
+
+        """
+        items = self.parse_items(request)
+        results = [None] * len(items)
+        concurrent_calls = []
+        calls = []
+        for (index, item) in enumerate(items):
+            try:
+                item_request = self.create_item_request(request, item)
+                if item_request.x_mode != MODE_PERFORM:
+                    parts = self.node.get_response_parts(item_request)
+                    results[index] = ITEM_RESULT % (OK_STATUS, parts[2])
+                    continue
+
+                controller = self.node.get_request_controller(item_request)
+                action = self.node.get_action(item_request)
+                self.set_arguments(item_request, action,
+                                   item.get('arguments'))
+            except error.XHTTPError, err:
+                results[index] = self.get_error_result(err)
+                continue
+            except Exception, exc:
+                LOG.exception("Error preparing XHTTP batch call")
+                err = self._create_internal_error(exc)
+                results[index] = self.get_error_result(err)
+                continue
+
+            if action.concurrent:
+                concurrent_calls.append((index, controller, item_request))
+            else:
+                calls.append((index, controller, item_request))
+
+        pool = None
+        if len(concurrent_calls) > 1:
+            pool = self._get_pool()
+
+        if pool is None:
+            calls = sorted(calls + concurrent_calls)
+            concurrent_calls = []
+
+        #calls that are not concurrent run before pool calls are started
+        for (index, controller, item_request) in calls:
+            results[index] = self.perform(controller, item_request)
+
+        pending = []
+        for (index, controller, item_request) in concurrent_calls:
+            pending.append((index, pool.apply_async(
+                self.perform, (controller, item_request))))
+
+        for (index, async_result) in pending:
+            results[index] = async_result.get()
+
+        body = "[%s]" % ",".join(results)
+
+        return build_response_parts(body, JSON_CONTENT_TYPE,
+                                    extra_headers=(VARY_HEADER,))
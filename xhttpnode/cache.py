@@ -0,0 +1,198 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import hashlib
+import logging
+import marshal
+import os
+import sys
+import tempfile
+
+LOG = logging.getLogger(__name__)
+
+#version of the cache file format
+CACHE_FORMAT_VERSION = 1
+
+#first line of cache files
+CACHE_HEADER = "XHTTPNODE-SCHEMA-CACHE %s PYTHON %s.%s\n" % (
+    CACHE_FORMAT_VERSION,
+    sys.version_info[0],
+    sys.version_info[1],
+)
+
+
+def get_cache_file_name(service_dir, cache_dir=None):
+    """Get the name of the schema cache file for a service directory
+
+    By default cache file is saved next to the service directory.
+    When a cache directory is given the file name also contains a hash
+    of the service directory path, so different service directories
+    can share the same cache directory.
+
+    Return: A string.
+
+    """
+    service_dir = os.path.abspath(service_dir).rstrip(os.sep)
+    base_name = os.path.basename(service_dir)
+    if not cache_dir:
+        parent_dir = os.path.dirname(service_dir)
+        return os.path.join(parent_dir, ".%s.xhttpcache" % base_name)
+
+    path_hash = hashlib.md5(service_dir).hexdigest()[:12]
+    file_name = "%s-%s.xhttpcache" % (base_name, path_hash)
+
+    return os.path.join(cache_dir, file_name)
+
+
+class SchemaCache(object):
+    """Persistent cache for parsed XHTTP schema documents
+
+    Cache entries are keyed by schema file name and they are only valid
+    while file modification time and size are the same as the ones that
+    the file had when it was parsed.
+    Cache file starts with a header line with the format version and
+    Python version, and files with a different header are ignored.
+
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        #schema file name as key and (mtime, size, schemas) as value
+        self.entries = {}
+        self.changed = False
+
+    @classmethod
+    def _stat(cls, schema_file):
+        stat = os.stat(schema_file)
+
+        return (stat.st_mtime, stat.st_size)
+
+    def load(self):
+        """Load cache entries from cache file
+
+        Missing, invalid or outdated cache files are ignored.
+
+        Return: A boolean that is True when cache file was loaded.
+
+        """
+        self.entries = {}
+        self.changed = False
+        try:
+            with open(self.file_name, "rb") as cache_file:
+                header = cache_file.readline()
+                if header != CACHE_HEADER:
+                    LOG.debug(u"Ignoring schema cache %s with format %r",
+                              self.file_name, header.strip())
+                    return False
+
+                entries = marshal.load(cache_file)
+        except IOError:
+            return False
+        except (EOFError, ValueError, TypeError):
+            LOG.warning(u"Ignoring invalid schema cache %s", self.file_name)
+            return False
+
+        if not isinstance(entries, dict):
+            LOG.warning(u"Ignoring invalid schema cache %s", self.file_name)
+            return False
+
+        self.entries = entries
+
+        return True
+
+    def get(self, schema_file):
+        """Get cached schemas for a schema file
+
+        Return: A dictionary, or None when file is not cached or when
+        cache entry is stale.
+
+        """
+        entry = self.entries.get(schema_file)
+        if not entry:
+            return
+
+        (mtime, size, schemas) = entry
+        try:
+            if self._stat(schema_file) != (mtime, size):
+                return
+        except OSError:
+            return
+
+        return schemas
+
+    def set(self, schema_file, schemas):
+        """Save parsed schemas for a schema file"""
+        try:
+            (mtime, size) = self._stat(schema_file)
+        except OSError:
+            return
+
+        #a file changed after parsing must be parsed again next time
+        if mtime != schemas['__meta__']['mtime']:
+            return
+
+        self.entries[schema_file] = (mtime, size, schemas)
+        self.changed = True
+
+    def remove_missing(self, schema_files):
+        """Remove entries for files that are not in a list of schema files"""
+        schema_files = set(schema_files)
+        for schema_file in self.entries.keys():
+            if schema_file not in schema_files:
+                del self.entries[schema_file]
+                self.changed = True
+
+    def save(self):
+        """Save cache entries to cache file when they changed
+
+        Cache is written to a temporary file that is then renamed,
+        so readers never see a partially written cache file.
+
+        """
+        if not self.changed:
+            return
+
+        cache_dir = os.path.dirname(self.file_name) or "."
+        try:
+            (fd, temp_file_name) = tempfile.mkstemp(dir=cache_dir)
+            try:
+                with os.fdopen(fd, "wb") as cache_file:
+                    cache_file.write(CACHE_HEADER)
+                    marshal.dump(self.entries, cache_file)
+
+                os.rename(temp_file_name, self.file_name)
+            except:
+                os.remove(temp_file_name)
+                raise
+        except (IOError, OSError), exc:
+            LOG.warning(u"Unable to save schema cache %s: %s",
+                        self.file_name, exc)
+            return
+
+        self.changed = False
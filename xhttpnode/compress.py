@@ -0,0 +1,213 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import zlib
+
+#supported content encodings in order of preference
+ENCODINGS = ("gzip", "deflate")
+
+#wbits values used by zlib to write each encoding format
+ENCODING_WBITS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,
+}
+
+#bodies smaller than this number of bytes are not compressed by default
+MIN_SIZE = 512
+
+#maximum number of Accept-Encoding values remembered by a compressor
+MAX_CACHED_VALUES = 256
+
+
+def parse_accept_encoding(value):
+    """Get the preferred supported encoding for an Accept-Encoding value
+
+    Return: A string, or None when no supported encoding is accepted.
+
+    """
+    qvalues = {}
+    for item in value.split(","):
+        (name, separator, params) = item.partition(";")
+        qvalue = 1.0
+        for param in params.split(";"):
+            (param_name, separator, param_value) = param.partition("=")
+            if param_name.strip() == "q":
+                try:
+                    qvalue = float(param_value)
+                except ValueError:
+                    qvalue = 0.0
+
+        qvalues[name.strip().lower()] = qvalue
+
+    default_qvalue = qvalues.get("*", 0.0)
+    best_encoding = None
+    best_qvalue = 0.0
+    for encoding in ENCODINGS:
+        qvalue = qvalues.get(encoding, default_qvalue)
+        if qvalue > best_qvalue:
+            best_encoding = encoding
+            best_qvalue = qvalue
+
+    return best_encoding
+
+
+def compress(body, encoding, level=6):
+    """Compress a response body using a content encoding
+
+    Return: A string.
+
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED,
+                                  ENCODING_WBITS[encoding])
+
+    return compressor.compress(body) + compressor.flush()
+
+
+class Compressor(object):
+    """Compress response bodies for the encodings accepted by clients
+
+    Bodies smaller than min_size bytes are not compressed, and neither
+    are bodies that compressed are not smaller.
+
+    """
+
+    def __init__(self, min_size=MIN_SIZE, level=6):
+        self.min_size = min_size
+        self.level = level
+        #preferred encoding for each Accept-Encoding value
+        self._encodings = {}
+
+    def get_encoding(self, accept_encoding):
+        """Get the encoding to use for an Accept-Encoding header value
+
+        Return: A string, or None when body must not be compressed.
+
+        """
+        if not accept_encoding:
+            return
+
+        try:
+            return self._encodings[accept_encoding]
+        except KeyError:
+            pass
+
+        encoding = parse_accept_encoding(accept_encoding)
+        #clients send only a few different values, but don't let
+        #random values fill the memory
+        if len(self._encodings) >= MAX_CACHED_VALUES:
+            self._encodings.clear()
+
+        self._encodings[accept_encoding] = encoding
+
+        return encoding
+
+    def compress(self, body, encoding):
+        """Compress a body when it is worth it
+
+        Return: A string, or None when body is not compressed.
+
+        """
+        if len(body) < self.min_size:
+            return
+
+        compressed_body = compress(body, encoding, self.level)
+        if len(compressed_body) < len(body):
+            return compressed_body
+
+    def compress_parts(self, parts, encoding):
+        """Compress the body of a tuple with status, headers and body
+
+        Return: A tuple with status, headers and body, or the same parts
+        when body is not compressed.
+
+        """
+        (status, headers, body) = parts
+        compressed_body = self.compress(body, encoding)
+        if compressed_body is None:
+            return parts
+
+        new_headers = [('Content-Encoding', encoding)]
+        for (name, value) in headers:
+            if name == "Content-Length":
+                value = str(len(compressed_body))
+            elif name == "ETag":
+                #each encoding is a different representation
+                value = '%s-%s"' % (value[:-1], encoding)
+
+            new_headers.append((name, value))
+
+        return (status, tuple(new_headers), compressed_body)
+
+    def compress_responses(self, responses):
+        """Compress a table of response parts for all supported encodings
+
+        Result dictionary has the keys of responses with the encoding
+        added at the end, and only the responses that are compressed.
+        Parts shared by several keys are compressed once.
+
+        Return: A dictionary.
+
+        """
+        result = {}
+        compressed = {}
+        for (key, parts) in responses.items():
+            for encoding in ENCODINGS:
+                compressed_key = (id(parts), encoding)
+                if compressed_key not in compressed:
+                    compressed[compressed_key] = self.compress_parts(
+                        parts, encoding)
+
+                compressed_parts = compressed[compressed_key]
+                if compressed_parts is not parts:
+                    result[key + (encoding,)] = compressed_parts
+
+        return result
+
+    def compress_response(self, response, encoding):
+        """Compress the body of a Response
+
+        Vary header is added to the response even when encoding is None.
+        Responses that are not successful or that already have a content
+        encoding are not compressed.
+
+        """
+        vary = response.vary or ()
+        if "Accept-Encoding" not in vary:
+            response.vary = tuple(vary) + ("Accept-Encoding",)
+
+        if not encoding:
+            return
+
+        if response.status_int != 200 or response.content_encoding:
+            return
+
+        compressed_body = self.compress(response.body, encoding)
+        if compressed_body is not None:
+            response.body = compressed_body
+            response.content_encoding = encoding
@@ -0,0 +1,196 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import codecs
+
+from urllib import unquote_plus
+
+from simplejson import loads
+
+#XHTTP data types
+TYPE_NULL = 0
+TYPE_BOOLEAN = 1
+TYPE_INTEGER = 2
+TYPE_FLOAT = 3
+TYPE_STRING = 4
+TYPE_ARRAY = 5
+TYPE_OBJECT = 6
+
+#X-Encoding value for values that must be kept as raw bytes
+RAW_ENCODING = "x-user-defined"
+
+
+class ArgumentDecodeError(Exception):
+    """Exception raised when an argument value can't be decoded"""
+
+    def __init__(self, name, value_type, value):
+        msg = u"Invalid value for argument %s of XHTTP data type %s" \
+            % (name, value_type)
+
+        super(ArgumentDecodeError, self).__init__(msg)
+        self.name = name
+        self.value_type = value_type
+        self.value = value
+
+
+def to_null(value):
+    return None
+
+
+def to_boolean(value):
+    value = value.lower()
+    if value in ("1", "true"):
+        return True
+    elif value in ("", "0", "false"):
+        return False
+
+    raise ValueError("Invalid boolean %r" % value)
+
+
+def to_array(value):
+    value = loads(value)
+    if not isinstance(value, list):
+        raise ValueError("Value is not an array")
+
+    return value
+
+
+def to_object(value):
+    value = loads(value)
+    if not isinstance(value, dict):
+        raise ValueError("Value is not an object")
+
+    return value
+
+
+def to_string(value):
+    return value
+
+
+#functions to convert request values for each XHTTP data type
+CONVERTERS = {
+    TYPE_NULL: to_null,
+    TYPE_BOOLEAN: to_boolean,
+    TYPE_INTEGER: int,
+    TYPE_FLOAT: float,
+    TYPE_STRING: to_string,
+    TYPE_ARRAY: to_array,
+    TYPE_OBJECT: to_object,
+}
+
+#Python types of JSON decoded values for each XHTTP data type
+JSON_TYPES = {
+    TYPE_NULL: (type(None),),
+    TYPE_BOOLEAN: (bool,),
+    TYPE_INTEGER: (int, long),
+    TYPE_FLOAT: (int, long, float),
+    TYPE_STRING: (basestring,),
+    TYPE_ARRAY: (list,),
+    TYPE_OBJECT: (dict,),
+}
+
+
+def check_json_value(name, value_type, value):
+    """Check that a JSON decoded value has an XHTTP data type
+
+    Raise ArgumentDecodeError when value has a different type.
+
+    """
+    #booleans are also integers in Python
+    if isinstance(value, bool) and value_type != TYPE_BOOLEAN:
+        raise ArgumentDecodeError(name, value_type, value)
+
+    if not isinstance(value, JSON_TYPES.get(value_type, object)):
+        raise ArgumentDecodeError(name, value_type, value)
+
+
+def get_charset(encoding):
+    """Get the Python codec name for an X-Encoding value
+
+    Return: A string, or None when values must be kept as bytes.
+
+    """
+    if not encoding or encoding.lower() == RAW_ENCODING:
+        return
+
+    return codecs.lookup(encoding).name
+
+
+class ArgumentDecoder(object):
+    """Decoder for the argument values of an action
+
+    Decoders are created once for each action, with a converter
+    function for each argument type, and then used to decode values
+    from the body of each request in a single pass.
+
+    """
+
+    __slots__ = ('converters', 'types')
+
+    def __init__(self, arguments):
+        #converter function for each argument name
+        self.converters = {}
+        #XHTTP data type for each argument name
+        self.types = {}
+        for arg in arguments:
+            self.types[arg.name] = arg.type
+            self.converters[arg.name] = CONVERTERS.get(arg.type, to_string)
+
+    def decode(self, body, encoding=None):
+        """Decode argument values from a form encoded request body
+
+        Values for unknown arguments are ignored.
+        Raise ArgumentDecodeError when a value can't be converted.
+
+        Return: A dictionary.
+
+        """
+        charset = get_charset(encoding)
+        converters = self.converters
+        values = {}
+        for field in body.split("&"):
+            if not field:
+                continue
+
+            (name, separator, value) = field.partition("=")
+            name = unquote_plus(name)
+            converter = converters.get(name)
+            if not converter:
+                continue
+
+            value = unquote_plus(value)
+            try:
+                if charset:
+                    value = value.decode(charset)
+
+                values[name] = converter(value)
+            except ValueError:
+                raise ArgumentDecodeError(name, self.types[name], value)
+
+        return values
@@ -0,0 +1,241 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import imp
+import inspect
+import logging
+import os
+import sys
+
+try:
+    import pkg_resources
+except ImportError:
+    pkg_resources = None
+
+from xhttpnode.memoize import DEFAULT_MAX_SIZE
+from xhttpnode.memoize import MemoizedController
+from xhttpnode.memoize import ResultCache
+
+LOG = logging.getLogger(__name__)
+
+#entry point group used to register service controller modules
+ENTRY_POINT_GROUP = "xhttpnode.services"
+
+
+class DispatchError(Exception):
+    """Base exception for controller dispatch errors"""
+
+
+def import_object(path):
+    """Import an object given its path
+
+    Path can be a 'module:attribute' string or a dotted path
+    where last name is an attribute of the module.
+
+    Return: An object.
+
+    """
+    if ":" in path:
+        (module_name, attribute) = path.split(":", 1)
+    elif "." in path:
+        (module_name, attribute) = path.rsplit(".", 1)
+    else:
+        module_name = path
+        attribute = None
+
+    try:
+        __import__(module_name)
+    except ImportError, exc:
+        raise DispatchError(u"Unable to import %s: %s" % (path, exc))
+
+    obj = sys.modules[module_name]
+    if attribute:
+        obj = get_attribute(obj, attribute)
+
+    return obj
+
+
+def get_attribute(obj, path):
+    """Get an attribute of an object given a dotted attribute path
+
+    Return: An object.
+
+    """
+    for name in path.split("."):
+        try:
+            obj = getattr(obj, name)
+        except AttributeError:
+            raise DispatchError(u"Object %r has no attribute %s" % (obj, name))
+
+    return obj
+
+
+class Dispatcher(object):
+    """Resolve the controllers that handle service actions
+
+    Action function attribute can be a 'module:function' path, or the name
+    of a function inside the service module. Service module is found,
+    in this order, in the modules dictionary, in the 'xhttpnode.services'
+    entry points, or as a Python file with the service name inside the
+    service directory.
+    Controllers are resolved when services are loaded, so no imports or
+    attribute lookups are done while requests are processed.
+
+    """
+
+    def __init__(self, service_dir, modules=None):
+        self.service_dir = service_dir
+        #modules or module names for each service name
+        self.modules = dict(modules or {})
+        self._loaded_modules = {}
+
+    def _load_entry_point_module(self, service_name):
+        if not pkg_resources:
+            return
+
+        entry_points = pkg_resources.iter_entry_points(ENTRY_POINT_GROUP,
+                                                       service_name)
+        for entry_point in entry_points:
+            return entry_point.load()
+
+    def _load_file_module(self, service_name):
+        file_name = os.path.join(self.service_dir, "%s.py" % service_name)
+        if not os.path.isfile(file_name):
+            return
+
+        module_name = "xhttpnode_service_%s" % service_name
+        try:
+            return imp.load_source(module_name, file_name)
+        except Exception, exc:
+            msg = u"Unable to load service module %s: %s" % (file_name, exc)
+            raise DispatchError(msg)
+
+    def get_service_module(self, service_name):
+        """Get the module with the controllers of a service
+
+        Return: A module, or None when service has no module.
+
+        """
+        if service_name in self._loaded_modules:
+            return self._loaded_modules[service_name]
+
+        module = self.modules.get(service_name)
+        if isinstance(module, basestring):
+            module = import_object(module)
+
+        if module is None:
+            module = self._load_entry_point_module(service_name)
+
+        if module is None:
+            module = self._load_file_module(service_name)
+
+        self._loaded_modules[service_name] = module
+
+        return module
+
+    def resolve(self, function, module=None):
+        """Get the controller for an action function attribute
+
+        Return: A callable.
+
+        """
+        if ":" in function:
+            controller = import_object(function)
+        elif module is None:
+            raise DispatchError(u"No module to get %s from" % function)
+        else:
+            controller = get_attribute(module, function)
+
+        if not callable(controller):
+            raise DispatchError(u"Controller %s is not callable" % function)
+
+        return controller
+
+    def build_service_controllers(self, service):
+        """Build the controllers table for a service
+
+        Result dictionary has (version, action) tuples as keys and
+        controllers as values. Actions whose controller can't be
+        resolved are logged and left out of the table. Controllers of
+        actions with a cache TTL are wrapped in a MemoizedController,
+        with a new result cache each time service is loaded.
+
+        Return: A dictionary.
+
+        """
+        try:
+            module = self.get_service_module(service.name)
+        except DispatchError, exc:
+            LOG.warning(u"%s", exc)
+            module = None
+
+        if module is None:
+            LOG.debug(u"Service %s has no controller module", service.name)
+
+        controllers = {}
+        for (version, schema_version) in service.versions.items():
+            for (action_name, action) in schema_version.actions.items():
+                function = action.function
+                if not function or (module is None and ":" not in function):
+                    continue
+
+                try:
+                    controller = self.resolve(function, module)
+                except DispatchError, exc:
+                    LOG.warning(u"No controller for action %s of %s[%s]: %s",
+                                action_name, service.name, version, exc)
+                    continue
+
+                if action.cache_ttl:
+                    controller = self.memoize(controller, action)
+
+                controllers[(version, action_name)] = controller
+
+        return controllers
+
+    @classmethod
+    def memoize(cls, controller, action):
+        """Wrap a controller to cache the results of an action
+
+        Coroutine controllers are returned as they are, since their
+        results are only known when they are run in an event loop.
+
+        Return: A callable.
+
+        """
+        if (inspect.isgeneratorfunction(controller)
+                or getattr(controller, "_is_coroutine", False)):
+            LOG.warning(u"Results of coroutine action %s are not cached",
+                        action.name)
+            return controller
+
+        cache = ResultCache(action.cache_ttl,
+                            action.cache_size or DEFAULT_MAX_SIZE)
+
+        return MemoizedController(controller, cache)
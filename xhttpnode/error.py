@@ -54,6 +54,15 @@ class XHTTPError(Exception):
     def __repr__(self):
         return unicode(self)
 
+    @classmethod
+    def get_status(cls):
+        """Get the HTTP status of the responses for this error class
+
+        Return: A string.
+
+        """
+        return (u"%s %s" % (cls.code, cls.message)).encode("utf8")
+
     def append_header(self, name, value):
         """Append an HTTP header that has to be returned
         
@@ -64,7 +73,7 @@ class XHTTPError(Exception):
 
     @property
     def header(self):
-        return unicode(self).encode("utf8")
+        return self.get_status()
 
 
 class ModeNotSupportedError(XHTTPError):
@@ -116,8 +125,26 @@ class VersionNotSupportedError(XHTTPError):
     message = "XHTTP Version Not Supported"
 
 
-class XHTTPProtocolError(XHTTPError):
-    """Base exception class for XHTTP protocol errors"""
+class XHTTPProtocolError(InternalExceptionError):
+    """Base exception class for XHTTP protocol errors
+
+    Protocol errors are returned as Exception responses, with protocol
+    error code and message in the X-Exception header. Headers is the
+    first argument, like in other XHTTP errors, and detail is a text
+    added to the protocol error message.
+
+    """
+
+    def __init__(self, headers=None, detail=None):
+        message = unicode(self)
+        if detail:
+            message = u"%s: %s" % (message, detail)
+
+        super(XHTTPProtocolError, self).__init__(message, headers=headers)
+
+    @classmethod
+    def get_status(cls):
+        return InternalExceptionError.get_status()
 
 
 class Error101(XHTTPProtocolError):
@@ -0,0 +1,155 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import threading
+import time
+
+from collections import OrderedDict
+
+import simplejson
+
+from xhttpnode.response import Response
+
+#default maximum number of results cached for each action
+DEFAULT_MAX_SIZE = 1000
+
+#value returned by ResultCache.get when there is no valid entry
+MISSING = object()
+
+
+def make_key(values):
+    """Build a cache key for the decoded argument values of an action
+
+    Values that can't be hashed, like lists or dictionaries received as
+    JSON, are keyed by their JSON serialization.
+
+    Return: A tuple or a string.
+
+    """
+    key = tuple(sorted(values.items()))
+    try:
+        hash(key)
+    except TypeError:
+        return simplejson.dumps(values, sort_keys=True,
+                                separators=(",", ":"))
+
+    return key
+
+
+class ResultCache(object):
+    """Least recently used cache with expiry for action results
+
+    Entries expire ttl seconds after they are set, and when cache has
+    max_size entries the least recently used entry is removed to make
+    room for a new one. Number of hits and misses are counted, where
+    expired entries count as misses.
+
+    """
+
+    def __init__(self, ttl, max_size=DEFAULT_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        #(expire time, result) for each key in least recently used order
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Get the cached result for a key
+
+        Return: A result, or MISSING when there is no valid entry.
+
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] <= time.time():
+                self.misses += 1
+                return MISSING
+
+            #move entry to the most recently used end
+            self._entries[key] = entry
+            self.hits += 1
+
+            return entry[1]
+
+    def set(self, key, result):
+        """Cache a result for a key"""
+        with self._lock:
+            entries = self._entries
+            entries.pop(key, None)
+            entries[key] = (time.time() + self.ttl, result)
+            while len(entries) > self.max_size:
+                entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Remove the entry for a key, or all entries when no key is given
+
+        Return: The number of removed entries.
+
+        """
+        with self._lock:
+            if key is None:
+                count = len(self._entries)
+                self._entries.clear()
+            else:
+                count = int(self._entries.pop(key, None) is not None)
+
+        return count
+
+
+class MemoizedController(object):
+    """Controller that caches the results of another controller
+
+    Results are keyed by the decoded argument values of the request.
+    Responses returned by the controller and raised errors are not
+    cached. Cached results are shared by all requests, so they must not
+    be modified.
+
+    """
+
+    def __init__(self, controller, cache):
+        self.controller = controller
+        self.cache = cache
+
+    def __repr__(self):
+        return "<MemoizedController %r>" % self.controller
+
+    def __call__(self, request, node):
+        key = make_key(request.x_arguments_values)
+        result = self.cache.get(key)
+        if result is MISSING:
+            result = self.controller(request, node)
+            if not isinstance(result, Response):
+                self.cache.set(key, result)
+
+        return result
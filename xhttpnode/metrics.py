@@ -0,0 +1,363 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import bisect
+import logging
+import os
+import threading
+
+from timeit import default_timer
+
+from xhttpnode.request import MODE_BATCH
+from xhttpnode.request import MODE_INFO
+from xhttpnode.request import MODE_PERFORM
+from xhttpnode.request import MODE_SCHEMA
+from xhttpnode.request import MODE_VERSION
+from xhttpnode.request import parse_x_service
+from xhttpnode.version import parse_version
+
+LOG = logging.getLogger(__name__)
+
+#Content-Type of Prometheus text format
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+#upper bounds in seconds of request latency histogram buckets
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+#names of the labels used for request metrics
+LABEL_NAMES = ("mode", "service", "version", "action")
+
+#modes used as label values, any other mode is counted as unknown
+KNOWN_MODES = frozenset([
+    MODE_VERSION,
+    MODE_INFO,
+    MODE_SCHEMA,
+    MODE_PERFORM,
+    MODE_BATCH,
+])
+
+#status codes of errors where request label values can't be trusted,
+#and the labels that are cleared for each one, so clients can't create
+#an unlimited number of label values
+UNTRUSTED_LABELS = {
+    '450': ("mode", "service", "version", "action"),
+    '451': ("service", "version", "action"),
+    '452': ("version", "action"),
+    '453': ("service", "version", "action"),
+    '454': ("version", "action"),
+    '551': ("version", "action"),
+}
+
+
+def escape_label_value(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n") \
+        .replace('"', '\\"')
+
+
+def format_labels(names, values):
+    labels = ",".join('%s="%s"' % (name, escape_label_value(value))
+                      for (name, value) in zip(names, values))
+
+    return "{%s}" % labels
+
+
+def get_status_code(status, headers):
+    """Get the XHTTP code of a response status
+
+    Exception responses for XHTTP protocol errors return the protocol
+    error code from the X-Exception header.
+
+    Return: A string.
+
+    """
+    code = status[:3]
+    if code == "550":
+        for (name, value) in headers:
+            #header value is a JSON string like "107 Invalid argument"
+            if name == "X-Exception" and value[1:4].isdigit():
+                return value[1:4]
+
+    return code
+
+
+def get_version_label(version):
+    """Get the label value for a requested version
+
+    Versions are normalized, so "01.0" and "1.0" use the same label.
+
+    Return: A string, which is empty when version is not valid.
+
+    """
+    version_info = parse_version(version)
+    if not version_info:
+        return ""
+
+    return ".".join(str(number) for number in version_info)
+
+
+def get_request_labels(environ, code, resolve_version=None):
+    """Get the label values for a request
+
+    Resolve_version is a function like node.Node.resolve_version. When
+    given version label is the schema version used for the service, or
+    empty when there is none, instead of the requested version.
+
+    Return: A tuple.
+
+    """
+    mode = environ.get('HTTP_X_MODE', MODE_PERFORM)
+    service = ""
+    x_version = environ.get('HTTP_X_VERSION')
+    version = get_version_label(x_version)
+    x_service = environ.get('HTTP_X_SERVICE')
+    if x_service:
+        (service, service_version) = parse_x_service(x_service)
+        if resolve_version:
+            version = resolve_version(service, service_version,
+                                      x_version) or ""
+        elif service_version:
+            version = get_version_label(service_version)
+
+    action = ""
+    if mode == MODE_PERFORM or mode == MODE_SCHEMA:
+        action = environ.get('HTTP_X_ACTION', "")
+
+    untrusted = UNTRUSTED_LABELS.get(code)
+    if untrusted or mode not in KNOWN_MODES:
+        values = dict(zip(LABEL_NAMES, (mode, service, version, action)))
+        for name in (untrusted or ("mode",)):
+            values[name] = ""
+
+        if not values['mode']:
+            values['mode'] = "unknown"
+
+        return tuple(values[name] for name in LABEL_NAMES)
+
+    return (mode, service, version, action)
+
+
+class ThreadMetrics(object):
+    """Metrics recorded by a single thread
+
+    Only the owner thread modifies them, so no locking is needed.
+
+    """
+
+    __slots__ = ('started', 'finished', 'requests', 'latencies')
+
+    def __init__(self):
+        self.started = 0
+        self.finished = 0
+        #request count for each label values and status code
+        self.requests = {}
+        #histogram bucket counts and latency sum for each label values
+        self.latencies = {}
+
+    def merge(self, other):
+        """Add the values of other thread metrics to these metrics"""
+        self.started += other.started
+        self.finished += other.finished
+        for (key, count) in other.requests.items():
+            self.requests[key] = self.requests.get(key, 0) + count
+
+        for (key, histogram) in other.latencies.items():
+            if key not in self.latencies:
+                self.latencies[key] = list(histogram)
+                continue
+
+            current = self.latencies[key]
+            for (index, value) in enumerate(histogram):
+                current[index] += value
+
+
+class Metrics(object):
+    """Request counters, latency histograms and in flight requests gauge
+
+    Each thread records its requests in its own ThreadMetrics, so
+    recording a request never takes a lock. Metrics of all threads are
+    added together when they are collected. Metrics of threads that
+    finished are merged once into a single ThreadMetrics.
+    Metrics are kept for each process, so each worker of a prefork
+    server reports only its own requests, and a scrape gets the metrics
+    of the worker that accepted it. All series have a worker label with
+    the process ID, so series of different workers are never mixed, and
+    they must be added together ignoring that label.
+    Resolve_version is used to get the version label of requests, see
+    get_request_labels.
+
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, resolve_version=None):
+        self.buckets = tuple(buckets)
+        self.resolve_version = resolve_version
+        self._local = threading.local()
+        #list of (thread, metrics) tuples for each thread with metrics
+        self._thread_metrics = []
+        #metrics of threads that are not alive anymore
+        self._finished_metrics = ThreadMetrics()
+        self._lock = threading.Lock()
+
+    def _get_thread_metrics(self):
+        try:
+            return self._local.metrics
+        except AttributeError:
+            pass
+
+        metrics = self._local.metrics = ThreadMetrics()
+        with self._lock:
+            alive = []
+            for (thread, thread_metrics) in self._thread_metrics:
+                if thread.is_alive():
+                    alive.append((thread, thread_metrics))
+                else:
+                    self._finished_metrics.merge(thread_metrics)
+
+            alive.append((threading.current_thread(), metrics))
+            self._thread_metrics = alive
+
+        return metrics
+
+    def request_started(self):
+        """Record the start of a request
+
+        Return: A float with the request start time.
+
+        """
+        self._get_thread_metrics().started += 1
+
+        return default_timer()
+
+    def request_finished(self, start_time, environ, status, headers=()):
+        """Record a finished request
+
+        Status can be None when request failed before sending a response.
+        Errors are logged instead of raised, so requests never fail
+        because of their metrics.
+
+        """
+        try:
+            self._record_request(start_time, environ, status, headers)
+        except Exception:
+            LOG.exception("Error recording XHTTP request metrics")
+
+    def _record_request(self, start_time, environ, status, headers):
+        elapsed = default_timer() - start_time
+        metrics = self._get_thread_metrics()
+        metrics.finished += 1
+        if status:
+            code = get_status_code(status, headers)
+        else:
+            code = "500"
+
+        labels = get_request_labels(environ, code, self.resolve_version)
+        key = labels + (code,)
+        metrics.requests[key] = metrics.requests.get(key, 0) + 1
+        histogram = metrics.latencies.get(labels)
+        if histogram is None:
+            #a count for each bucket plus infinite bucket, and the sum
+            histogram = [0] * (len(self.buckets) + 1) + [0.0]
+            metrics.latencies[labels] = histogram
+
+        histogram[bisect.bisect_left(self.buckets, elapsed)] += 1
+        histogram[-1] += elapsed
+
+    def collect(self):
+        """Add together the metrics of all threads
+
+        Return: A ThreadMetrics.
+
+        """
+        with self._lock:
+            thread_metrics_list = [self._finished_metrics]
+            thread_metrics_list.extend(
+                metrics for (thread, metrics) in self._thread_metrics)
+
+        result = ThreadMetrics()
+        for thread_metrics in thread_metrics_list:
+            result.merge(thread_metrics)
+
+        return result
+
+    def render(self, gauges=()):
+        """Render metrics in Prometheus text format
+
+        Gauges is a list of (name, help, value) tuples with extra
+        values to include.
+
+        Return: A string.
+
+        """
+        metrics = self.collect()
+        #process ID is read here, since metrics can be created before fork
+        worker = (str(os.getpid()),)
+        lines = [
+            "# HELP xhttp_requests_total XHTTP requests by response code.",
+            "# TYPE xhttp_requests_total counter",
+        ]
+        label_names = ("worker",) + LABEL_NAMES + ("code",)
+        for key in sorted(metrics.requests):
+            lines.append("xhttp_requests_total%s %s" % (
+                format_labels(label_names, worker + key),
+                metrics.requests[key]))
+
+        lines.append("# HELP xhttp_request_duration_seconds "
+                     "XHTTP request latency.")
+        lines.append("# TYPE xhttp_request_duration_seconds histogram")
+        bounds = ["%r" % bound for bound in self.buckets] + ["+Inf"]
+        label_names = ("worker",) + LABEL_NAMES
+        for labels in sorted(metrics.latencies):
+            histogram = metrics.latencies[labels]
+            labels = worker + labels
+            count = 0
+            for (bound, bucket_count) in zip(bounds, histogram):
+                count += bucket_count
+                bucket_labels = format_labels(label_names + ("le",),
+                                              labels + (bound,))
+                lines.append("xhttp_request_duration_seconds_bucket%s %s"
+                             % (bucket_labels, count))
+
+            labels = format_labels(label_names, labels)
+            lines.append("xhttp_request_duration_seconds_sum%s %r"
+                         % (labels, histogram[-1]))
+            lines.append("xhttp_request_duration_seconds_count%s %s"
+                         % (labels, count))
+
+        gauges = [("xhttp_requests_in_flight",
+                   "XHTTP requests being processed.",
+                   metrics.started - metrics.finished)] + list(gauges)
+        worker_labels = format_labels(("worker",), worker)
+        for (name, help, value) in gauges:
+            lines.append("# HELP %s %s" % (name, help))
+            lines.append("# TYPE %s gauge" % name)
+            lines.append("%s%s %s" % (name, worker_labels, value))
+
+        return "\n".join(lines) + "\n"
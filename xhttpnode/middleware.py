@@ -30,10 +30,26 @@
 import logging
 
 from xhttpnode import error
+from xhttpnode.batch import BatchProcessor
+from xhttpnode.metrics import METRICS_CONTENT_TYPE
+from xhttpnode.metrics import Metrics
 from xhttpnode.node import Node
+from xhttpnode.profiling import STAGE_DISPATCH
+from xhttpnode.profiling import STAGE_HEADER_PARSE
+from xhttpnode.profiling import STAGE_RESPONSE
+from xhttpnode.profiling import STAGE_SCHEMA_LOOKUP
+from xhttpnode.profiling import STAGE_VERSION_CHECK
+from xhttpnode.request import MODE_BATCH
+from xhttpnode.request import MODE_METRICS
 from xhttpnode.request import MODE_PERFORM
+from xhttpnode.request import EnvironRequest
 from xhttpnode.request import Request
 from xhttpnode.response import Response
+from xhttpnode.response import build_response_parts
+from xhttpnode.response import etag_matches
+from xhttpnode.response import get_error_response_parts
+from xhttpnode.response import get_header
+from xhttpnode.response import get_not_modified_parts
 
 LOG = logging.getLogger(__name__)
 
@@ -47,49 +63,263 @@ class XHTTPNodeMiddleware(object):
     Request instance and controller function are assigned to environment
     in 'xhttp.request' and 'xhttp.controller' before calling application.
     Also the Node instance is saved inside environment in 'xhttp.node'.
+    Batch requests call the controllers directly, using batch_threads
+    threads to perform their actions.
+    Responses are compressed for clients that accept it, unless node is
+    created with compression disabled.
+    When metrics are enabled request counts and latencies are recorded,
+    and they are returned in Prometheus text format for requests to
+    metrics_path or with metrics X-Mode. Each process only returns its
+    own metrics, see metrics.Metrics.
+    Requests are profiled by the profiling.Profiler instance given as
+    profiler, which also records the time of each request stage. When
+    no profiler is given nothing is recorded.
+    Extra keyword arguments are used as Node options.
 
     """
 
-    def __init__(self, service_dir, app=None):
+    def __init__(self, service_dir, app=None, batch_threads=4, metrics=True,
+                 metrics_path="/metrics", profiler=None, **node_options):
         self.application = app
+        self.profiler = profiler
         #create a node to parse XHTTP requests
-        self.node = Node(service_dir)
+        self.node = Node(service_dir, **node_options)
+        self.batch = BatchProcessor(self.node, threads=batch_threads)
+        self.metrics = None
+        self.metrics_path = metrics_path
+        if metrics:
+            self.metrics = Metrics(resolve_version=self.node.resolve_version)
 
-    def __call__(self, environ, start_response):
-        request = Request(self.node, environ)
+    def _check_x_version(self, x_version):
         #check that version is valid for current node
-        try:
-            x_version = float(request.x_version)
-        except ValueError:
-            x_version = None
-        
-        if x_version > self.node.server_version or not x_version:
+        if not self.node.is_supported_version(x_version):
             raise error.VersionNotSupportedError()
 
+    def _get_encoding(self, environ):
+        return self.node.get_encoding(environ.get('HTTP_ACCEPT_ENCODING'))
+
+    def compress_response(self, environ, response):
+        """Compress a perform Response when client accepts it"""
+        if self.node.compressor:
+            encoding = self._get_encoding(environ)
+            self.node.compressor.compress_response(response, encoding)
+
+    @classmethod
+    def _create_internal_error(cls, exc):
+        LOG.exception("Error processing XHTTP request")
+        #for non XHTTP errors return XHTTP Exception response
+        message = u"%s: %s" % (exc.__class__.__name__, unicode(exc))
+
+        return error.InternalExceptionError(message)
+
+    def process_metadata(self, environ, stages=None):
+        """Process a metadata XHTTP request using only WSGI environ
+
+        Request headers are read directly from environ and response is
+        taken from the node precomputed responses, so no WebOb objects
+        are created. A 304 response is returned when If-None-Match
+        header matches the response ETag.
+
+        Return: A tuple with status, headers and body.
+
+        """
+        request = EnvironRequest(self.node, environ)
+        try:
+            x_version = request.x_version
+            if stages is not None:
+                stages.mark(STAGE_HEADER_PARSE)
+
+            self._check_x_version(x_version)
+            if stages is not None:
+                stages.mark(STAGE_VERSION_CHECK)
+
+            encoding = self._get_encoding(environ)
+            parts = self.node.get_response_parts(request, encoding)
+            if stages is not None:
+                stages.mark(STAGE_SCHEMA_LOOKUP)
+
+            if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+            if if_none_match:
+                etag = get_header(parts[1], 'ETag')
+                if etag_matches(if_none_match, etag):
+                    return get_not_modified_parts(parts)
+
+            return parts
+        except error.XHTTPError, err:
+            return get_error_response_parts(err)
+        except Exception, exc:
+            return get_error_response_parts(self._create_internal_error(exc))
+
+    def process_batch(self, environ):
+        """Process a batch XHTTP request
+
+        Return: A tuple with status, headers and body.
+
+        """
+        request = Request(self.node, environ)
+        try:
+            self._check_x_version(request.x_version)
+            parts = self.batch.process(request)
+        except error.XHTTPError, err:
+            return get_error_response_parts(err)
+        except Exception, exc:
+            return get_error_response_parts(self._create_internal_error(exc))
+
+        encoding = self._get_encoding(environ)
+        if encoding:
+            parts = self.node.compressor.compress_parts(parts, encoding)
+
+        return parts
+
+    def is_metrics_request(self, environ):
+        """Check if a request asks for metrics instead of an XHTTP call"""
+        if environ.get('HTTP_X_MODE') == MODE_METRICS:
+            return True
+
+        return (environ.get('PATH_INFO') == self.metrics_path
+                and 'HTTP_X_MODE' not in environ
+                and 'HTTP_X_SERVICE' not in environ)
+
+    def process_metrics(self):
+        """Render the metrics of this process
+
+        Return: A tuple with status, headers and body.
+
+        """
+        if not self.metrics:
+            return get_error_response_parts(error.ModeNotSupportedError())
+
+        node = self.node
+        registry = node.registry
+        (hits, misses, size) = node.get_result_cache_stats()
+        body = self.metrics.render(gauges=[
+            ("xhttp_services_loaded", "Services with parsed schemas.",
+             len(registry)),
+            ("xhttp_schema_files", "Schema files in service directory.",
+             len(registry.schema_files)),
+            ("xhttp_registry_generation",
+             "Number of times services were updated.", node.generation),
+            ("xhttp_result_cache_hits",
+             "Action results taken from result caches.", hits),
+            ("xhttp_result_cache_misses",
+             "Action results not found in result caches.", misses),
+            ("xhttp_result_cache_entries",
+             "Action results kept in result caches.", size),
+        ])
+
+        return build_response_parts(body, METRICS_CONTENT_TYPE)
+
+    def process_profiled(self, environ, start_response):
+        """Process an XHTTP request using the middleware profiler
+
+        Return: An iterable with the response body.
+
+        """
+        return self.profiler.process(self.process, environ, start_response)
+
+    def __call__(self, environ, start_response):
+        process = self.process
+        if self.profiler is not None:
+            process = self.process_profiled
+
+        metrics = self.metrics
+        if metrics is None or self.is_metrics_request(environ):
+            return process(environ, start_response)
+
+        start_time = metrics.request_started()
+        response_info = []
+
+        def metrics_start_response(status, headers, exc_info=None):
+            response_info[:] = [status, headers]
+
+            return start_response(status, headers, exc_info)
+
         try:
-            if request.x_mode == MODE_PERFORM:
-                #get controller in charge of performing request action
-                controller = self.node.get_request_controller(request)
-                if self.application:
-                    environ['xhttp.controller'] = controller
-                    environ['xhttp.request'] = request
-                    environ['xhttp.node'] = controller
-                    #call application to get the Response instance
-                    response = self.application(environ, start_response)
-                else:
-                    #when no application is assigned to middleware
-                    #call controller here to get Response
-                    response = controller(request, self.node)
+            return process(environ, metrics_start_response)
+        finally:
+            (status, headers) = response_info or (None, ())
+            metrics.request_finished(start_time, environ, status, headers)
+
+    def process(self, environ, start_response, stages=None):
+        """Process an XHTTP request as a WSGI application
+
+        Stages, when given, is a profiling.StageTimer where the end of
+        each request stage is marked.
+
+        Return: An iterable with the response body.
+
+        """
+        if self.is_metrics_request(environ):
+            (status, headers, body) = self.process_metrics()
+            start_response(status, list(headers))
+
+            return [body]
+
+        x_mode = environ.get('HTTP_X_MODE', MODE_PERFORM)
+        #only perform requests need WebOb response objects
+        if x_mode != MODE_PERFORM:
+            if x_mode == MODE_BATCH:
+                (status, headers, body) = self.process_batch(environ)
             else:
-                #when X-Mode is not perform get contents from server node
-                response = self.node.process_request(request)
+                (status, headers, body) = self.process_metadata(environ,
+                                                                stages)
+
+            start_response(status, list(headers))
+
+            return [body]
+
+        request = Request(self.node, environ)
+        error_parts = None
+        try:
+            x_version = request.x_version
+            if stages is not None:
+                stages.mark(STAGE_HEADER_PARSE)
+
+            self._check_x_version(x_version)
+            if stages is not None:
+                stages.mark(STAGE_VERSION_CHECK)
+
+            #get controller in charge of performing request action
+            controller = self.node.get_request_controller(request)
+            #validate arguments before calling the controller
+            request.x_arguments_values
+            if stages is not None:
+                stages.mark(STAGE_SCHEMA_LOOKUP)
+
+            if self.application:
+                environ['xhttp.controller'] = controller
+                environ['xhttp.request'] = request
+                environ['xhttp.node'] = self.node
+                #call application to get the Response instance
+                response = self.application(environ, start_response)
+                if stages is not None:
+                    stages.mark(STAGE_DISPATCH)
+            else:
+                #when no application is assigned to middleware
+                #call controller here to get Response
+                result = controller(request, self.node)
+                if stages is not None:
+                    stages.mark(STAGE_DISPATCH)
+
+                response = self.node.create_response(result, stages)
+
+            if isinstance(response, Response):
+                self.compress_response(environ, response)
         except error.XHTTPError, err:
-            response = Response.create_from_error(err)
+            error_parts = get_error_response_parts(err)
         except Exception, exc:
-            LOG.exception("Error processing XHTTP request")
-            #for non XHTTP errors return XHTTP Exception response
-            message = u"%s: %s" % (exc.__class__.__name__, unicode(exc))
-            err = error.InternalExceptionError(message)
-            response = Response.create_from_error(err)
+            err = self._create_internal_error(exc)
+            error_parts = get_error_response_parts(err)
+
+        if error_parts is None:
+            body = response(environ, start_response)
+        else:
+            #errors are returned without creating WebOb responses
+            (status, headers, body) = error_parts
+            start_response(status, list(headers))
+            body = [body]
+
+        if stages is not None:
+            stages.mark(STAGE_RESPONSE)
 
-        return response(environ, start_response)
+        return body
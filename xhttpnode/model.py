@@ -0,0 +1,361 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import re
+
+from xhttpnode import error
+from xhttpnode.datatype import CONVERTERS
+from xhttpnode.datatype import ArgumentDecoder
+from xhttpnode.schema import SchemaParseError
+
+#schema attribute values that disable a boolean action option
+FALSE_VALUES = frozenset(["false", "0", "no"])
+
+
+def _intern(value):
+    #only byte strings can be interned
+    if isinstance(value, str):
+        return intern(value)
+
+    return value
+
+
+class ExceptionSpec(object):
+    """Exception that can be raised by an action"""
+
+    __slots__ = ('code', 'message')
+
+    def __init__(self, code, message):
+        self.code = code
+        self.message = message
+
+    def __repr__(self):
+        return "<ExceptionSpec %s>" % self.code
+
+
+class Argument(object):
+    """Argument accepted by an action
+
+    Arguments with a default value are not required. Validate is a
+    compiled regular expression that values must match.
+
+    """
+
+    __slots__ = ('name', 'type', 'required', 'default', 'validate')
+
+    def __init__(self, name, type, required=True, default=None,
+                 validate=None):
+        self.name = name
+        self.type = type
+        self.required = required
+        self.default = default
+        self.validate = validate
+
+    def __repr__(self):
+        return "<Argument %s>" % self.name
+
+
+class Action(object):
+    """Action available in a service schema
+
+    Concurrent is False for actions that must not run at the same time as
+    other actions of a batch request.
+    Results are cached for cache_ttl seconds when it is given, keeping at
+    most cache_size results.
+
+    """
+
+    __slots__ = (
+        'name',
+        'function',
+        'exceptions',
+        'exception_codes',
+        'arguments',
+        'argument_names',
+        'return_type',
+        'decoder',
+        'required_names',
+        'argument_types',
+        'defaults',
+        'validators',
+        'concurrent',
+        'cache_ttl',
+        'cache_size',
+    )
+
+    def __init__(self, name, function, exceptions, arguments, return_type,
+                 concurrent=True, cache_ttl=None, cache_size=None):
+        self.name = name
+        self.function = function
+        self.exceptions = tuple(exceptions)
+        self.exception_codes = frozenset(exc.code for exc in self.exceptions)
+        self.arguments = tuple(arguments)
+        self.argument_names = frozenset(arg.name for arg in self.arguments)
+        self.return_type = return_type
+        self.decoder = ArgumentDecoder(self.arguments)
+        #precomputed argument information used to validate requests
+        self.required_names = frozenset(
+            arg.name for arg in self.arguments if arg.required)
+        self.argument_types = dict(
+            (arg.name, arg.type) for arg in self.arguments)
+        self.defaults = dict(
+            (arg.name, arg.default) for arg in self.arguments
+            if not arg.required)
+        self.validators = tuple(
+            (arg.name, arg.validate) for arg in self.arguments
+            if arg.validate)
+        self.concurrent = concurrent
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+
+    def __repr__(self):
+        return "<Action %s>" % self.name
+
+    def validate(self, values, x_arguments=None):
+        """Validate argument values for this action
+
+        X-Arguments dictionary, when given, must only have arguments of
+        this action with the same types as in schema. Default values are
+        added for optional arguments that have no value.
+        Raise error.Error106 when required arguments are missing, and
+        error.Error107 when an invalid argument is passed.
+
+        Return: A dictionary.
+
+        """
+        if x_arguments:
+            for (name, value_type) in x_arguments.iteritems():
+                if self.argument_types.get(name) != value_type:
+                    raise error.Error107(detail=name)
+
+        missing = self.required_names.difference(values)
+        if missing:
+            raise error.Error106(detail=u", ".join(sorted(missing)))
+
+        for (name, regexp) in self.validators:
+            if name in values:
+                value = values[name]
+                #raw byte strings of x-user-defined encoding are matched
+                #as they are, since they can't be decoded
+                if not isinstance(value, basestring):
+                    value = unicode(value)
+
+                if not regexp.match(value):
+                    raise error.Error107(detail=name)
+
+        if self.defaults and len(values) < len(self.argument_types):
+            for (name, default) in self.defaults.iteritems():
+                values.setdefault(name, default)
+
+        return values
+
+    def to_list(self):
+        """Get action schema in XHTTP schema response format
+
+        Return: A list.
+
+        """
+        exception_list = [[exc.message, exc.code] for exc in self.exceptions]
+        argument_list = [[arg.name, arg.type] for arg in self.arguments]
+
+        return [self.name, exception_list, argument_list, self.return_type]
+
+
+class SchemaVersion(object):
+    """Schema for a single version of a service"""
+
+    __slots__ = ('version', 'info', 'actions')
+
+    def __init__(self, version, info, actions):
+        self.version = version
+        #info is a tuple of (name, value) tuples sorted by name
+        self.info = tuple(sorted(info, key=lambda item: item[0]))
+        self.actions = actions
+
+    def __repr__(self):
+        return "<SchemaVersion %s>" % self.version
+
+    def get_info(self, name, default=None):
+        """Get the value of a schema info field"""
+        for (info_name, value) in self.info:
+            if info_name == name:
+                return value
+
+        return default
+
+
+class Service(object):
+    """Service with all the versions defined in its schema file"""
+
+    __slots__ = ('name', 'versions', 'file', 'mtime')
+
+    def __init__(self, name, versions, file=None, mtime=None):
+        self.name = name
+        #dictionary with version strings as keys
+        self.versions = versions
+        self.file = file
+        self.mtime = mtime
+
+    def __repr__(self):
+        return "<Service %s>" % self.name
+
+    def __contains__(self, version):
+        return version in self.versions
+
+    def __getitem__(self, version):
+        return self.versions[version]
+
+
+def compile_argument(arg):
+    """Compile an argument dictionary of an action dictionary
+
+    Raise SchemaParseError when default or validate values are invalid.
+
+    Return: An Argument.
+
+    """
+    name = _intern(arg['name'])
+    arg_type = int(arg['type'])
+
+    required = 'default' not in arg
+    default = arg.get('default')
+    if not required:
+        converter = CONVERTERS.get(arg_type)
+        try:
+            if converter:
+                default = converter(default)
+        except ValueError:
+            msg = u"Invalid default value for argument %s" % name
+            raise SchemaParseError(msg)
+
+    validate = arg.get('validate')
+    if validate is not None:
+        try:
+            #values must match the whole expression
+            validate = re.compile(u"(?:%s)\\Z" % validate, re.UNICODE)
+        except re.error, exc:
+            msg = u"Invalid validate expression for argument %s: %s" \
+                % (name, exc)
+            raise SchemaParseError(msg)
+
+    return Argument(name, arg_type, required, default, validate)
+
+
+def compile_cache_options(action):
+    """Get the result cache options of an action dictionary
+
+    Raise SchemaParseError when cache-ttl or cache-size are invalid.
+
+    Return: A tuple with cache TTL and size, or with None values when
+    action results are not cached.
+
+    """
+    cache_ttl = action.get('cache-ttl')
+    cache_size = action.get('cache-size')
+    if cache_ttl is None:
+        return (None, None)
+
+    try:
+        cache_ttl = float(cache_ttl)
+        if cache_size is not None:
+            cache_size = int(cache_size)
+    except ValueError:
+        msg = u"Invalid cache options for action %s" % action['name']
+        raise SchemaParseError(msg)
+
+    if cache_ttl <= 0 or (cache_size is not None and cache_size < 1):
+        msg = u"Invalid cache options for action %s" % action['name']
+        raise SchemaParseError(msg)
+
+    return (cache_ttl, cache_size)
+
+
+def compile_action(action):
+    """Compile an action dictionary returned by schema.parse_action_element
+
+    Return: An Action.
+
+    """
+    exceptions = []
+    for exc in action['exceptions'].values():
+        exc_code = int(exc['code'])
+        exceptions.append(ExceptionSpec(exc_code, exc['message']))
+
+    arguments = []
+    for arg in action['args'].values():
+        arguments.append(compile_argument(arg))
+
+    name = _intern(action['name'])
+    function = _intern(action.get('function'))
+    return_type = int(action['return'])
+    concurrent = action.get('concurrent', "true").lower() not in FALSE_VALUES
+    (cache_ttl, cache_size) = compile_cache_options(action)
+
+    return Action(name, function, exceptions, arguments, return_type,
+                  concurrent, cache_ttl, cache_size)
+
+
+def compile_schema(schema):
+    """Compile a schema dictionary returned by schema.parse_schema_element
+
+    Return: A SchemaVersion.
+
+    """
+    info = []
+    for (name, value) in schema['info'].items():
+        info.append((_intern(name), value))
+
+    actions = {}
+    for action in schema['actions'].values():
+        compiled_action = compile_action(action)
+        actions[compiled_action.name] = compiled_action
+
+    version = _intern(schema['version'])
+
+    return SchemaVersion(version, info, actions)
+
+
+def compile_service(name, schemas):
+    """Compile schemas returned by schema.parse_schema_document
+
+    Return: A Service.
+
+    """
+    versions = {}
+    for (version, schema) in schemas.items():
+        #skip meta information
+        if version.startswith("_"):
+            continue
+
+        versions[_intern(version)] = compile_schema(schema)
+
+    meta = schemas.get('__meta__', {})
+
+    return Service(_intern(name), versions, meta.get('file'),
+                   meta.get('mtime'))
@@ -28,40 +28,486 @@
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 import glob
+import itertools
 import logging
 import os
 import simplejson
+import threading
+import time
 
 from xhttpnode import error
+from xhttpnode import model
 from xhttpnode import schema
+from xhttpnode.cache import SchemaCache
+from xhttpnode.cache import get_cache_file_name
+from xhttpnode.compress import MIN_SIZE
+from xhttpnode.compress import Compressor
+from xhttpnode.dispatch import Dispatcher
+from xhttpnode.memoize import MemoizedController
+from xhttpnode.memoize import make_key
+from xhttpnode.profiling import STAGE_SERIALIZATION
+from xhttpnode.registry import ServiceRegistry
+from xhttpnode.store import SchemaStore
+from xhttpnode.store import StoreLock
+from xhttpnode.store import StoreWriter
 from xhttpnode.request import MODE_INFO
 from xhttpnode.request import MODE_SCHEMA
 from xhttpnode.request import MODE_VERSION
+from xhttpnode.response import JSON_CONTENT_TYPE
+from xhttpnode.response import VARY_HEADER
 from xhttpnode.response import Response
+from xhttpnode.response import build_response_parts
+from xhttpnode.response import get_etag
+from xhttpnode.version import VersionIndex
+from xhttpnode.version import parse_version
+from xhttpnode.version import sort_versions
+from xhttpnode.watcher import SchemaWatcher
 
 LOG = logging.getLogger(__name__)
 
+#XHTTP modes that are answered from the node schemas
+METADATA_MODES = frozenset([MODE_VERSION, MODE_INFO, MODE_SCHEMA])
+
 
 class Node(object):
     """Nose server that handles XHTTP requests"""
 
     #XHTTP version supported by current server node
     server_version = "1.0"
+    server_version_info = parse_version(server_version)
+
+    #seconds between checks for store generations published by other
+    #processes of the node
+    store_check_interval = 1.0
 
-    def __init__(self, service_dir):
-        #TODO: implement dynamic XML file update
+    def __init__(self, service_dir, watch_interval=None, processes=None,
+                 cache=False, cache_dir=None, lazy=False, max_services=None,
+                 controllers=None, compression=True,
+                 compress_min_size=MIN_SIZE, cache_control=None,
+                 store_file=None):
         self.service_dir = service_dir
-        self.services = {}
+        self.registry = ServiceRegistry()
+        #number of times the registry has been replaced
+        self.generation = 0
+        #resolves action functions using controllers service modules
+        self.dispatcher = Dispatcher(service_dir, controllers)
+        self.watcher = None
+        #metadata responses are read from a store file shared with other
+        #processes, and services are only parsed for perform requests
+        self.store = None
+        self._store_check_time = 0
+        if store_file:
+            self.store = SchemaStore(store_file)
+            lazy = True
+
+        #in lazy mode services are parsed the first time they are used
+        self.lazy = lazy
+        #maximum number of services that lazy mode keeps loaded
+        self.max_services = max_services
+        #usage counter value for each service, used to evict services
+        self._service_usage = {}
+        self._usage_counter = itertools.count()
+        #lock used to serialize registry updates
+        self._update_lock = threading.Lock()
+        #Cache-Control header value for metadata responses
+        self.cache_control = cache_control
+        #compresses responses for clients that accept it
+        self.compressor = None
+        if compression:
+            self.compressor = Compressor(compress_min_size)
+
+        #compressed metadata responses for each service name, together
+        #with the responses table they were built from
+        self.variants = {}
+
+        self.schema_cache = None
+        if cache or cache_dir:
+            cache_file_name = get_cache_file_name(service_dir, cache_dir)
+            self.schema_cache = SchemaCache(cache_file_name)
+            self.schema_cache.load()
 
         #parse each schema file to get available services
-        file_pattern = os.path.join(service_dir, "*.xml")
-        service_schema_file_list = glob.glob(file_pattern)
-        for schema_file in service_schema_file_list:
+        schema_files = self._find_schema_files()
+        if lazy:
+            LOG.debug(u"Found %s schema files", len(schema_files))
+            services = {}
+        else:
+            services = self._load_services(schema_files, processes)
+            self._save_schema_cache(schema_files)
+
+        if self.store:
+            self._sync_store(schema_files)
+
+        self._update_registry(services, schema_files=schema_files)
+        if watch_interval:
+            self.start_watcher(watch_interval)
+
+    @property
+    def services(self):
+        """Parsed schemas for each service name"""
+        return self.registry.services
+
+    @property
+    def responses(self):
+        """Serialized metadata responses for each service name"""
+        return self.registry.responses
+
+    def _find_schema_files(self):
+        """Find the schema files inside service directory
+
+        Result dictionary has service names as keys and absolute
+        schema file names as values.
+
+        Return: A dictionary.
+
+        """
+        schema_files = {}
+        file_pattern = os.path.join(self.service_dir, "*.xml")
+        for schema_file in glob.glob(file_pattern):
             file_name = os.path.basename(schema_file)
             name = os.path.splitext(file_name)[0]
-            LOG.debug(u"Parsing schema for service '%s'", name)
-            #TODO: Implement checking of schema versions in each file
-            self.services[name] = schema.parse_schema_document(schema_file)
+            schema_files[name] = os.path.abspath(schema_file)
+
+        return schema_files
+
+    def _parse_schema_file(self, name, schema_file):
+        LOG.debug(u"Parsing schema for service '%s'", name)
+        #TODO: Implement checking of schema versions in each file
+        schemas = schema.parse_schema_document(schema_file)
+        if self.schema_cache:
+            self.schema_cache.set(schema_file, schemas)
+
+        return schemas
+
+    def _load_service(self, name, schema_file):
+        schemas = self._parse_schema_file(name, schema_file)
+
+        return model.compile_service(name, schemas)
+
+    def _load_services(self, schema_files, processes=None):
+        """Load services from a dictionary of schema files
+
+        Schemas are taken from schema cache when it is enabled and the
+        cached schemas are up to date. The rest of the schema files are
+        parsed in a pool of processes when more than one process is given.
+
+        Return: A dictionary.
+
+        """
+        schemas_dict = {}
+        pending_files = {}
+        for (name, schema_file) in schema_files.items():
+            schemas = None
+            if self.schema_cache:
+                schemas = self.schema_cache.get(schema_file)
+
+            if schemas is None:
+                pending_files[name] = schema_file
+            else:
+                schemas_dict[name] = schemas
+
+        if self.schema_cache:
+            LOG.debug(u"Using cached schemas for %s services",
+                      len(schemas_dict))
+
+        if not processes or processes < 2 or len(pending_files) < 2:
+            for (name, schema_file) in pending_files.items():
+                schemas_dict[name] = self._parse_schema_file(name, schema_file)
+        else:
+            LOG.debug(u"Parsing %s schema files using %s processes",
+                      len(pending_files), processes)
+            name_list = pending_files.keys()
+            file_list = [pending_files[name] for name in name_list]
+            schemas_list = schema.parse_schema_documents(file_list, processes)
+            for (name, schemas) in zip(name_list, schemas_list):
+                schemas_dict[name] = schemas
+                if self.schema_cache:
+                    self.schema_cache.set(pending_files[name], schemas)
+
+        services = {}
+        for (name, schemas) in schemas_dict.items():
+            services[name] = model.compile_service(name, schemas)
+
+        return services
+
+    def _save_schema_cache(self, schema_files):
+        if not self.schema_cache:
+            return
+
+        self.schema_cache.remove_missing(schema_files.values())
+        self.schema_cache.save()
+
+    def _update_registry(self, services, removed=None, schema_files=None):
+        #serialize metadata responses once instead of once per request
+        responses = {}
+        controllers = {}
+        versions = {}
+        for (name, service) in services.items():
+            responses[name] = self.build_service_responses(
+                service, self.cache_control)
+            builder = self.dispatcher.build_service_controllers
+            controllers[name] = builder(service)
+            versions[name] = VersionIndex(service.versions)
+
+        #replace registry in a single step so it is never seen half updated
+        self.registry = self.registry.replace(services, responses, removed,
+                                              schema_files, controllers,
+                                              versions)
+        self.generation += 1
+        #compressed responses of changed services are not valid anymore
+        for name in itertools.chain(services, removed or []):
+            self.variants.pop(name, None)
+
+    def _get_evicted_services(self, registry):
+        #get least recently used services when too many are loaded
+        if not self.max_services:
+            return []
+
+        count = len(registry) + 1 - self.max_services
+        if count <= 0:
+            return []
+
+        usage = self._service_usage
+        name_list = registry.services.keys()
+        name_list.sort(key=lambda name: usage.get(name, -1))
+        evicted = name_list[:count]
+        for name in evicted:
+            LOG.debug(u"Unloading service '%s'", name)
+            usage.pop(name, None)
+
+        return evicted
+
+    def _get_service_registry(self, service_name):
+        """Get a registry where a service is loaded
+
+        In lazy mode service schema is parsed when service is not loaded,
+        and least recently used services are unloaded when there are more
+        loaded services than the maximum allowed.
+        Loaded services are found without any locking.
+
+        Return: A ServiceRegistry.
+
+        """
+        registry = self.registry
+        if service_name in registry.services:
+            if self.lazy:
+                self._service_usage[service_name] = self._usage_counter.next()
+
+            return registry
+
+        with self._update_lock:
+            registry = self.registry
+            if service_name not in registry.services:
+                if service_name not in registry.schema_files:
+                    #schema file was removed by a reload
+                    raise error.ServiceNotFoundError()
+
+                schema_file = registry.schema_files[service_name]
+                schema_files = {service_name: schema_file}
+                services = self._load_services(schema_files)
+                removed = self._get_evicted_services(registry)
+                self._update_registry(services, removed)
+                registry = self.registry
+
+            self._service_usage[service_name] = self._usage_counter.next()
+
+        return registry
+
+    def reload(self):
+        """Reload schema files that changed since they were parsed
+
+        Only added or modified schema files are parsed again, and services
+        with deleted schema files are removed. Files that can't be parsed
+        are logged and previous schemas are kept for them.
+        In lazy mode modified services are unloaded instead, so they are
+        parsed again the next time they are used.
+
+        Return: A boolean that is True when services changed.
+
+        """
+        with self._update_lock:
+            return self._reload()
+
+    def _reload(self):
+        registry = self.registry
+        services = registry.services
+        schema_files = self._find_schema_files()
+
+        updated = {}
+        removed = [name for name in services if name not in schema_files]
+        for (name, schema_file) in schema_files.items():
+            if name in services:
+                service = services[name]
+                try:
+                    mtime = os.path.getmtime(schema_file)
+                except OSError:
+                    #file was deleted after directory was listed
+                    continue
+
+                if service.file == schema_file and service.mtime == mtime:
+                    continue
+
+                if self.lazy:
+                    removed.append(name)
+                    continue
+            elif self.lazy:
+                continue
+
+            LOG.debug(u"Reloading schema for service '%s'", name)
+            try:
+                updated[name] = self._load_service(name, schema_file)
+            except schema.SchemaParseError:
+                LOG.exception(u"Keeping previous schema for service '%s'",
+                              name)
+
+        if self.store:
+            #services changed in store must not use old compressed responses
+            for name in self._sync_store(schema_files):
+                if name not in removed:
+                    removed.append(name)
+
+        for name in removed:
+            LOG.debug(u"Removing service '%s'", name)
+
+        if not (updated or removed or schema_files != registry.schema_files):
+            return False
+
+        self._update_registry(updated, removed, schema_files)
+        self._save_schema_cache(schema_files)
+
+        return True
+
+    def _sync_store(self, schema_files):
+        """Publish a new store generation when schema files changed
+
+        Store is mapped again first, since any process of the node can
+        publish it. Services with unchanged schema files are copied from
+        the current generation, and the rest are parsed one at a time, so
+        only one service is kept in memory while store is written. When a
+        schema file can't be parsed previous responses are kept for it.
+
+        Return: A set with the names of the services that changed in store.
+
+        """
+        store = self.store
+        with StoreLock(store.file_name):
+            changed = store.refresh()
+            stale = {}
+            for (name, schema_file) in schema_files.items():
+                service = store.get(name)
+                try:
+                    mtime = os.path.getmtime(schema_file)
+                except OSError:
+                    #file was deleted after directory was listed
+                    continue
+
+                if not (service and service.file == schema_file
+                        and service.mtime == mtime):
+                    stale[name] = schema_file
+
+            removed = [name for name in store.services
+                       if name not in schema_files]
+            if not (stale or removed):
+                return changed
+
+            modified = bool(removed)
+            writer = StoreWriter(store.file_name)
+            try:
+                for (name, schema_file) in schema_files.items():
+                    if name in stale:
+                        LOG.debug(u"Storing responses of service '%s'", name)
+                        try:
+                            service = self._load_service(name, schema_file)
+                        except schema.SchemaParseError:
+                            LOG.exception(u"Keeping stored responses of "
+                                          u"service '%s'", name)
+                        else:
+                            responses = self._build_store_responses(
+                                service)
+                            writer.add(name, service.file, service.mtime,
+                                       service.versions, responses)
+                            modified = True
+                            continue
+
+                    if name in store:
+                        writer.copy(store.get(name))
+            except:
+                writer.abort()
+                raise
+
+            if not modified:
+                writer.abort()
+                return changed
+
+            writer.commit()
+            changed.update(store.refresh())
+
+        self._save_schema_cache(schema_files)
+
+        return changed
+
+    def _build_store_responses(self, service):
+        #compressed responses are stored too, so they are built once for
+        #all processes instead of once in each process
+        responses = self.build_service_responses(service, self.cache_control)
+        if self.compressor:
+            responses.update(self.compressor.compress_responses(responses))
+
+        return responses
+
+    def _check_store(self):
+        """Map the store again when another process published it
+
+        Store file is checked at most once every store_check_interval
+        seconds, so processes that don't watch schema files also serve
+        the new responses. Loaded services that changed are unloaded.
+
+        """
+        now = time.time()
+        if now < self._store_check_time:
+            return
+
+        self._store_check_time = now + self.store_check_interval
+        #requests don't wait for a reload in process
+        if not self._update_lock.acquire(False):
+            return
+
+        try:
+            changed = self.store.refresh()
+            if changed:
+                self._update_registry({}, list(changed))
+        finally:
+            self._update_lock.release()
+
+    def start_watcher(self, interval=1.0):
+        """Start a thread that reloads schema files when they change"""
+        self.stop_watcher()
+        self.watcher = SchemaWatcher(self, interval)
+        self.watcher.start()
+
+    def stop_watcher(self):
+        """Stop reloading schema files when they change"""
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+
+    def is_supported_version(self, x_version):
+        """Check if an X-Version header value is supported by this node
+
+        Versions are supported when they have the same major version as
+        the node version and they are not greater than it.
+
+        Return: A boolean.
+
+        """
+        version_info = parse_version(x_version)
+        if not version_info:
+            return False
+
+        server_version_info = self.server_version_info
+
+        return (version_info[0] == server_version_info[0]
+                and version_info <= server_version_info)
 
     def _get_x_version(self, request):
         version = request.x_version
@@ -69,7 +515,7 @@ class Node(object):
             raise error.InternalExceptionError("Missing X-Version header")
 
         LOG.debug(u"Validating X-Version %s", version)
-        if version != self.server_version:
+        if not self.is_supported_version(version):
             headers = {}
             headers['X-Version'] = self.server_version
 
@@ -77,18 +523,58 @@ class Node(object):
 
         return version
 
-    def _get_x_services(self, request):
+    def _get_x_service(self, request, registry):
         service_info = request.x_service
         if not service_info:
             raise error.ServiceNotSpecifiedError()
-        
-        #TODO: See how to use the version given here
+
         (service_name, version) = service_info
         LOG.debug(u"Validating X-Service %s", service_name)
-        if service_name not in self.services:
+        if service_name not in registry:
             raise error.ServiceNotFoundError()
 
-        return self.services[service_name]
+        return (service_name, version)
+
+    def _get_schema_version(self, request, version_index, version):
+        """Get the schema version of a service for current XHTTP request
+
+        Version requested in X-Service header is used when there is one,
+        otherwise X-Version is used when service has it, and the latest
+        version of the service otherwise.
+        Raise error.VersionNotSupportedError when version is not found.
+
+        Return: A string.
+
+        """
+        x_version = self._get_x_version(request)
+        schema_version = version_index.resolve(version, x_version)
+        if schema_version is None:
+            headers = {}
+            headers['X-Version'] = self.server_version
+
+            raise error.VersionNotSupportedError(headers=headers)
+
+        return schema_version
+
+    def resolve_version(self, service_name, version=None, x_version=None):
+        """Get the schema version a request for a service would use
+
+        Version is the version requested in X-Service header and x_version
+        the X-Version header value. Services are never loaded to resolve
+        the version.
+
+        Return: A string, or None when service is not loaded or version is
+        not available.
+
+        """
+        if self.store is None:
+            version_index = self.registry.versions.get(service_name)
+        else:
+            stored_service = self.store.get(service_name)
+            version_index = stored_service and stored_service.versions
+
+        if version_index is not None:
+            return version_index.resolve(version, x_version)
 
     def get_schema(self, request):
         """Get schema for current XHTTP request
@@ -97,120 +583,289 @@ class Node(object):
         Raise error.XHTTPError type exceptions when invalid request is found.
 
         """
-        service = self._get_x_service(request)
-        version = self._get_x_version(request)
-        if version not in service:
-            headers = {}
-            headers['X-Version'] = self.server_version
+        (service_name, version) = self._get_x_service(request, self.registry)
+        registry = self._get_service_registry(service_name)
+        version = self._get_schema_version(
+            request, registry.versions[service_name], version)
 
-            raise error.VersionNotSupportedError(headers=headers)
+        return registry.services[service_name][version]
 
-        return service[version]
+    def get_action(self, request):
+        """Get the schema Action for current XHTTP request
+
+        Raise error.XHTTPError type exceptions when invalid request is found.
+
+        Return: An Action.
+
+        """
+        schema_version = self.get_schema(request)
+        action_name = request.x_action
+        if not action_name:
+            raise error.ActionNotSpecifiedError()
+
+        if action_name not in schema_version.actions:
+            raise error.ActionNotFoundError()
+
+        return schema_version.actions[action_name]
 
     def get_request_controller(self, request):
-        """Get the controller that will handle the XHTTP request contents"""
-
-        controller = None
-        #schema = self.get_schema(request)
-
-        return controller
-
-    def process_mode_version(self, request):
-        services = self._get_x_services(request)
-        version = self._get_x_version(request)
-        service_name = services[version]['info']['service']
-        LOG.debug(u"X-Mode: version, for service %s[%s]", service_name, version)
-        version_list = [version for version in services.keys()
-                                if not version.startswith("_")]
-        version_list.sort()
-        
-        return version_list
-
-    def process_mode_info(self, request):
-        services = self._get_x_services(request)
-        version = self._get_x_version(request)
-        service_name = services[version]['info']['service']
-        LOG.debug(u"X-Mode: info, for service %s[%s]", service_name, version)
-        #get service schema info for current version
-        info = services[version]['info']
-        #sort info list by field name
-        info_list = info.items()
-        info_list.sort(lambda info, info2: cmp(info[0], info2[0]))
-        
-        return info_list
+        """Get the controller that will handle the XHTTP request contents
+
+        Controller is taken from the controllers table that is built when
+        services are loaded.
+        Raise error.XHTTPError type exceptions when invalid request is found.
+
+        Return: A callable.
+
+        """
+        (service_name, version) = self._get_x_service(request, self.registry)
+        registry = self._get_service_registry(service_name)
+        version = self._get_schema_version(
+            request, registry.versions[service_name], version)
+        action_name = request.x_action
+        controllers = registry.controllers[service_name]
+        controller = controllers.get((version, action_name))
+        if controller:
+            return controller
+
+        #find out why there is no controller for current request
+        service = registry.services[service_name]
+        if not action_name:
+            raise error.ActionNotSpecifiedError()
+
+        if action_name not in service[version].actions:
+            raise error.ActionNotFoundError()
+
+        message = u"Action %s has no controller" % action_name
+        raise error.InternalExceptionError(message)
+
+    def _get_result_caches(self, service_name=None, action_name=None):
+        #result caches of memoized controllers in current registry
+        caches = []
+        for (name, controllers) in self.registry.controllers.items():
+            if service_name is not None and name != service_name:
+                continue
+
+            #controllers have (version, action) tuples as keys
+            for (key, controller) in controllers.items():
+                if action_name is not None and key[1] != action_name:
+                    continue
+
+                if isinstance(controller, MemoizedController):
+                    caches.append(controller.cache)
+
+        return caches
+
+    def invalidate_results(self, service_name=None, action_name=None,
+                           arguments=None):
+        """Remove cached action results
+
+        Results of all services, or of one service and optionally one of
+        its actions, are removed. When arguments are given only the
+        result for those decoded argument values is removed, including
+        the default values that controllers get for missing arguments.
+
+        Return: The number of removed results.
+
+        """
+        key = None
+        if arguments is not None:
+            key = make_key(arguments)
+
+        count = 0
+        for cache in self._get_result_caches(service_name, action_name):
+            count += cache.invalidate(key)
+
+        return count
+
+    def get_result_cache_stats(self):
+        """Get the totals of the action result caches
+
+        Return: A tuple with the number of hits, misses and cached results.
+
+        """
+        hits = misses = size = 0
+        for cache in self._get_result_caches():
+            hits += cache.hits
+            misses += cache.misses
+            size += len(cache)
+
+        return (hits, misses, size)
 
     @classmethod
-    def _action_to_list(cls, action):
-        #convert exceptions to list
-        exception_list = []
-        for exc in action['exceptions'].values():
-            exc_code = int(exc['code'])
-            exc_message = exc['message']
-            exception_list.append([exc_message, exc_code])
-
-        #convert arguments to list
-        argument_list = []
-        for arg in action['args'].values():
-            #TODO: implement optional arg properties (default, validate, ..)
-            arg_name = arg['name']
-            arg_type = int(arg['type'])
-            argument_list.append([arg_name, arg_type])
-        
-        action_name = action['name']
-        return_value = int(action['return'])
-
-        return [action_name, exception_list, argument_list, return_value]
-
-    def process_mode_schema(self, request):
-        services = self._get_x_services(request)
-        version = self._get_x_version(request)
-        service_name = services[version]['info']['service']
-        actions = services[version]['actions']
-        LOG.debug(u"X-Mode: schema, for service %s[%s]", service_name, version)
-
-        x_action = request.x_action
-        #when action name is given just return schema for it
-        if x_action:
-            if x_action not in actions:
-                raise error.ActionNotFoundError()
-
-            LOG.debug(u"X-Action: %s", x_action)
-            #add current action to list
-            current_action = actions[x_action]
-            action_list = [current_action]
-        else:
-            LOG.debug(u"No X-Action given. Listing all actions")
-            #add all actions to list
-            action_list = actions.values()
+    def create_response(cls, content, stages=None):
+        """Create a Response for the value returned by a controller
 
-        result_list = []
-        for action in action_list:
-            result_list.append(self._action_to_list(action))
-            
-        return result_list
+        Controllers can return a Response, or any other value that is
+        then returned as JSON.
+        Stages, when given, is a profiling.StageTimer where the end of
+        content serialization is marked.
 
-    def process_request(self, request):
-        content = None
-        mode = request.x_mode
-        if mode == MODE_VERSION:
-            content = self.process_mode_version(request)
-        elif mode == MODE_INFO:
-            content = self.process_mode_info(request)
-        elif mode == MODE_SCHEMA:
-            content = self.process_mode_schema(request)
-        else:
-            raise error.ModeNotSupportedError()
+        Return: A Response.
 
-        if not content:
-            if not mode:
-                message = u"Request has not X-Mode"
-            else:
-                message = u"Invalid X-Mode %s" % mode
+        """
+        if isinstance(content, Response):
+            return content
 
-            raise error.InternalExceptionError(message)
+        body = cls._dumps(content)
+        if stages is not None:
+            stages.mark(STAGE_SERIALIZATION)
 
-        body = simplejson.dumps(content, separators=(",", ":"))
         response = Response(body=body)
-        response.content_type = "application/json; charset=utf-8"
-        
+        response.content_type = JSON_CONTENT_TYPE
+
         return response
+
+    @classmethod
+    def _dumps(cls, content):
+        return simplejson.dumps(content, separators=(",", ":"))
+
+    @classmethod
+    def build_service_responses(cls, service, cache_control=None):
+        """Build serialized metadata responses for a service
+
+        Result dictionary has (mode, version, action) tuples as keys and
+        a tuple with the status, headers and JSON body of each response
+        as values. Action is None for version and info responses, and for
+        the schema response that lists all the actions of a version.
+        Each response has an ETag computed from its body, and a
+        Cache-Control header when cache_control is given.
+
+        Return: A dictionary.
+
+        """
+        responses = {}
+        version_list = sort_versions(service.versions)
+        version_parts = cls._build_parts(cls._dumps(version_list),
+                                        cache_control)
+
+        for version in version_list:
+            schema_version = service[version]
+            responses[(MODE_VERSION, version, None)] = version_parts
+            #info is already sorted by field name
+            info_list = [list(info) for info in schema_version.info]
+            key = (MODE_INFO, version, None)
+            responses[key] = cls._build_parts(cls._dumps(info_list),
+                                              cache_control)
+
+            #serialize each action once and join them for the full schema
+            action_body_list = []
+            for (action_name, action) in schema_version.actions.items():
+                action_body = cls._dumps(action.to_list())
+                action_body_list.append(action_body)
+                key = (MODE_SCHEMA, version, action_name)
+                responses[key] = cls._build_parts("[%s]" % action_body,
+                                                  cache_control)
+
+            schema_body = "[%s]" % ",".join(action_body_list)
+            key = (MODE_SCHEMA, version, None)
+            responses[key] = cls._build_parts(schema_body, cache_control)
+
+        return responses
+
+    @classmethod
+    def _build_parts(cls, body, cache_control=None):
+        headers = [VARY_HEADER, ('ETag', get_etag(body))]
+        if cache_control:
+            headers.append(('Cache-Control', cache_control))
+
+        return build_response_parts(body, JSON_CONTENT_TYPE,
+                                    extra_headers=headers)
+
+    def get_encoding(self, accept_encoding):
+        """Get the content encoding for an Accept-Encoding header value
+
+        Return: A string, or None when responses must not be compressed.
+
+        """
+        if self.compressor:
+            return self.compressor.get_encoding(accept_encoding)
+
+    def get_response_parts(self, request, encoding=None):
+        """Get the response parts for a metadata XHTTP request
+
+        Status, headers and body are taken from the precomputed responses
+        table, or from the store file when node uses one, so nothing is
+        serialized while processing the request.
+        When an encoding is given the response is compressed the first
+        time it is requested, and the compressed parts are kept until
+        service schemas change. Store files already have the compressed
+        responses, which are shared by all processes.
+        Request can be a Request or an EnvironRequest.
+        Raise error.XHTTPError type exceptions when invalid request is found.
+
+        Return: A tuple with status, headers and body.
+
+        """
+        mode = request.x_mode
+        if mode not in METADATA_MODES:
+            raise error.ModeNotSupportedError()
+
+        (service_name, version) = self._get_x_service(request, self.registry)
+        if self.store is None:
+            #use the same registry during the whole request
+            registry = self._get_service_registry(service_name)
+            responses = registry.responses[service_name]
+            version_index = registry.versions[service_name]
+        else:
+            #responses are read from store without parsing the service
+            self._check_store()
+            responses = self.store.get(service_name)
+            if responses is None:
+                raise error.ServiceNotFoundError()
+
+            version_index = responses.versions
+
+        version = self._get_schema_version(request, version_index, version)
+        action = None
+        if mode == MODE_SCHEMA:
+            action = request.x_action
+
+        LOG.debug(u"X-Mode: %s, for service %s[%s]", mode, service_name,
+                  version)
+        if action:
+            LOG.debug(u"X-Action: %s", action)
+
+        parts = responses.get((mode, version, action))
+        if parts is None:
+            raise error.ActionNotFoundError()
+
+        if encoding and self.compressor:
+            key = (mode, version, action, encoding)
+            if self.store is not None:
+                #store only has responses that are worth compressing
+                return responses.get(key, parts)
+
+            variants = self._get_variants(service_name, responses)
+            if key not in variants:
+                variants[key] = self.compressor.compress_parts(parts,
+                                                               encoding)
+
+            parts = variants[key]
+
+        return parts
+
+    def _get_variants(self, service_name, responses):
+        #compressed responses are kept outside the registry, which is never
+        #modified, and are only used with the responses they come from
+        entry = self.variants.get(service_name)
+        if entry is None or entry[0] is not responses:
+            entry = (responses, {})
+            self.variants[service_name] = entry
+
+        return entry[1]
+
+    def get_response_body(self, request):
+        """Get the serialized body for a metadata XHTTP request
+
+        Return: A string.
+
+        """
+        (status, headers, body) = self.get_response_parts(request)
+
+        return body
+
+    def process_request(self, request):
+        parts = self.get_response_parts(request)
+
+        return Response.create_from_parts(parts)
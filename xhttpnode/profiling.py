@@ -0,0 +1,245 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+from StringIO import StringIO
+from timeit import default_timer
+
+from xhttpnode.request import MODE_PERFORM
+from xhttpnode.request import parse_x_service
+
+LOG = logging.getLogger(__name__)
+
+#stage names recorded while processing requests
+STAGE_HEADER_PARSE = "header_parse"
+STAGE_VERSION_CHECK = "version_check"
+STAGE_SCHEMA_LOOKUP = "schema_lookup"
+STAGE_DISPATCH = "dispatch"
+STAGE_SERIALIZATION = "serialization"
+STAGE_RESPONSE = "response"
+
+#number of functions logged for profiles that are not saved to files
+LOG_STATS_LINES = 25
+
+#characters of client values that are replaced in profile file names
+UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+#maximum length of each client value used in profile file names
+MAX_NAME_PART_LENGTH = 32
+
+
+class StageTimer(object):
+    """Record the time spent in each stage of a request
+
+    Each call to mark ends the current stage and starts the next one.
+
+    """
+
+    __slots__ = ('start_time', 'last_time', 'stages')
+
+    def __init__(self):
+        self.start_time = self.last_time = default_timer()
+        #list of (stage name, seconds) tuples
+        self.stages = []
+
+    def mark(self, name):
+        """End a stage of the request"""
+        now = default_timer()
+        self.stages.append((name, now - self.last_time))
+        self.last_time = now
+
+    @property
+    def elapsed(self):
+        return self.last_time - self.start_time
+
+    def format(self):
+        """Get a text with the time of each stage in milliseconds
+
+        Return: A string.
+
+        """
+        return ", ".join("%s=%.3fms" % (name, seconds * 1000)
+                         for (name, seconds) in self.stages)
+
+
+def parse_targets(targets):
+    """Parse a list of "service" or "service:action" strings
+
+    Return: A frozenset of (service, action) tuples, where action is
+    None for targets that select all actions of a service.
+
+    """
+    result = set()
+    for target in targets or ():
+        (service, separator, action) = target.partition(":")
+        result.add((service, action or None))
+
+    return frozenset(result)
+
+
+class Profiler(object):
+    """Profile selected XHTTP requests
+
+    Requests are selected randomly using sample_rate, which is the
+    fraction of requests to profile, or when their service, or service
+    and action, is one of the targets. Selected requests are run with
+    cProfile, which makes them several times slower, one at a time, so
+    requests selected while another one is profiled are run without it.
+    Every request processed while a profiler is installed records the
+    time of its stages, which is cheap, and requests that take at least
+    slow_threshold seconds are logged with their stage times. So a
+    threshold alone only logs slow requests, and the profile of a slow
+    request is only available when it was selected. Profiles are saved
+    to output_dir, or logged when there is no output directory. When
+    there is no threshold, profiles of all selected requests are saved.
+    At most max_dumps profiles are saved.
+
+    """
+
+    def __init__(self, sample_rate=0.0, targets=None, slow_threshold=None,
+                 output_dir=None, max_dumps=100):
+        self.sample_rate = sample_rate
+        self.targets = parse_targets(targets)
+        self.slow_threshold = slow_threshold
+        self.output_dir = output_dir
+        self.max_dumps = max_dumps
+        self.dumps = 0
+        self._lock = threading.Lock()
+        #cProfile can only profile one request at a time in each thread,
+        #and profiling in parallel threads gives misleading results
+        self._profiling = threading.Lock()
+
+    @classmethod
+    def get_request_target(cls, environ):
+        service = None
+        x_service = environ.get('HTTP_X_SERVICE')
+        if x_service:
+            service = parse_x_service(x_service)[0]
+
+        return (service, environ.get('HTTP_X_ACTION'))
+
+    def is_selected(self, environ):
+        """Check if a request has to be profiled
+
+        Return: A boolean.
+
+        """
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+
+        if self.targets:
+            (service, action) = self.get_request_target(environ)
+            if (service, None) in self.targets:
+                return True
+
+            return (service, action) in self.targets
+
+        return False
+
+    def process(self, function, environ, start_response):
+        """Process a request with a WSGI function that accepts stages
+
+        Function is called with environ, start_response and a
+        StageTimer, and stage times are saved in environ in
+        'xhttp.stages' for applications.
+
+        Return: An iterable with the response body.
+
+        """
+        stages = environ['xhttp.stages'] = StageTimer()
+        profile = None
+        if self.is_selected(environ) and self._profiling.acquire(False):
+            try:
+                profile = cProfile.Profile()
+                result = profile.runcall(function, environ, start_response,
+                                         stages)
+            finally:
+                self._profiling.release()
+        else:
+            result = function(environ, start_response, stages)
+
+        elapsed = default_timer() - stages.start_time
+        threshold = self.slow_threshold
+        if threshold is not None and elapsed >= threshold:
+            (service, action) = self.get_request_target(environ)
+            LOG.warning(u"Slow XHTTP %s request for %s:%s took %.3fms: %s",
+                        environ.get('HTTP_X_MODE', MODE_PERFORM), service,
+                        action, elapsed * 1000, stages.format())
+            if profile:
+                self.dump(profile, environ, elapsed)
+        elif profile and threshold is None:
+            self.dump(profile, environ, elapsed)
+
+        return result
+
+    def get_dump_file_name(self, environ, index):
+        #client values are shortened and can't be used as paths
+        target = [UNSAFE_NAME_CHARS.sub("_", str(value))[:MAX_NAME_PART_LENGTH]
+                  for value in self.get_request_target(environ)]
+        name = "xhttp-%s-%s-%s-%s-%s.prof" % (
+            target[0], target[1], time.strftime("%Y%m%d%H%M%S"),
+            os.getpid(), index)
+
+        return os.path.join(self.output_dir, name)
+
+    def dump(self, profile, environ, elapsed):
+        """Save or log the profile of a request"""
+        with self._lock:
+            if self.dumps >= self.max_dumps:
+                return
+
+            self.dumps += 1
+            index = self.dumps
+
+        if self.output_dir:
+            file_name = self.get_dump_file_name(environ, index)
+            try:
+                profile.dump_stats(file_name)
+            except (IOError, OSError), exc:
+                #requests never fail because of their profiles
+                LOG.warning(u"Can't save profile of XHTTP request to %s: %s",
+                            file_name, exc)
+                return
+
+            LOG.info(u"Saved profile of XHTTP request to %s", file_name)
+            return
+
+        stream = StringIO()
+        stats = pstats.Stats(profile, stream=stream)
+        stats.sort_stats("cumulative").print_stats(LOG_STATS_LINES)
+        LOG.info(u"Profile of XHTTP request that took %.3fms:\n%s",
+                 elapsed * 1000, stream.getvalue())
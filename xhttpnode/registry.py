@@ -0,0 +1,92 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+class ServiceRegistry(object):
+    """Snapshot of the services available in a node
+
+    A registry is never modified once it is created. When schemas change
+    node creates a new registry and replaces the current one with a single
+    assignment, so requests in process keep using a consistent set of
+    services and responses without any locking.
+
+    """
+
+    def __init__(self, services=None, responses=None, schema_files=None,
+                 controllers=None, versions=None):
+        #parsed schemas for each service name
+        self.services = services or {}
+        #serialized metadata responses for each service name
+        self.responses = responses or {}
+        #schema file names for each available service name
+        self.schema_files = schema_files or {}
+        #action controllers for each service name
+        self.controllers = controllers or {}
+        #version.VersionIndex for each service name
+        self.versions = versions or {}
+
+    def __contains__(self, service_name):
+        return (service_name in self.services
+                or service_name in self.schema_files)
+
+    def __len__(self):
+        return len(self.services)
+
+    def replace(self, services=None, responses=None, removed=None,
+                schema_files=None, controllers=None, versions=None):
+        """Create a new registry with some services changed
+
+        Services, responses, controllers and versions are dictionaries with the
+        services that have to be added or updated, and removed is a list
+        of service names that must not be loaded in the new registry.
+        When schema files are given they replace the current schema files.
+
+        Return: A ServiceRegistry.
+
+        """
+        new_services = dict(self.services)
+        new_responses = dict(self.responses)
+        new_controllers = dict(self.controllers)
+        new_versions = dict(self.versions)
+        for service_name in (removed or []):
+            new_services.pop(service_name, None)
+            new_responses.pop(service_name, None)
+            new_controllers.pop(service_name, None)
+            new_versions.pop(service_name, None)
+
+        new_services.update(services or {})
+        new_responses.update(responses or {})
+        new_controllers.update(controllers or {})
+        new_versions.update(versions or {})
+        if schema_files is None:
+            schema_files = self.schema_files
+
+        return self.__class__(new_services, new_responses, schema_files,
+                              new_controllers, new_versions)
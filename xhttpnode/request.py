@@ -29,17 +29,70 @@
 #
 from webob import request
 
+from xhttpnode import error
+from xhttpnode.datatype import ArgumentDecodeError
+
 #XHTTP request modes
 MODE_VERSION = "version"
 MODE_INFO = "info"
 MODE_SCHEMA = "schema"
 MODE_PERFORM = "perform"
+MODE_BATCH = "batch"
+MODE_METRICS = "metrics"
 
 
 class RequestException(Exception):
     """Base exception for Request errors"""
 
 
+def parse_x_service(x_service):
+    """Parse an X-Service header value
+
+    Return: A tuple with service name and version, where version
+    is None when X-Service specify only the service name. Everything
+    after the first ';' is the version.
+
+    """
+    if ";" in x_service:
+        return tuple(x_service.split(";", 1))
+
+    #when no version is available return None instead
+    return (x_service, None)
+
+
+class EnvironRequest(object):
+    """Lightweight XHTTP request that reads headers from WSGI environ
+
+    It is used instead of Request to process metadata requests, which
+    only need the values of XHTTP headers.
+
+    """
+
+    __slots__ = ('node', 'environ')
+
+    def __init__(self, node, environ):
+        self.node = node
+        self.environ = environ
+
+    @property
+    def x_mode(self):
+        return self.environ.get('HTTP_X_MODE', MODE_PERFORM)
+
+    @property
+    def x_version(self):
+        return self.environ.get('HTTP_X_VERSION')
+
+    @property
+    def x_service(self):
+        x_service = self.environ.get('HTTP_X_SERVICE')
+        if x_service is not None:
+            return parse_x_service(x_service)
+
+    @property
+    def x_action(self):
+        return self.environ.get('HTTP_X_ACTION')
+
+
 class Request(request.Request):
     """Base class for XHTTP requests"""
 
@@ -80,12 +133,7 @@ class Request(request.Request):
 
         """
         if "X-Service" in self.headers:
-            x_service = self.headers['X-Service']
-            if ";" in x_service:
-                return tuple(x_service.split(";"))
-            
-            #when no version is available return None instead
-            return (x_service, None)
+            return parse_x_service(self.headers['X-Service'])
     
     @property
     def x_action(self):
@@ -102,35 +150,61 @@ class Request(request.Request):
         
         Returned dictionary has argument name as key
         and argument type as value.
+        X-Arguments header is parsed only once for each request.
 
         Return: A dictionary, or None when no arguments header exists.
 
         """
+        if 'xhttp.arguments' in self.environ:
+            return self.environ['xhttp.arguments']
+
         if "X-Arguments" not in self.headers:
             return
 
         arguments = self.headers['X-Arguments']
-        arguments = arguments.split(",")
-        arguments = [arg.split(";") for arg in arguments]
         #convert argument types to integer and add them to dictionary
         x_args = {}
-        for (name, value_type) in arguments:
+        for argument in arguments.split(","):
+            (name, separator, value_type) = argument.partition(";")
+            name = name.strip()
             try:
                 x_args[name] = int(value_type)
-            except TypeError:
+            except ValueError:
                 msg = u"Invalid XHTTP data type %s for argument %s" \
-                    % (name, value_type)
+                    % (value_type, name)
 
                 raise RequestException(msg)
 
+        self.environ['xhttp.arguments'] = x_args
+
         return x_args
+
     @property
     def x_arguments_values(self):
-        """Get a dictionary with XHTTP request X-Arguments values."""
-        x_args_values = {}
-        for (name, value_type) in self.x_arguments.items():
-            #TODO: get values from request
-            pass
+        """Get a dictionary with XHTTP request X-Arguments values
+        
+        Values are decoded from the request body using the argument
+        types defined in the schema of the request action, and
+        they are decoded only once for each request.
+        Raise error.Error106 or error.Error107 when values are not
+        valid for the request action.
+
+        Return: A dictionary.
+
+        """
+        if 'xhttp.arguments_values' in self.environ:
+            return self.environ['xhttp.arguments_values']
+
+        action = self.node.get_action(self)
+        try:
+            x_arguments = self.x_arguments
+            x_args_values = action.decoder.decode(self.body, self.x_encoding)
+        except (RequestException, ArgumentDecodeError, LookupError), exc:
+            raise error.Error107(detail=unicode(exc))
+
+        #validate values against action schema
+        x_args_values = action.validate(x_args_values, x_arguments)
+        self.environ['xhttp.arguments_values'] = x_args_values
 
         return x_args_values
 
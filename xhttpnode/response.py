@@ -27,8 +27,160 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
+import hashlib
+
 from webob import response
 
+from xhttpnode import error as xhttp_error
+
+#value for Server header of XHTTP responses
+SERVER_NAME = "XHTTP Python node"
+
+#Content-Type for JSON responses
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+
+#Content-Type for XHTTP error responses
+ERROR_CONTENT_TYPE = "text/plain; charset=utf-8"
+
+#status for conditional requests that match current entity tag
+NOT_MODIFIED_STATUS = "304 Not Modified"
+
+#headers that are sent in 304 responses
+NOT_MODIFIED_HEADERS = frozenset([
+    'Cache-Control',
+    'ETag',
+    'Server',
+    'Vary',
+])
+
+#header for responses that can be compressed for some clients
+VARY_HEADER = ('Vary', "Accept-Encoding")
+
+
+def build_response_parts(body, content_type, status="200 OK",
+                         extra_headers=()):
+    """Build the parts of a WSGI response without creating a Response
+
+    Headers are returned as a tuple, so they can be prebuilt and shared
+    between requests. A list copy of them must be given to WSGI servers.
+
+    Return: A tuple with status, headers and body.
+
+    """
+    headers = (
+        ('Content-Type', content_type),
+        ('Content-Length', str(len(body))),
+        ('Server', SERVER_NAME),
+    ) + tuple(extra_headers)
+
+    return (status, headers, body)
+
+
+def get_etag(body):
+    """Get a strong entity tag for a response body
+
+    Return: A string.
+
+    """
+    return '"%s"' % hashlib.md5(body).hexdigest()
+
+
+def get_header(headers, name, default=None):
+    """Get the value of a header from a list of (name, value) tuples"""
+    for (header_name, value) in headers:
+        if header_name == name:
+            return value
+
+    return default
+
+
+def etag_matches(if_none_match, etag):
+    """Check if an If-None-Match header value matches an entity tag
+
+    Return: A boolean.
+
+    """
+    if not etag:
+        return False
+
+    for value in if_none_match.split(","):
+        value = value.strip()
+        #weak comparison is used for If-None-Match
+        if value.startswith("W/"):
+            value = value[2:]
+
+        if value == etag or value == "*":
+            return True
+
+    return False
+
+
+def get_not_modified_parts(parts):
+    """Get a 304 response for the parts of a response with an ETag
+
+    Response has no body and keeps only the headers that describe the
+    cached response.
+
+    Return: A tuple with status, headers and body.
+
+    """
+    (status, headers, body) = parts
+    not_modified_headers = tuple(
+        (name, value) for (name, value) in headers
+        if name in NOT_MODIFIED_HEADERS)
+
+    return (NOT_MODIFIED_STATUS, not_modified_headers, "")
+
+
+def build_error_response_parts(error_class):
+    """Build the response parts shared by all errors of an XHTTP error class
+
+    Return: A tuple with status, headers and body.
+
+    """
+    status = error_class.get_status()
+
+    return build_response_parts(status, ERROR_CONTENT_TYPE, status)
+
+
+def _build_error_response_table():
+    table = {}
+    for value in vars(xhttp_error).itervalues():
+        if (isinstance(value, type)
+                and issubclass(value, xhttp_error.XHTTPError)):
+            table[value] = build_error_response_parts(value)
+
+    return table
+
+
+#prebuilt response parts for each XHTTP error class
+ERROR_RESPONSE_PARTS = _build_error_response_table()
+
+
+def get_error_response_parts(error):
+    """Get the parts of a WSGI response for an XHTTP error
+
+    Status, body and common headers are taken from the prebuilt parts of
+    the error class, so only the error headers, like X-Exception or
+    X-Version, are added for each error.
+
+    Return: A tuple with status, headers and body.
+
+    """
+    error_class = error.__class__
+    parts = ERROR_RESPONSE_PARTS.get(error_class)
+    if parts is None:
+        #error classes defined outside error module are built on first use
+        parts = build_error_response_parts(error_class)
+        ERROR_RESPONSE_PARTS[error_class] = parts
+
+    if not error.headers:
+        return parts
+
+    (status, headers, body) = parts
+
+    return (status, headers + tuple(error.headers), body)
+
 
 class Response(response.Response):
     """Base class for XHTTP responses"""
@@ -39,7 +191,18 @@ class Response(response.Response):
     def __init__(self, *args, **kwargs):
         super(Response, self).__init__(*args, **kwargs)
         if 'Server' not in self.headers:
-            self.headers['Server'] = "XHTTP Python node"
+            self.headers['Server'] = SERVER_NAME
+
+    @classmethod
+    def create_from_parts(cls, parts):
+        """Create a new Response from status, headers and body
+
+        Return: A Response.
+
+        """
+        (status, headers, body) = parts
+
+        return cls(status=status, headerlist=list(headers), body=body)
 
     @classmethod
     def create_from_error(cls, error):
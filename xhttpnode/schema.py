@@ -28,6 +28,7 @@
 # THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 #
 import logging
+import multiprocessing
 import os
 
 try:
@@ -128,6 +129,55 @@ def parse_schema_tree(tree):
     return schemas
 
 
+def iterparse_schemas(source):
+    """Parse schema nodes from an XHTTP schema document incrementally
+
+    Document is parsed as a stream, and each xhttp:action element is
+    parsed as soon as it is closed and then discarded, so the whole
+    document tree is never kept in memory.
+    Source can be a file name or a file object.
+    Result is the same as the one returned by parse_schema_tree.
+
+    Return: A dictionary.
+
+    """
+    schema_tag = ns('schema')
+    info_tag = ns('info')
+    action_tag = ns('action')
+    schemas = {}
+    #schema dictionary for the xhttp:schema element being parsed
+    schema = None
+
+    for (event, element) in ET.iterparse(source, events=("start", "end")):
+        tag = element.tag
+        if event == "start":
+            if tag == schema_tag:
+                schema = {}
+                schema.update(element.attrib)
+                schema['info'] = {}
+                schema['actions'] = {}
+                schemas[element.attrib['version']] = schema
+
+            continue
+
+        if schema is None:
+            continue
+
+        if tag == action_tag:
+            action_name = element.attrib['name']
+            schema['actions'][action_name] = parse_action_element(element)
+            #discard the action subtree once it is parsed
+            element.clear()
+        elif tag == info_tag:
+            info_name = element.attrib['name']
+            schema['info'][info_name] = element.attrib['value']
+        elif tag == schema_tag:
+            schema = None
+            element.clear()
+
+    return schemas
+
+
 def parse_schema_document(file_name):
     """Parse an XHTTP schema document
     
@@ -136,11 +186,12 @@ def parse_schema_document(file_name):
     """
     file_name = os.path.abspath(file_name)
     try:
-        tree = ET.parse(file_name)
-        schemas = parse_schema_tree(tree)
+        #get mtime before parsing so changes while parsing are not missed
+        mtime = os.path.getmtime(file_name)
+        schemas = iterparse_schemas(file_name)
         #save meta schema file information
         meta = schemas['__meta__'] = {}
-        meta['mtime'] = os.path.getmtime(file_name)
+        meta['mtime'] = mtime
         meta['file'] = file_name
     except Exception, exc:
         msg = ("Unable to parse XHTTP schema file %s\n[error] %s" 
@@ -149,3 +200,47 @@ def parse_schema_document(file_name):
         raise SchemaParseError(msg)
 
     return schemas
+
+
+def _parse_schema_document(file_name):
+    #errors are returned because this is called inside pool processes
+    try:
+        return (parse_schema_document(file_name), None)
+    except SchemaParseError, exc:
+        return (None, str(exc))
+
+
+def parse_schema_documents(file_names, processes=None):
+    """Parse a list of XHTTP schema documents using a pool of processes
+
+    By default pool uses one process for each CPU.
+    Each file that can't be parsed is logged, and a SchemaParseError
+    is raised for the first of them once all files are processed.
+
+    Return: A list of dictionaries in the same order as file names.
+
+    """
+    file_names = list(file_names)
+    processes = processes or multiprocessing.cpu_count()
+    #send files in chunks to reduce the communication with processes
+    chunk_size = max(1, len(file_names) / (processes * 4))
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(_parse_schema_document, file_names, chunk_size)
+    finally:
+        pool.close()
+        pool.join()
+
+    schemas_list = []
+    first_error = None
+    for (schemas, error) in results:
+        if error:
+            LOG.error(error)
+            first_error = first_error or error
+
+        schemas_list.append(schemas)
+
+    if first_error:
+        raise SchemaParseError(first_error)
+
+    return schemas_list
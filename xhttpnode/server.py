@@ -0,0 +1,465 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import Queue
+import errno
+import functools
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+from wsgiref.simple_server import ServerHandler
+from wsgiref.simple_server import WSGIRequestHandler
+from wsgiref.simple_server import WSGIServer
+from wsgiref.simple_server import make_server
+
+LOG = logging.getLogger(__name__)
+
+#raw HTTP response sent when there are too many queued requests
+REJECT_RESPONSE = (
+    "HTTP/1.0 503 Service Unavailable\r\n"
+    "Content-Type: text/plain; charset=utf-8\r\n"
+    "Content-Length: 23\r\n"
+    "Retry-After: 1\r\n"
+    "Connection: close\r\n"
+    "\r\n"
+    "503 Service Unavailable"
+)
+
+#default seconds to wait for the next request of a persistent connection
+IDLE_TIMEOUT = 15.0
+
+
+class InputStream(object):
+    """Request body stream limited to the request content length
+
+    Connection stream can contain the next pipelined requests after the
+    body, so WSGI applications must not read past the content length.
+
+    """
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+
+        if not size:
+            return ""
+
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+
+        return data
+
+    def readline(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+
+        if not size:
+            return ""
+
+        line = self.stream.readline(size)
+        self.remaining -= len(line)
+
+        return line
+
+    def readlines(self, hint=-1):
+        return list(self)
+
+    def __iter__(self):
+        return iter(self.readline, "")
+
+    def drain(self):
+        """Read and discard the body data not read by the application"""
+        while self.remaining:
+            if not self.read(65536):
+                break
+
+
+class KeepAliveServerHandler(ServerHandler):
+    """WSGI handler that writes HTTP/1.1 responses"""
+
+    http_version = "1.1"
+
+    def cleanup_headers(self):
+        ServerHandler.cleanup_headers(self)
+        request_handler = self.request_handler
+        #response end can only be known by its content length
+        if 'Content-Length' not in self.headers:
+            request_handler.close_connection = 1
+
+        if request_handler.close_connection:
+            self.headers['Connection'] = "close"
+        elif request_handler.request_version == "HTTP/1.0":
+            self.headers['Connection'] = "keep-alive"
+
+    def handle_error(self):
+        #application state is unknown after an error
+        self.request_handler.close_connection = 1
+        ServerHandler.handle_error(self)
+
+
+class KeepAliveWSGIRequestHandler(WSGIRequestHandler):
+    """WSGI request handler with support for persistent connections
+
+    Connections are kept open after each response, unless client asks
+    to close them, and are closed when no request arrives for the idle
+    timeout seconds. Requests sent by clients without waiting for the
+    previous responses are read in order from the buffered connection
+    stream, using the content length of each request to find where the
+    next one starts. An idle timeout of zero disables persistent
+    connections.
+
+    """
+
+    protocol_version = "HTTP/1.1"
+    #send small responses without waiting for client acknowledges
+    disable_nagle_algorithm = True
+    #buffer response writes to send each response in a single packet
+    wbufsize = -1
+
+    def __init__(self, request, client_address, server,
+                 idle_timeout=IDLE_TIMEOUT):
+        self.keep_alive = bool(idle_timeout)
+        if idle_timeout:
+            self.timeout = idle_timeout
+
+        WSGIRequestHandler.__init__(self, request, client_address, server)
+
+    def handle(self):
+        self.close_connection = 1
+        self.handle_one_request()
+        while not self.close_connection:
+            self.handle_one_request()
+
+    def _get_input(self):
+        if self.headers.getheader('transfer-encoding'):
+            self.send_error(411)
+            return None
+
+        try:
+            length = int(self.headers.getheader('content-length') or 0)
+        except ValueError:
+            self.send_error(400, "Invalid Content-Length")
+            return None
+
+        if length and self.headers.getheader('expect') == "100-continue":
+            self.wfile.write("HTTP/1.1 100 Continue\r\n\r\n")
+            self.wfile.flush()
+
+        return InputStream(self.rfile, length)
+
+    def handle_one_request(self):
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except socket.timeout:
+            self.close_connection = 1
+            return
+
+        if not self.raw_requestline:
+            self.close_connection = 1
+            return
+
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            return
+
+        #an error response has already been sent when parsing fails
+        if not self.parse_request():
+            return
+
+        if not self.keep_alive:
+            self.close_connection = 1
+
+        stdin = self._get_input()
+        if stdin is None:
+            return
+
+        try:
+            handler = KeepAliveServerHandler(stdin, self.wfile,
+                                             self.get_stderr(),
+                                             self.get_environ())
+            handler.request_handler = self
+            handler.run(self.server.get_app())
+            if not self.close_connection:
+                stdin.drain()
+        except socket.timeout:
+            self.close_connection = 1
+
+
+def get_handler_class(threads, idle_timeout=IDLE_TIMEOUT):
+    """Get the request handler class for a WSGI server
+
+    Persistent connections are only used when requests are handled in a
+    pool of threads, since a server with a single thread can't handle
+    other clients while a connection waits for its next request.
+
+    Return: A request handler class.
+
+    """
+    if not threads:
+        idle_timeout = 0
+
+    return functools.partial(KeepAliveWSGIRequestHandler,
+                             idle_timeout=idle_timeout)
+
+
+class ThreadPoolWSGIServer(WSGIServer):
+    """WSGI server that handles requests in a fixed pool of threads
+
+    Accepted connections wait in a bounded queue until a thread is free
+    to handle them. When queue is full new connections are rejected
+    right away with a 503 response, instead of making all clients wait.
+    A persistent connection uses its thread until it is closed or its
+    idle timeout expires.
+    Threads are started when server starts serving, so servers can be
+    created before forking worker processes.
+
+    """
+
+    def __init__(self, server_address, handler_class, threads=8,
+                 queue_size=64):
+        WSGIServer.__init__(self, server_address, handler_class)
+        self.threads = threads
+        self.requests = Queue.Queue(queue_size)
+        self._thread_list = []
+
+    def _start_threads(self):
+        for index in range(self.threads):
+            thread = threading.Thread(target=self._process_requests,
+                                      name="xhttp-worker-%s" % index)
+            thread.daemon = True
+            thread.start()
+            self._thread_list.append(thread)
+
+    def _process_requests(self):
+        while True:
+            item = self.requests.get()
+            if item is None:
+                break
+
+            (request, client_address) = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        try:
+            self.requests.put_nowait((request, client_address))
+        except Queue.Full:
+            LOG.warning("Rejecting request from %s, queue is full",
+                        client_address[0])
+            self.reject_request(request)
+            self.shutdown_request(request)
+
+    def reject_request(self, request):
+        """Send a 503 response for a request that can't be queued"""
+        try:
+            #read received request data without blocking, otherwise
+            #closing the socket can reset the connection before client
+            #reads the response
+            request.setblocking(0)
+            try:
+                request.recv(65536)
+            except socket.error:
+                pass
+
+            request.setblocking(1)
+            request.sendall(REJECT_RESPONSE)
+        except Exception:
+            pass
+
+    def serve_forever(self, *args, **kwargs):
+        if not self._thread_list:
+            self._start_threads()
+
+        WSGIServer.serve_forever(self, *args, **kwargs)
+
+    def server_close(self):
+        WSGIServer.server_close(self)
+        #stop all threads once queued requests are handled
+        for thread in self._thread_list:
+            self.requests.put(None)
+
+        for thread in self._thread_list:
+            thread.join()
+
+        self._thread_list = []
+
+
+class PreforkServer(object):
+    """WSGI server that handles requests in a pool of worker processes
+
+    Listening socket is created before forking, so all workers accept
+    connections from the same socket. Application is also created before
+    forking, so the schemas it loads are shared by the workers until
+    they are modified. Workers that die are replaced by new ones.
+    Connections are closed after each response unless handler_class
+    keeps them open, which is only useful when server_class handles
+    requests in a pool of threads.
+
+    """
+
+    #minimum seconds between restarts of workers that die at startup
+    restart_delay = 1.0
+
+    #seconds between stop signals sent to workers that are still alive
+    stop_retry_delay = 0.5
+
+    def __init__(self, host, port, application, workers=2, post_fork=None,
+                 server_class=WSGIServer, handler_class=None):
+        if handler_class is None:
+            #each worker handles one connection at a time by default
+            handler_class = get_handler_class(threads=0)
+
+        self.workers = workers
+        #function called inside each worker after it is forked
+        self.post_fork = post_fork
+        self.server = make_server(host, port, application,
+                                  server_class=server_class,
+                                  handler_class=handler_class)
+        self.socket = self.server.socket
+        #worker start time for each worker process ID
+        self.children = {}
+        self.running = False
+        self.pid = None
+
+    def _spawn_worker(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.time()
+            return pid
+
+        #inside worker process
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            if self.post_fork:
+                self.post_fork()
+
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        except Exception:
+            LOG.exception("Error in XHTTP worker %s", os.getpid())
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def _handle_stop(self, signum, frame):
+        #workers can get the signal before they restore default handlers
+        if os.getpid() != self.pid:
+            os._exit(0)
+
+        self.running = False
+
+    def _wait_worker(self):
+        try:
+            (pid, status) = os.wait()
+        except OSError, exc:
+            if exc.errno in (errno.EINTR, errno.ECHILD):
+                return
+
+            raise
+
+        start_time = self.children.pop(pid, None)
+        if start_time is None or not self.running:
+            return
+
+        LOG.warning("XHTTP worker %s exited with status %s", pid, status)
+        #avoid restarting workers continuously when they fail at startup
+        elapsed = time.time() - start_time
+        if elapsed < self.restart_delay:
+            time.sleep(self.restart_delay - elapsed)
+
+        if self.running:
+            self._spawn_worker()
+
+    def serve_forever(self):
+        """Start workers and restart them when they die until stopped"""
+        self.running = True
+        self.pid = os.getpid()
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        try:
+            for index in range(self.workers):
+                self._spawn_worker()
+
+            while self.running:
+                self._wait_worker()
+        finally:
+            self.stop()
+
+    def _kill_workers(self, signum):
+        for pid in self.children.keys():
+            try:
+                os.kill(pid, signum)
+            except OSError:
+                pass
+
+    def stop(self):
+        """Stop all workers and close listening socket"""
+        self.running = False
+        self._kill_workers(signal.SIGTERM)
+        kill_time = time.time()
+        while self.children:
+            try:
+                (pid, status) = os.waitpid(-1, os.WNOHANG)
+            except OSError, exc:
+                if exc.errno == errno.EINTR:
+                    continue
+
+                break
+
+            if pid:
+                self.children.pop(pid, None)
+                continue
+
+            #workers that were being forked can miss the signal
+            if time.time() - kill_time >= self.stop_retry_delay:
+                self._kill_workers(signal.SIGTERM)
+                kill_time = time.time()
+
+            time.sleep(0.01)
+
+        self.children = {}
+        self.socket.close()
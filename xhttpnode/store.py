@@ -0,0 +1,279 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import fcntl
+import logging
+import marshal
+import mmap
+import os
+import tempfile
+
+from xhttpnode.version import VersionIndex
+
+LOG = logging.getLogger(__name__)
+
+#version of the store file format
+STORE_FORMAT_VERSION = 1
+
+#first line of store files
+STORE_HEADER = "XHTTPNODE-SCHEMA-STORE %s\n" % STORE_FORMAT_VERSION
+
+#last line of store files, with the offset where the index starts
+STORE_TRAILER_FORMAT = "%015d\n"
+STORE_TRAILER_SIZE = len(STORE_TRAILER_FORMAT % 0)
+
+
+class StoredService(object):
+    """Metadata responses of a service in a mapped store file
+
+    Entries have (mode, version, action) tuples as keys, like the node
+    responses tables, and status, headers, offset and length of the
+    response body in the store file as values. Compressed responses
+    have the encoding added at the end of their keys.
+
+    """
+
+    __slots__ = ('name', 'file', 'mtime', 'versions', 'entries', 'mapping')
+
+    def __init__(self, name, file, mtime, versions, entries, mapping):
+        self.name = name
+        self.file = file
+        self.mtime = mtime
+        self.versions = versions
+        self.entries = entries
+        self.mapping = mapping
+
+    def __repr__(self):
+        return "<StoredService %s>" % self.name
+
+    def get(self, key, default=None):
+        """Get the parts of a response, reading its body from the store
+
+        Body is copied from the mapped file, since WSGI servers only
+        accept strings, so each request keeps its own copy of the body
+        only while it is processed.
+
+        Return: A tuple with status, headers and body.
+
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+
+        (status, headers, offset, length) = entry
+
+        return (status, headers, self.mapping[offset:offset + length])
+
+
+class SchemaStore(object):
+    """Metadata responses of all services in a memory mapped file
+
+    Store file is shared by all processes of a node, so the serialized
+    responses are kept only once in memory, in the operating system page
+    cache, instead of once for each worker process.
+    A new store generation is published by writing a new file and then
+    renaming it over the current one, so processes keep reading the
+    generation they mapped until they refresh the store. Refresh only
+    calls stat when store was not published again, so it can be called
+    often.
+
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        #StoredService for each service name in mapped generation
+        self.services = {}
+        self._file_id = None
+
+    def __contains__(self, service_name):
+        return service_name in self.services
+
+    def get(self, service_name):
+        """Get the stored responses of a service
+
+        Return: A StoredService, or None when service is not stored.
+
+        """
+        return self.services.get(service_name)
+
+    @classmethod
+    def _read_index(cls, mapping):
+        if mapping[:len(STORE_HEADER)] != STORE_HEADER:
+            raise ValueError("invalid store header")
+
+        index_offset = int(mapping[-STORE_TRAILER_SIZE:])
+
+        return marshal.loads(mapping[index_offset:-STORE_TRAILER_SIZE])
+
+    def refresh(self):
+        """Map the store file again when a new generation was published
+
+        Return: A set with the names of the services that changed.
+
+        """
+        try:
+            stat = os.stat(self.file_name)
+        except OSError:
+            return set()
+
+        file_id = (stat.st_dev, stat.st_ino, stat.st_mtime, stat.st_size)
+        if file_id == self._file_id:
+            return set()
+
+        try:
+            with open(self.file_name, "rb") as store_file:
+                mapping = mmap.mmap(store_file.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+
+            index = self._read_index(mapping)
+        except (IOError, OSError, EOFError, ValueError, TypeError), exc:
+            LOG.warning(u"Ignoring invalid schema store %s: %s",
+                        self.file_name, exc)
+            return set()
+
+        services = {}
+        for (name, (schema_file, mtime, versions, entries)) in index.items():
+            services[name] = StoredService(name, schema_file, mtime,
+                                           VersionIndex(versions), entries,
+                                           mapping)
+
+        changed = set()
+        for name in set(services) | set(self.services):
+            old_service = self.services.get(name)
+            service = services.get(name)
+            if (old_service is None or service is None
+                    or old_service.file != service.file
+                    or old_service.mtime != service.mtime):
+                changed.add(name)
+
+        #previous mapping is closed once no request uses it
+        self.services = services
+        self._file_id = file_id
+
+        return changed
+
+
+class StoreWriter(object):
+    """Writer for a new generation of a store file
+
+    Response bodies are written to a temporary file as services are
+    added, so services don't have to be kept in memory until the store
+    is written. Bodies shared by several responses are written once.
+    The index is written after the bodies, and commit then renames the
+    temporary file over the store file.
+
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        store_dir = os.path.dirname(file_name) or "."
+        (fd, self.temp_file_name) = tempfile.mkstemp(dir=store_dir)
+        self.file = os.fdopen(fd, "wb")
+        self.file.write(STORE_HEADER)
+        self.offset = len(STORE_HEADER)
+        self.index = {}
+
+    def _write(self, body):
+        offset = self.offset
+        self.file.write(body)
+        self.offset += len(body)
+
+        return offset
+
+    def add(self, name, schema_file, mtime, versions, responses):
+        """Add the metadata responses of a service
+
+        Responses is a dictionary like the ones created by
+        Node.build_service_responses.
+
+        """
+        entries = {}
+        offsets = {}
+        for (key, (status, headers, body)) in responses.items():
+            offset = offsets.get(id(body))
+            if offset is None:
+                offset = offsets[id(body)] = self._write(body)
+
+            entries[key] = (status, tuple(headers), offset, len(body))
+
+        self.index[name] = (schema_file, mtime, tuple(versions), entries)
+
+    def copy(self, service):
+        """Add a StoredService from the current store generation"""
+        entries = {}
+        offsets = {}
+        mapping = service.mapping
+        for (key, entry) in service.entries.items():
+            (status, headers, offset, length) = entry
+            new_offset = offsets.get(offset)
+            if new_offset is None:
+                body = mapping[offset:offset + length]
+                new_offset = offsets[offset] = self._write(body)
+
+            entries[key] = (status, headers, new_offset, length)
+
+        self.index[service.name] = (service.file, service.mtime,
+                                    service.versions.versions, entries)
+
+    def commit(self):
+        """Write the index and publish the new store generation"""
+        index_offset = self.offset
+        marshal.dump(self.index, self.file)
+        self.file.write(STORE_TRAILER_FORMAT % index_offset)
+        self.file.close()
+        os.rename(self.temp_file_name, self.file_name)
+
+    def abort(self):
+        """Discard the new store generation"""
+        self.file.close()
+        os.remove(self.temp_file_name)
+
+
+class StoreLock(object):
+    """Exclusive lock for publishing a store file
+
+    Lock is held on a file next to the store file, so processes that
+    find changed schema files publish one store generation at a time.
+
+    """
+
+    def __init__(self, file_name):
+        self.file_name = "%s.lock" % file_name
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.file_name, "a")
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
+        self.file = None
@@ -0,0 +1,115 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+def parse_version(value):
+    """Parse a version string like "1.2" into a tuple of integers
+
+    Return: A tuple, or None when value is not a valid version.
+
+    """
+    try:
+        return tuple(int(number) for number in value.split("."))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _version_key(version):
+    #versions that are not numeric are sorted before numeric ones
+    return (parse_version(version) or (), version)
+
+
+def sort_versions(versions):
+    """Sort version strings by their numeric value
+
+    Version "1.10" is sorted after "1.9", and not before "1.2" as it
+    would be when version strings are compared.
+
+    Return: A list.
+
+    """
+    return sorted(versions, key=_version_key)
+
+
+class VersionIndex(object):
+    """Index of the versions of a service
+
+    Index is built once when a service is loaded, so the schema version
+    for a request is found with a single dictionary lookup. Versions are
+    sorted by their numeric value and latest is the highest one.
+    Ranges has the sorted versions of each major version, and a major
+    version alone, like "1", resolves to the latest version compatible
+    with it.
+
+    """
+
+    __slots__ = ('versions', 'latest', 'ranges', 'lookup')
+
+    def __init__(self, versions):
+        self.versions = tuple(sort_versions(versions))
+        self.latest = None
+        if self.versions:
+            self.latest = self.versions[-1]
+
+        ranges = {}
+        for version in self.versions:
+            major = version.split(".")[0]
+            ranges.setdefault(major, []).append(version)
+
+        self.ranges = dict(
+            (major, tuple(version_list))
+            for (major, version_list) in ranges.items())
+        #versions are sorted so major versions point to the latest one
+        lookup = dict(
+            (major, version_list[-1])
+            for (major, version_list) in ranges.items())
+        #exact versions are used before major versions with the same name
+        lookup.update((version, version) for version in self.versions)
+        self.lookup = lookup
+
+    def __repr__(self):
+        return "<VersionIndex %s>" % ", ".join(self.versions)
+
+    def __contains__(self, version):
+        return version in self.lookup
+
+    def resolve(self, version=None, default=None):
+        """Get the schema version for a requested version
+
+        Version is the version requested in X-Service header, and it can
+        be an exact version or a major version. When no version is
+        requested default version is used when service has it, and the
+        latest version otherwise.
+
+        Return: A string, or None when requested version is not available.
+
+        """
+        if version:
+            return self.lookup.get(version)
+
+        return self.lookup.get(default, self.latest)
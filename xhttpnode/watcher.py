@@ -0,0 +1,62 @@
+# -*- coding: utf8 -*-
+#
+# Copyright (c) 2011, Jeronimo Jose Albi <jeronimo.albi@gmail.com>
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of copyright holders nor the names of its
+#    contributors may be used to endorse or promote products derived
+#    from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE AUTHOR ``AS IS'' AND ANY EXPRESS OR
+# IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED.
+# IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT
+# NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF
+# THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+import logging
+import threading
+
+LOG = logging.getLogger(__name__)
+
+
+class SchemaWatcher(threading.Thread):
+    """Thread that reloads node schemas when schema files change
+
+    Service directory is checked every interval seconds, and node
+    reloads only the files that were added, changed or deleted.
+
+    """
+
+    def __init__(self, node, interval=1.0):
+        super(SchemaWatcher, self).__init__(name="xhttp-schema-watcher")
+        self.daemon = True
+        self.node = node
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        LOG.debug(u"Watching schema files in %s", self.node.service_dir)
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.node.reload()
+            except Exception:
+                #watcher must keep running after unexpected errors
+                LOG.exception("Error reloading XHTTP schemas")
+
+    def stop(self):
+        """Stop watching schema files"""
+        self._stop_event.set()